@@ -0,0 +1,142 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import candle_store
+import exchange_client
+
+logger = logging.getLogger(__name__)
+
+# 한 번에 받을 수 있는 최대 캔들 수
+PAGE_SIZE = 200
+
+# 시세 조회 API 초당 요청 수 (업비트/빗썸 모두 초당 10회 제한 이하로 유지)
+REQUESTS_PER_SECOND = 8
+
+upbit = exchange_client.ExchangeClient("https://api.upbit.com")
+bithumb = exchange_client.ExchangeClient("https://api.bithumb.com")
+
+
+def fetch_candle_page(client, market, interval, count, to):
+    """
+    to(UTC epoch 초) 이전 캔들 count개 (업비트/빗썸 캔들 API 형식이 같음).
+    요청 실패나 오류 응답은 예외로 올려 재시도하고, 성공한 빈 목록만 0개(상장 이전)로 돌려준다.
+    """
+    if interval == "day":
+        path = "/v1/candles/days"
+    else:
+        path = f"/v1/candles/minutes/{interval[len('minute'):]}"
+
+    params = {
+        "market": market,
+        "count": count,
+        "to": datetime.fromtimestamp(to, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    response = client.get(path, params=params, headers={"accept": "application/json"})
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, list):
+        raise RuntimeError(f"Unexpected candle response: {data}")
+    if not data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(data).rename(columns={
+        'opening_price': 'open',
+        'high_price': 'high',
+        'low_price': 'low',
+        'trade_price': 'close',
+        'candle_acc_trade_volume': 'volume',
+        'candle_acc_trade_price': 'value'
+    })
+    df.index = pd.to_datetime(df['candle_date_time_kst'])
+    return df.sort_index()
+
+
+def fetch_upbit_page(market, interval, count, to):
+    return fetch_candle_page(upbit, market, interval, count, to)
+
+
+def fetch_bithumb_page(market, interval, count, to):
+    return fetch_candle_page(bithumb, market, interval, count, to)
+
+
+FETCHERS = {
+    "upbit": fetch_upbit_page,
+    "bithumb": fetch_bithumb_page,
+}
+
+
+def backfill(store, exchange, market, interval, start, end=None, workers=4, rate=REQUESTS_PER_SECOND):
+    """
+    [start, end) 구간(UTC epoch 초)의 캔들을 PAGE_SIZE 단위 페이지로 나눠 최신 페이지부터 과거로 내려가며 받는다.
+    이미 저장소에 모두 있는 페이지는 건너뛰므로 중단 후 다시 실행하면 이어서 받는다.
+    """
+    fetch = FETCHERS[exchange]
+    seconds = candle_store.INTERVAL_SECONDS[interval]
+    end = end or time.time()
+    end = (int(end) // seconds + 1) * seconds  # 진행 중인 캔들까지 포함
+    page_span = PAGE_SIZE * seconds
+    bucket = exchange_client.TokenBucket(rate)
+
+    pages = []
+    to = end
+    while to > start:
+        # 분봉/일봉 시각(일봉은 KST 09:00 = UTC 0시)은 epoch 기준 배수라 페이지 경계와 맞아떨어짐
+        expected = min(PAGE_SIZE, int((to - max(start, to - page_span)) // seconds))
+        if store.count(exchange, market, interval, start=to - page_span, end=to) < expected:
+            pages.append((to, expected))
+        to -= page_span
+    logger.info("%s %s %s: %d pages to fetch", exchange, market, interval, len(pages))
+
+    def fetch_page(page):
+        to, count = page
+        bucket.acquire()
+        for attempt in range(3):
+            try:
+                df = fetch(market, interval, count, to)
+                return store.append(exchange, market, interval, df)
+            except Exception as e:
+                logger.warning("Page before %s failed (%s), retrying", to, e)
+                time.sleep(2 ** attempt)
+                bucket.acquire()
+        logger.error("Giving up on page before %s", to)
+        return None
+
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        # workers개 페이지씩 병렬로 받고, 가장 오래된 페이지가 비어 있으면 상장 이전이므로 중단
+        for i in range(0, len(pages), workers):
+            batch = pages[i:i + workers]
+            results = list(pool.map(fetch_page, batch))
+            fetched += sum(count for count in results if count)
+            logger.info("%s %s %s: %d/%d pages, %d candles", exchange, market, interval,
+                        min(i + workers, len(pages)), len(pages), fetched)
+            if results[-1] == 0:
+                logger.info("No candles before %s; reached the start of history.",
+                            datetime.fromtimestamp(batch[-1][0], tz=timezone.utc))
+                break
+    return fetched
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="과거 캔들 데이터를 로컬 저장소에 받아둡니다.")
+    parser.add_argument("--exchange", choices=sorted(FETCHERS), default="upbit")
+    parser.add_argument("--market", default="KRW-BTC")
+    parser.add_argument("--interval", choices=[interval for interval in candle_store.INTERVAL_SECONDS if interval != "week"],
+                        default="minute60")
+    parser.add_argument("--days", type=int, default=365, help="오늘부터 며칠 전까지 받을지")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="초당 요청 수")
+    parser.add_argument("--db", default="candles.db")
+    args = parser.parse_args()
+
+    store = candle_store.CandleStore(args.db)
+    now = time.time()
+    total = backfill(store, args.exchange, args.market, args.interval, now - args.days * 86400, now,
+                     workers=args.workers, rate=args.rate)
+    print(f"{total} candles stored in {args.db}")
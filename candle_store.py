@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 봉 간격별 길이 (초)
+INTERVAL_SECONDS = {
+    "minute1": 60,
+    "minute3": 180,
+    "minute5": 300,
+    "minute10": 600,
+    "minute15": 900,
+    "minute30": 1800,
+    "minute60": 3600,
+    "minute240": 14400,
+    "day": 86400,
+    "week": 604800,
+}
+
+CANDLE_COLUMNS = ["open", "high", "low", "close", "volume", "value"]
+
+# 거래소 캔들 시각은 한국 시간(KST) 기준 naive datetime
+MARKET_TIMEZONE = "Asia/Seoul"
+
+
+def to_epoch(index):
+    """KST naive DatetimeIndex -> UTC epoch 초"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TIMEZONE)
+    return (index.tz_convert("UTC").tz_localize(None) - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+
+
+def from_epoch(values):
+    """UTC epoch 초 -> KST naive DatetimeIndex"""
+    index = pd.DatetimeIndex(pd.to_datetime(values, unit="s", utc=True))
+    return index.tz_convert(MARKET_TIMEZONE).tz_localize(None)
+
+
+class CandleStore:
+    """
+    거래소/마켓/봉 간격별 캔들을 SQLite에 쌓아두는 append-only 저장소.
+    같은 시각의 캔들은 덮어쓰므로 진행 중인 마지막 캔들도 다시 저장하면 갱신된다.
+    """
+
+    def __init__(self, path="candles.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS candles (
+            exchange TEXT NOT NULL,
+            market TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            value REAL,
+            PRIMARY KEY (exchange, market, interval, ts)
+        ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def last_timestamp(self, exchange, market, interval):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(ts) FROM candles WHERE exchange = ? AND market = ? AND interval = ?",
+                (exchange, market, interval),
+            ).fetchone()
+        return row[0]
+
+    def first_timestamp(self, exchange, market, interval):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(ts) FROM candles WHERE exchange = ? AND market = ? AND interval = ?",
+                (exchange, market, interval),
+            ).fetchone()
+        return row[0]
+
+    def count(self, exchange, market, interval, start=None, end=None):
+        """저장된 캔들 수 (start 이상, end 미만)"""
+        query = "SELECT COUNT(*) FROM candles WHERE exchange = ? AND market = ? AND interval = ?"
+        params = [exchange, market, interval]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(end)
+        with self.lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+    def append(self, exchange, market, interval, df):
+        """index가 캔들 시각(KST)인 DataFrame을 저장하고 저장한 행 수를 반환"""
+        if df is None or df.empty:
+            return 0
+
+        timestamps = to_epoch(df.index)
+        columns = [df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=float)
+                   for column in CANDLE_COLUMNS]
+        rows = [
+            (exchange, market, interval, int(ts), *[None if pd.isna(v) else float(v) for v in values])
+            for ts, *values in zip(timestamps, *columns)
+        ]
+        with self.lock:
+            self.conn.executemany('''
+            INSERT OR REPLACE INTO candles (exchange, market, interval, ts, open, high, low, close, volume, value)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self.conn.commit()
+        logger.debug("Stored %d %s %s %s candles.", len(rows), exchange, market, interval)
+        return len(rows)
+
+    def load(self, exchange, market, interval, count=None, start=None, end=None):
+        """저장된 캔들을 시간순(오래된 것부터) DataFrame으로 반환. count가 있으면 최근 count개"""
+        query = "SELECT ts, open, high, low, close, volume, value FROM candles WHERE exchange = ? AND market = ? AND interval = ?"
+        params = [exchange, market, interval]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND ts <= ?"
+            params.append(end)
+        query += " ORDER BY ts DESC"
+        if count is not None:
+            query += " LIMIT ?"
+            params.append(count)
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        rows.reverse()
+
+        df = pd.DataFrame.from_records(rows, columns=["ts"] + CANDLE_COLUMNS)
+        df.index = from_epoch(df.pop("ts")).rename(None)
+        if df["value"].isna().all():
+            df = df.drop(columns=["value"])
+        return df
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def missing_count(store, exchange, market, interval, count, now=None):
+    """
+    저장소에 없는 최신 캔들 수 (진행 중이던 마지막 캔들 포함, 최대 count).
+    요청 구간 시작부터 마지막 저장 캔들까지 빠짐없이 있으면 그 이후 경과한 캔들만 받고,
+    중간에 빈 곳이 있거나 마지막 저장 캔들이 구간보다 오래됐으면 전체를 다시 받는다.
+    """
+    seconds = INTERVAL_SECONDS[interval]
+    now = time.time() if now is None else now
+
+    # 캔들 시각은 epoch 기준 배수 (일봉은 KST 09:00 = UTC 0시)
+    current = int(now) // seconds * seconds
+    first = current - (count - 1) * seconds
+    last = store.last_timestamp(exchange, market, interval)
+    if last is None or last < first:
+        return count
+    if store.count(exchange, market, interval, start=first, end=last + 1) < (last - first) // seconds + 1:
+        return count
+
+    # 마지막 저장 캔들은 진행 중이었을 수 있어 다시 받음
+    return max(1, min(count, (current - last) // seconds + 1))
+
+
+def get_ohlcv(store, exchange, market, interval, count, fetch):
+    """
+    저장소 기반 OHLCV 조회. 마지막으로 저장된 캔들 이후 구간만 fetch(count)로 받아오고
+    나머지는 로컬에서 읽는다. fetch는 index가 캔들 시각인 DataFrame(또는 None)을 반환해야 한다.
+    """
+    need = missing_count(store, exchange, market, interval, count)
+    try:
+        df = fetch(need)
+    except Exception as e:
+        logger.error("Failed to fetch %s %s %s candles: %s", exchange, market, interval, e)
+        df = None
+
+    if df is not None and not df.empty:
+        store.append(exchange, market, interval, df)
+    else:
+        logger.warning("No new %s %s %s candles fetched; serving stored data.", exchange, market, interval)
+
+    logger.debug("Fetched %d of %d %s %s %s candles.", need, count, exchange, market, interval)
+    return store.load(exchange, market, interval, count=count)
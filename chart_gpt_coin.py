@@ -5,26 +5,47 @@ import json
 import jwt
 import uuid
 import time
-import requests
 from openai import OpenAI
-import ta
 from ta.utils import dropna
 import logging
-from datetime import datetime, timedelta
-import sqlite3
 from pydantic import BaseModel
+import streaming_indicators
+import candle_store
+import market_snapshot
+import exchange_client
+import realtime_feed
+import l2_book
+import prompt_encoder
+import reflection_cache
+import llm_metrics
+import strategy_index
+import local_decision
+import trade_db
+import snapshot_archive
+import trade_journal
+import trade_history
 
 class TradingDecision(BaseModel):
     decision: str
     percentage: int
     reason: str
 
+# 회고와 매매 결정을 한 번의 호출로 받을 때의 응답
+class FusedTradingDecision(TradingDecision):
+    reflection: str
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# 빗썸 API 공유 클라이언트 (커넥션 재사용, 요청 수 제한, 재시도)
+bithumb = exchange_client.ExchangeClient("https://api.bithumb.com")
+
+# 빗썸 실시간 현재가/호가 (WebSocket, 백그라운드 스레드)
+feed = realtime_feed.RealtimeFeed(realtime_feed.BITHUMB_WS_URL, codes=["KRW-BTC"]).start()
+
 # JWT 인증 토큰 생성 함수
 def generate_auth_token():
     access_key = os.getenv("BITHUMB_ACCESS_KEY")
@@ -40,34 +61,31 @@ def generate_auth_token():
     logger.debug("Generated JWT token for authorization.")
     return headers
 
+# 보조 지표 엔진 생성 (볼린저 밴드, RSI, MACD, 스토캐스틱)
+def create_indicator_engine():
+    return streaming_indicators.IndicatorEngine([
+        streaming_indicators.BollingerBands(window=20, window_dev=2),
+        streaming_indicators.RSI(window=14),
+        streaming_indicators.MACD(),
+        streaming_indicators.Stochastic(window=14, smooth_window=3),
+    ])
+
+# (마켓, 봉 간격)별 지표 엔진 - 사이클마다 새로 들어온 캔들만 계산
+indicator_engines = {}
+
 # 보조 지표 추가 함수
-def add_indicators(df):
-    # 볼린저 밴드
-    indicator_bb = ta.volatility.BollingerBands(close=df['close'], window=20, window_dev=2)
-    df['bb_bbm'] = indicator_bb.bollinger_mavg()
-    df['bb_bbh'] = indicator_bb.bollinger_hband()
-    df['bb_bbl'] = indicator_bb.bollinger_lband()
-    
-    # RSI
-    df['rsi'] = ta.momentum.RSIIndicator(close=df['close'], window=14).rsi()
-    
-    # MACD
-    macd = ta.trend.MACD(close=df['close'])
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    df['macd_diff'] = macd.macd_diff()
-
-    # Stochastic
-    stoch = ta.momentum.StochasticOscillator(close=df['close'], high=df['high'], low=df['low'], window=14, smooth_window=3)
-    df['stoch_k'] = stoch.stoch()  # %K
-    df['stoch_d'] = stoch.stoch_signal()  # %D
-    
-    return df
+def add_indicators(df, key=None):
+    # key가 없으면 df 전체로 새로 계산 (ta와 동일한 결과)
+    if key is None:
+        return create_indicator_engine().add_indicators(df)
+
+    if key not in indicator_engines:
+        indicator_engines[key] = create_indicator_engine()
+    return indicator_engines[key].add_indicators(df)
 
 def get_balances():
-    url = "https://api.bithumb.com/v1/accounts"
-    headers = generate_auth_token()
-    response = requests.get(url, headers=headers)
+    # 재시도할 때마다 새 토큰으로 인증
+    response = bithumb.get("/v1/accounts", auth=generate_auth_token)
     
     try:
         # JSON 응답이 제대로 파싱되는지 확인
@@ -102,8 +120,12 @@ def get_balances():
 
 # 현재가 조회 함수
 def get_current_price(market="KRW-BTC"):
-    url = f"https://api.bithumb.com/v1/ticker?markets={market}"
-    response = requests.get(url)
+    # WebSocket으로 받은 최신 현재가가 있으면 REST 호출 없이 사용
+    ticker = feed.get_ticker(market)
+    if ticker is not None:
+        return [ticker]
+
+    response = bithumb.get("/v1/ticker", params={"markets": market})
     logger.debug("현재가 가져오기 성공")
 
    
@@ -120,9 +142,24 @@ def get_current_price(market="KRW-BTC"):
         return None
     
 # 오더북 조회 함수
+def summarize_orderbook(orderbook):
+    orderbook_data = {
+        "best_ask_price": orderbook["orderbook_units"][0]["ask_price"],
+        "best_bid_price": orderbook["orderbook_units"][0]["bid_price"],
+        "total_ask_size": orderbook["total_ask_size"],
+        "total_bid_size": orderbook["total_bid_size"]
+    }
+    # 전체 호가 기반 지표 (스프레드, 호가 불균형, 주문 금액 기준 VWAP)
+    orderbook_data.update(l2_book.L2OrderBook.from_orderbook(orderbook).features())
+    return orderbook_data
+
 def get_orderbook(market="KRW-BTC"):
-    url = f"https://api.bithumb.com/v1/orderbook?markets={market}"
-    response = requests.get(url)
+    # WebSocket으로 받은 최신 호가가 있으면 REST 호출 없이 사용
+    orderbook = feed.get_orderbook(market)
+    if orderbook is not None and orderbook["orderbook_units"]:
+        return summarize_orderbook(orderbook)
+
+    response = bithumb.get("/v1/orderbook", params={"markets": market})
     
     try:
         data = response.json()
@@ -130,14 +167,7 @@ def get_orderbook(market="KRW-BTC"):
 
         # 데이터가 리스트 형식인 경우 첫 번째 요소를 사용
         if isinstance(data, list) and len(data) > 0:
-            orderbook = data[0]  # 첫 번째 요소 선택
-            orderbook_data = {
-                "best_ask_price": orderbook["orderbook_units"][0]["ask_price"],
-                "best_bid_price": orderbook["orderbook_units"][0]["bid_price"],
-                "total_ask_size": orderbook["total_ask_size"],
-                "total_bid_size": orderbook["total_bid_size"]
-            }
-            return orderbook_data
+            return summarize_orderbook(data[0])  # 첫 번째 요소 선택
         else:
             logger.error("Unexpected data format for orderbook: %s", data)
             return None
@@ -145,34 +175,29 @@ def get_orderbook(market="KRW-BTC"):
         logger.error("Error processing orderbook data: %s", e)
         return None
 
-# SQLite DB 초기화
-def init_db():
-    conn = sqlite3.connect('trading_data1.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS trades (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        decision TEXT,
-        percentage INTEGER,
-        reason TEXT,
-        btc_balance REAL,
-        krw_balance REAL,
-        btc_avg_buy_price REAL,
-        btc_krw_price REAL,
-        total_asset REAL,
-        reflection TEXT
-    )
-    ''')
-    conn.commit()
-    logger.debug("Database initialized and table created if not exists.")
-    return conn
+# 거래 기록은 전용 스레드가 모아서 저장하고 (write-behind), 조회는 읽기 전용 연결 풀로
+# (처음 연결할 때 trades 테이블을 만들거나 최신 스키마로 마이그레이션)
+journal = trade_journal.TradeJournal('trading_data1.db')
+trade_reads = trade_journal.ReadPool('trading_data1.db')
+
+# 회고 결과 캐시
+reflections = reflection_cache.ReflectionCache('trading_data1.db')
 
-def get_db_connection():
-    return sqlite3.connect('trading_data1.db')
+# LLM 호출별 토큰/소요 시간/비용 기록 (trades.id와 연결)
+llm = llm_metrics.LLMMetrics('trading_data1.db')
 
-def fetch_ohlcv_data(url):
-    response = requests.get(url, headers={"accept": "application/json"})
+# 매매 결정마다 모델이 본 입력을 압축해 trades.id로 저장 (재현/감사용)
+snapshots = snapshot_archive.SnapshotArchive('snapshots1.db')
+
+# 캔들 로컬 저장소 (마지막 저장 이후 캔들만 새로 받아옴)
+candles = candle_store.CandleStore('candles.db')
+
+# 전략 문서 검색 인덱스 (strategy1.txt가 바뀌었을 때만 다시 색인)
+strategies = strategy_index.StrategyIndex('strategy_index1.db')
+strategies.add_file('strategy1.txt')
+
+def fetch_ohlcv_data(path, params):
+    response = bithumb.get(path, params=params, headers={"accept": "application/json"})
     try:
         data = response.json()
         if isinstance(data, list):
@@ -187,8 +212,7 @@ def fetch_ohlcv_data(url):
         return pd.DataFrame()
 
 def get_daily_ohlcv(market="KRW-BTC", count=30):
-    url = f"https://api.bithumb.com/v1/candles/days?market={market}&count={count}"
-    df_daily = fetch_ohlcv_data(url)
+    df_daily = fetch_ohlcv_data("/v1/candles/days", {"market": market, "count": count})
 
     if not df_daily.empty:
         df_daily = df_daily.rename(columns={
@@ -196,16 +220,18 @@ def get_daily_ohlcv(market="KRW-BTC", count=30):
             'high_price': 'high',
             'low_price': 'low',
             'trade_price': 'close',
-            'candle_acc_trade_volume': 'volume'
+            'candle_acc_trade_volume': 'volume',
+            'candle_acc_trade_price': 'value'
         })
         df_daily['candle_date_time_kst'] = pd.to_datetime(df_daily['candle_date_time_kst'])
         df_daily.set_index('candle_date_time_kst', inplace=True)
+        # 빗썸은 최신 캔들부터 내려주므로 시간순으로 정렬
+        df_daily.sort_index(inplace=True)
         
     return df_daily
 
 def get_hourly_ohlcv(market="KRW-BTC", count=24):
-    url = f"https://api.bithumb.com/v1/candles/minutes/60?market={market}&count={count}"
-    df_hourly = fetch_ohlcv_data(url)
+    df_hourly = fetch_ohlcv_data("/v1/candles/minutes/60", {"market": market, "count": count})
 
     if not df_hourly.empty:
         df_hourly = df_hourly.rename(columns={
@@ -213,33 +239,25 @@ def get_hourly_ohlcv(market="KRW-BTC", count=24):
             'high_price': 'high',
             'low_price': 'low',
             'trade_price': 'close',
-            'candle_acc_trade_volume': 'volume'
+            'candle_acc_trade_volume': 'volume',
+            'candle_acc_trade_price': 'value'
         })
         df_hourly['candle_date_time_kst'] = pd.to_datetime(df_hourly['candle_date_time_kst'])
         df_hourly.set_index('candle_date_time_kst', inplace=True)
+        # 빗썸은 최신 캔들부터 내려주므로 시간순으로 정렬
+        df_hourly.sort_index(inplace=True)
         
     return df_hourly
 
 
 def get_recent_trades(conn, days=7):
-    c = conn.cursor()
-    seven_days_ago = (datetime.now() - timedelta(days=days)).isoformat()
-    c.execute("SELECT * FROM trades WHERE timestamp > ? ORDER BY timestamp DESC", (seven_days_ago,))
-    columns = [column[0] for column in c.description]
-    return pd.DataFrame.from_records(data=c.fetchall(), columns=columns)
-
-def calculate_performance(trades_df):
-    if trades_df.empty or len(trades_df) < 2:
-        return 0  # 데이터가 없거나 거래가 2건 미만인 경우 0 반환
-    
-    # 직전 거래와 비교
-    previous_trade = trades_df.iloc[-2]
-    current_trade = trades_df.iloc[-1]
+    return trade_db.recent_trades(conn, days)
 
-    initial_balance = previous_trade['krw_balance'] + previous_trade['btc_balance'] * previous_trade['btc_krw_price']
-    final_balance = current_trade['krw_balance'] + current_trade['btc_balance'] * current_trade['btc_krw_price']
-    
-    return (final_balance - initial_balance) / initial_balance * 100
+# 직전 거래 대비 최근 거래의 평가 자산 변화율 (필요한 숫자 컬럼만 NumPy로 읽어 계산)
+def calculate_performance(days=7):
+    with trade_reads.connection() as conn:
+        history = trade_history.load(conn, trade_history.EQUITY_COLUMNS, days=days)
+    return trade_history.performance(history)["last_trade_return_pct"]
 
 def buy_order(amount):
     current_price_data = get_current_price("KRW-BTC")
@@ -258,11 +276,8 @@ def buy_order(amount):
         'ord_type': 'price',  # 시장가 매수
     }
 
-    headers = {
-        'Authorization': generate_auth_token()
-    }
-
-    response = requests.post("https://api.bithumb.com/v1/orders", headers=headers, data=request_body)
+    # 주문은 중복 실행되면 안 되므로 요청 거부(429)일 때만 재시도 (재시도마다 새 토큰으로 인증)
+    response = bithumb.post("/v1/orders", group="order", retry=False, auth=generate_auth_token, data=request_body)
 
     if response.status_code == 201:
         return response.json()  # 주문 성공시 응답 반환
@@ -287,11 +302,8 @@ def sell_order(amount):
         'ord_type': 'market',  # 시장가 매도
     }
 
-    headers = {
-        'Authorization': generate_auth_token()
-    }
-
-    response = requests.post("https://api.bithumb.com/v1/orders", headers=headers, data=request_body)
+    # 주문은 중복 실행되면 안 되므로 요청 거부(429)일 때만 재시도 (재시도마다 새 토큰으로 인증)
+    response = bithumb.post("/v1/orders", group="order", retry=False, auth=generate_auth_token, data=request_body)
 
     if response.status_code == 201:
         return response.json()  # 주문 성공시 응답 반환
@@ -300,10 +312,11 @@ def sell_order(amount):
         return None
 
 def generate_reflection(trades_df, current_market_data):
-    performance = calculate_performance(trades_df)
+    performance = calculate_performance()
     
     client = OpenAI()
-    response = client.chat.completions.create(
+    response = llm.chat(
+        client, "reflection",
         model="gpt-4o-2024-08-06",
         messages=[
             {
@@ -330,80 +343,188 @@ def generate_reflection(trades_df, current_market_data):
                 Limit your response to 250 words or less.
                 """
             }
-        ]
+        ],
+        # 마감 후에도 executor 작업자를 붙잡고 있지 않도록 HTTP 요청에도 같은 제한을 적용
+        timeout=REFLECTION_DEADLINE
     )
     
     return response.choices[0].message.content
 
+# 매매 결정 응답 JSON 스키마 (fused=True면 결정 전에 회고를 먼저 작성하도록 reflection 필드 추가)
+def decision_response_format(fused=False):
+    properties = {
+        "decision": {"type": "string", "enum": ["buy", "sell", "hold"]},
+        "percentage": {
+            "type": "integer"
+        },
+        "reason": {"type": "string"}
+    }
+    if fused:
+        properties = {"reflection": {"type": "string"}, **properties}
 
-def save_trade_data_with_reflection(conn, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection):
-    cursor = conn.cursor()
-    current_time = datetime.now().isoformat()
-    cursor.execute('''
-    INSERT INTO trades (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (current_time, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection))
-    conn.commit()
-    logger.debug("Trade data saved to database.")
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "trading_decision",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+# 매매 결정 요청 (응답을 TradingDecision으로 검증, fused면 reflection 포함)
+def request_decision(client, messages):
+    response = llm.chat(
+        client, "decision+reflection" if FUSED_REFLECTION else "decision",
+        model="gpt-4o-2024-08-06",
+        messages=messages,
+        response_format=decision_response_format(fused=FUSED_REFLECTION),
+        max_tokens=4095,
+        timeout=DECISION_DEADLINE
+    )
+    # 응답을 문자열로 가져오기
+    response_content = response.choices[0].message.content.strip()
+    try:
+        # JSON 파싱
+        if FUSED_REFLECTION:
+            return FusedTradingDecision.parse_raw(response_content)
+        return TradingDecision.parse_raw(response_content)
+    except Exception:
+        logger.debug("Response content: %s", response_content)
+        raise
+
+
+def save_trade_data_with_reflection(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection, on_saved=None):
+    return journal.record_trade(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price,
+                                btc_krw_price, total_asset, reflection, on_saved=on_saved)
+
+# 데이터 소스별 수집 타임아웃 (초)
+GATHER_TIMEOUTS = {
+    "balances": 5,
+    "orderbook": 5,
+    "current_price": 5,
+    "df_daily": 10,
+    "df_hourly": 10,
+}
+
+# true면 회고와 매매 결정을 한 번의 구조화 출력 호출로 생성 (LLM 호출 2회 -> 1회)
+FUSED_REFLECTION = os.getenv("FUSED_REFLECTION", "false").lower() == "true"
+
+# LLM 응답 마감 시간 (초) - 넘기면 회고는 생략하고 결정은 로컬 규칙 기반 모델이 내림
+DECISION_DEADLINE = float(os.getenv("DECISION_DEADLINE", "60"))
+REFLECTION_DEADLINE = float(os.getenv("REFLECTION_DEADLINE", "60"))
+
+# 프롬프트에 넣는 시장 데이터의 토큰 예산 (의사결정 / 회고)
+PROMPT_TOKEN_BUDGET = 4000
+REFLECTION_TOKEN_BUDGET = 2000
+
+# 프롬프트에 넣을 전략 청크 수와 토큰 예산
+STRATEGY_TOP_K = 6
+STRATEGY_TOKEN_BUDGET = 1500
+
+# 캔들 조회 후 보조지표 추가
+def get_ohlcv_with_indicators(interval, count):
+    fetchers = {"day": get_daily_ohlcv, "minute60": get_hourly_ohlcv}
+    df = candle_store.get_ohlcv(
+        candles, "bithumb", "KRW-BTC", interval, count,
+        lambda n: fetchers[interval]("KRW-BTC", n)
+    )
+    df = dropna(df)
+    return add_indicators(df, ("KRW-BTC", interval))
 
 def ai_trading():
-    # 1. 현재 투자 상태 조회
-    balances = get_balances()
+    llm.start_cycle()
+
+    # 1~4. 잔고, 오더북, 현재가, 차트 데이터를 병렬로 수집
+    snapshot = market_snapshot.gather_market_snapshot(
+        {
+            "balances": get_balances,
+            "orderbook": get_orderbook,
+            "current_price": lambda: get_current_price("KRW-BTC"),
+            "df_daily": lambda: get_ohlcv_with_indicators("day", 30),
+            "df_hourly": lambda: get_ohlcv_with_indicators("minute60", 24),
+        },
+        timeouts=GATHER_TIMEOUTS,
+        required=("balances", "current_price", "df_daily", "df_hourly"),
+    )
 
     # BTC와 KRW 잔액 조회
+    balances = snapshot.balances
     btc_balance = balances['btc_balance']
     krw_balance = balances['krw_balance']
     btc_avg_buy_price = balances['btc_avg_buy_price']
-    
-
-    # 2. 오더북(호가 데이터) 조회
-    orderbook = get_orderbook()
-    
-
-    # 3. 현재 BTC 가격 조회
-    btc_krw_price_data = get_current_price("KRW-BTC")
-    btc_krw_price = btc_krw_price_data[0]["trade_price"]  # 현재 가격 추출
 
-    # 4. 차트 데이터 조회 및 보조지표 추가
-    df_daily = get_daily_ohlcv("KRW-BTC", 30)
-    df_daily = dropna(df_daily)
-    df_daily = add_indicators(df_daily)
+    orderbook = snapshot.orderbook
+    btc_krw_price = snapshot.current_price[0]["trade_price"]  # 현재 가격 추출
+    df_daily = snapshot.df_daily
+    df_hourly = snapshot.df_hourly
 
-    df_hourly = get_hourly_ohlcv("KRW-BTC", 24)
-    df_hourly = dropna(df_hourly)
-    df_hourly = add_indicators(df_hourly)
-
-    # OpenAI 요청 데이터 준비
-    current_market_data = {
-        "orderbook": orderbook,
-        "recent_daily_ohlcv": df_daily,
-        "recent_hourly_ohlcv": df_hourly
-    }
+    # OpenAI 요청 데이터 준비 (토큰 예산에 맞춰 압축)
+    market_data_prompt, token_counts = prompt_encoder.encode_market_data({
+        "Current investment status": balances,
+        "Orderbook": orderbook,
+        "Daily OHLCV with indicators (30 days)": df_daily,
+        "Hourly OHLCV with indicators (24 hours)": df_hourly,
+    }, budget=PROMPT_TOKEN_BUDGET)
+    logger.info("Prompt tokens by section: %s", token_counts)
 
     # 7. YouTube 자막 데이터 가져오기
-    f = open("strategy1.txt", "r", encoding="UTF-8")
-    youtube_transcript = f.read()
-    f.close()
+    # 색인된 자막 중 현재 시장 상황과 관련된 부분만 가져오기
+    youtube_transcript = strategies.retrieve(
+        strategy_index.market_query(df_daily, df_hourly),
+        k=STRATEGY_TOP_K, budget=STRATEGY_TOKEN_BUDGET
+    )
 
     # 최근 거래 내역 조회 및 reflection 생성
-    conn = get_db_connection()
-    recent_trades = get_recent_trades(conn)
-    reflection = generate_reflection(recent_trades, current_market_data)
+    with trade_reads.connection() as conn:
+        recent_trades = get_recent_trades(conn)
+    if FUSED_REFLECTION:
+        # 회고는 매매 결정 호출에서 함께 생성 (LLM 호출 1회)
+        reflection_section = """Recent trading reflection:
+            Before deciding, write a brief reflection (250 words or less) in the 'reflection' field:
+            what worked well and what didn't in the recent trades listed in the user message,
+            suggestions for improvement, and any patterns or trends you notice in the market data.
+            Then make your decision taking that reflection into account."""
+        reflection_data = f"""
+            Recent trading data: {recent_trades.to_json(orient='records')}
+            Overall performance during the last trading period: {calculate_performance():.2f}%"""
+    else:
+        # 최근 거래와 시장 상황이 그대로면 캐시된 회고 재사용
+        reflection_key = reflection_cache.make_key(
+            recent_trades,
+            reflection_cache.market_digest(btc_krw_price, df_daily, df_hourly)
+        )
+        current_market_data, _ = prompt_encoder.encode_market_data({
+            "orderbook": orderbook,
+            "recent_daily_ohlcv": df_daily,
+            "recent_hourly_ohlcv": df_hourly
+        }, budget=REFLECTION_TOKEN_BUDGET)
+        reflection, _ = local_decision.call_with_deadline(
+            lambda: reflections.get_or_generate(
+                reflection_key, lambda: generate_reflection(recent_trades, current_market_data)
+            ),
+            lambda: "No reflection available for this cycle.",
+            REFLECTION_DEADLINE, "Reflection call"
+        )
+        reflection_section = f"""Recent trading reflection:
+            {reflection}"""
+        reflection_data = ""
 
     # OpenAI API 호출로 거래 결정 요청
     client = OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4o-2024-08-06",
-        messages=[
+    messages = [
         {
             "role": "system",
-            "content": """You are an expert in Bitcoin investing and must always incorporate the trading strategies in the provided YouTube video transcript. Analyze the provided data and give priority to YouTube's strategies when making your decision. Your analysis should include:
+            "content": f"""You are an expert in Bitcoin investing and must always incorporate the trading strategies in the provided YouTube video transcript. Analyze the provided data and give priority to YouTube's strategies when making your decision. Your analysis should include:
             - Technical indicators and market data
             - The strategies from the YouTube video
             - Recent trading performance and reflection
 
-            Recent trading reflection:
-            {reflection}
+            {reflection_section}
 
             Response format:
                 1. Decision (buy, sell, or hold)
@@ -419,46 +540,23 @@ def ai_trading():
         },
         {
             "role": "user",
-            "content": f"""Current investment status: {json.dumps(balances)}
-            Orderbook: {json.dumps(orderbook)}
-            Daily OHLCV with indicators (30 days): {df_daily.to_json()}
-            Hourly OHLCV with indicators (24 hours): {df_hourly.to_json()}
+            "content": f"""{market_data_prompt}{reflection_data}
             YouTube Video Transcript: {youtube_transcript}"""
         }
-    ],
-    response_format={
-        "type": "json_schema",
-        "json_schema": {
-            "name": "trading_decision",
-            "strict": True,
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "decision": {"type": "string", "enum": ["buy", "sell", "hold"]},
-                    "percentage": {
-                        "type": "integer"
-                    },
-                    "reason": {"type": "string"}
-                },
-                "required": ["decision", "percentage", "reason"],
-                "additionalProperties": False
-            }
-        }
-    },
-        max_tokens=4095
-    )
+    ]
 
-     # 응답을 문자열로 가져오기
-    response_content = response.choices[0].message.content.strip()
-    
-    try:
-        # JSON 파싱
-        result = TradingDecision.parse_raw(response_content)
-        logger.debug("AI Decision: %s, Reason: %s", result.decision, result.reason)
-    except Exception as e:
-        logger.error("Error parsing TradingDecision: %s", e)
-        logger.debug("Response content: %s", response_content)
-        return
+    # LLM이 DECISION_DEADLINE초 안에 답하지 못하거나 응답이 잘못되면 보조지표 기반 로컬 모델로 결정
+    result, used_fallback = local_decision.call_with_deadline(
+        lambda: request_decision(client, messages),
+        lambda: TradingDecision(**local_decision.score_decision(df_daily, df_hourly, orderbook_features=orderbook)),
+        DECISION_DEADLINE, "Decision call"
+    )
+    if FUSED_REFLECTION:
+        if used_fallback:
+            reflection = "No reflection this cycle (local fallback decision)."
+        else:
+            reflection = result.reflection
+    logger.debug("AI Decision: %s, Reason: %s", result.decision, result.reason)
 
     print(f"### AI Decision: {result.decision.upper()} ###")
     print(f"### Reason: {result.reason} ###")
@@ -498,16 +596,44 @@ def ai_trading():
     btc_avg_buy_price = balances['btc_avg_buy_price']
 
     # 9. 반성 내용 생성 및 데이터 저장
-    save_trade_data_with_reflection(conn, result.decision, result.percentage, result.reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection)
+    # 이번 결정이 본 입력 그대로 (재현/감사/재평가용 스냅샷)
+    decision_snapshot = {
+        "market": "KRW-BTC",
+        "messages": messages,
+        "inputs": {
+            "balances": snapshot.balances,
+            "current_price": btc_krw_price,
+            "orderbook": orderbook,
+            "df_daily": df_daily,
+            "df_hourly": df_hourly,
+            "strategy": youtube_transcript,
+            "reflection": reflection,
+        },
+        "decision": result,
+        "used_fallback": used_fallback,
+    }
 
-    # 데이터베이스 연결 종료
-    conn.close()
+    # 저장되면 이번 사이클의 LLM 호출 기록을 거래와 연결하고 입력 스냅샷 보관 (저장 스레드에서 실행)
+    cycle_id = llm.cycle_id
+    def on_saved(trade_id):
+        llm.link_trade(trade_id, cycle_id)
+        snapshots.put(trade_id, decision_snapshot, cycle_id=cycle_id)
+
+    save_trade_data_with_reflection(result.decision, result.percentage, result.reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection, on_saved=on_saved)
+    logger.info("LLM usage this cycle: %s", llm.cycle_summary())
+
+
+    logger.debug("Bithumb API metrics: %s", bithumb.get_metrics())
+
+# 매매 주기 (초)
+TRADING_INTERVAL = 3600  # 1시간마다 실행
 
 # 메인 루프
-while True:
-    try:
-        ai_trading()
-        time.sleep(3600)  # 1시간마다 실행
-    except Exception as e:
-        logger.error("An error occurred in ai_trading: %s", e)
-        time.sleep(300)  # 오류 발생 시 5분 후 재시도
+if __name__ == "__main__":
+    while True:
+        try:
+            ai_trading()
+            time.sleep(TRADING_INTERVAL)
+        except Exception as e:
+            logger.error("An error occurred in ai_trading: %s", e)
+            time.sleep(300)  # 오류 발생 시 5분 후 재시도
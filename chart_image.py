@@ -0,0 +1,144 @@
+import base64
+import io
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from PIL import Image, ImageChops
+
+logger = logging.getLogger(__name__)
+
+# 예산을 넘으면 차례로 시도할 손실 압축 형식과 품질
+LOSSY_FORMATS = (("WEBP", (90, 80, 70, 60)), ("JPEG", (90, 80, 70, 60)))
+
+# 크기/토큰 예산에 맞출 때 한 번에 줄이는 비율
+SCALE_STEP = 0.9
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# 스크린샷 보관은 별도 스레드에서 (매매 사이클이 디스크 쓰기를 기다리지 않도록)
+archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart-archive")
+
+
+class EncodedImage:
+    """vision 요청에 보낼 인코딩된 이미지"""
+
+    def __init__(self, data, image_format, width, height):
+        self.data = data
+        self.format = image_format
+        self.width = width
+        self.height = height
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    @property
+    def tokens(self):
+        return vision_tokens(self.width, self.height)
+
+    def base64(self):
+        return base64.b64encode(self.data).decode("utf-8")
+
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{self.base64()}"
+
+
+def vision_tokens(width, height, detail="high"):
+    """OpenAI vision 입력 토큰 수 (2048 안으로 줄이고 짧은 변 768로 맞춘 뒤 512px 타일당 170 + 기본 85)"""
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def trim_background(img, tolerance=8):
+    """모서리 색과 같은 바깥 여백을 잘라 차트 영역만 남김"""
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    difference = ImageChops.difference(rgb, background).convert("L").point(lambda value: 255 if value > tolerance else 0)
+    box = difference.getbbox()
+    return img.crop(box) if box else img
+
+
+def _fit_tokens(width, height, max_tokens):
+    scale = 1.0
+    while max_tokens and vision_tokens(width * scale, height * scale) > max_tokens and min(width, height) * scale > 64:
+        scale *= SCALE_STEP
+    return scale
+
+
+def _save(img, image_format, quality=None):
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        img.save(buffer, format="PNG")
+    else:
+        img.convert("RGB").save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_image(png, crop=None, max_side=2000, max_bytes=None, max_tokens=None):
+    """
+    스크린샷(PNG bytes)을 메모리에서 한 번만 디코딩해 차트 영역으로 자르고, vision 토큰 예산(max_tokens)과
+    크기 예산(max_bytes)에 맞는 형식으로 인코딩한다. PNG를 먼저 시도하고 크면 WebP, JPEG 순으로 품질을 낮추며,
+    그래도 크면 이미지를 줄인다. 자르거나 줄일 필요가 없고 예산 안이면 원본 bytes를 그대로 쓴다.
+
+    crop: None, "auto"(배경 여백 제거) 또는 (left, top, right, bottom)
+    """
+    img = Image.open(io.BytesIO(png))
+    if crop == "auto":
+        img = trim_background(img)
+    elif crop is not None:
+        img = img.crop(crop)
+
+    width, height = img.size
+    scale = min(1.0, max_side / max(width, height), _fit_tokens(width, height, max_tokens))
+    if crop is None and scale == 1.0 and img.format == "PNG" and (not max_bytes or len(png) <= max_bytes):
+        return EncodedImage(png, "PNG", width, height)
+
+    while True:
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            resized = img.resize(size, Image.LANCZOS)
+        else:
+            resized = img
+
+        data = _save(resized, "PNG")
+        if not max_bytes or len(data) <= max_bytes:
+            return EncodedImage(data, "PNG", *resized.size)
+        for image_format, qualities in LOSSY_FORMATS:
+            for quality in qualities:
+                data = _save(resized, image_format, quality)
+                if len(data) <= max_bytes:
+                    return EncodedImage(data, image_format, *resized.size)
+
+        if min(resized.size) <= 64:
+            logger.warning("Image still %d bytes over the %d byte budget at %dx%d",
+                           len(data), max_bytes, *resized.size)
+            return EncodedImage(data, image_format, *resized.size)
+        scale *= SCALE_STEP
+
+
+def _write(path, data):
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+        logger.info("Chart archived: %s", path)
+    except OSError as e:
+        logger.error("Failed to archive chart to %s: %s", path, e)
+
+
+def archive(encoded, directory, prefix="upbit_chart"):
+    """directory가 주어졌을 때만 백그라운드로 저장하고 경로를 반환 (없으면 None)"""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    extension = "jpg" if encoded.format == "JPEG" else encoded.format.lower()
+    path = os.path.join(directory, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+    archive_executor.submit(_write, path, encoded.data)
+    return path
@@ -0,0 +1,93 @@
+import base64
+import io
+
+import matplotlib
+matplotlib.use("Agg")  # 화면 없이 렌더링
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+# 업비트 차트와 같은 색 (상승 빨강, 하락 파랑)
+UP_COLOR = "#c84a31"
+DOWN_COLOR = "#1261c4"
+BAND_COLOR = "#f0a30a"
+BACKGROUND_COLOR = "#ffffff"
+GRID_COLOR = "#e9ecf1"
+
+# x축에 표시할 최대 눈금 수
+MAX_TICKS = 8
+
+
+def _time_labels(index):
+    if len(index) > 1 and (index[1:] - index[:-1]).min().total_seconds() >= 86400:
+        return [timestamp.strftime("%m-%d") for timestamp in index]
+    return [timestamp.strftime("%m-%d %H:%M") for timestamp in index]
+
+
+def render_chart(df, title=None, width=1280, height=720, dpi=100, volume=True, lines=()):
+    """
+    OHLCV DataFrame을 캔들 차트 PNG(bytes)로 그린다. bb_bbm/bb_bbh/bb_bbl 컬럼이 있으면 볼린저 밴드를,
+    lines에 준 컬럼(예: "ema_12")은 선으로 함께 그린다.
+    """
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi, facecolor=BACKGROUND_COLOR)
+    FigureCanvasAgg(fig)
+    if volume and "volume" in df.columns:
+        grid = fig.add_gridspec(2, 1, height_ratios=(4, 1), hspace=0.04)
+        ax = fig.add_subplot(grid[0])
+        volume_ax = fig.add_subplot(grid[1], sharex=ax)
+    else:
+        ax = fig.add_subplot(1, 1, 1)
+        volume_ax = None
+
+    x = np.arange(len(df))
+    opens, highs = df["open"].to_numpy(float), df["high"].to_numpy(float)
+    lows, closes = df["low"].to_numpy(float), df["close"].to_numpy(float)
+    colors = np.where(closes >= opens, UP_COLOR, DOWN_COLOR)
+
+    # 꼬리와 몸통 (시가 = 종가인 캔들도 보이도록 최소 높이 지정)
+    ax.vlines(x, lows, highs, colors=colors, linewidth=0.8, zorder=2)
+    minimum_body = (np.nanmax(highs) - np.nanmin(lows)) * 0.001
+    ax.bar(x, np.maximum(np.abs(closes - opens), minimum_body), bottom=np.minimum(opens, closes),
+           width=0.6, color=colors, linewidth=0, zorder=3)
+
+    if {"bb_bbm", "bb_bbh", "bb_bbl"} <= set(df.columns):
+        upper, lower = df["bb_bbh"].to_numpy(float), df["bb_bbl"].to_numpy(float)
+        ax.plot(x, df["bb_bbm"].to_numpy(float), color=BAND_COLOR, linewidth=1, label="BB(20, 2)", zorder=1)
+        ax.plot(x, upper, color=BAND_COLOR, linewidth=0.8, alpha=0.8, zorder=1)
+        ax.plot(x, lower, color=BAND_COLOR, linewidth=0.8, alpha=0.8, zorder=1)
+        ax.fill_between(x, lower, upper, color=BAND_COLOR, alpha=0.08, zorder=0)
+    for column in lines:
+        if column in df.columns:
+            ax.plot(x, df[column].to_numpy(float), linewidth=1, label=column, zorder=1)
+
+    ax.set_xlim(-1, len(df))
+    ax.yaxis.tick_right()
+    ax.grid(True, color=GRID_COLOR, linewidth=0.6)
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:,.0f}"))
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(loc="upper left", fontsize=9, frameon=False)
+    if title:
+        ax.set_title(title, loc="left", fontsize=12)
+
+    if volume_ax is not None:
+        volume_ax.bar(x, df["volume"].to_numpy(float), width=0.6, color=colors, linewidth=0)
+        volume_ax.yaxis.tick_right()
+        volume_ax.grid(True, color=GRID_COLOR, linewidth=0.6)
+        ax.tick_params(labelbottom=False)
+    label_ax = volume_ax or ax
+
+    ticks = np.linspace(0, len(df) - 1, min(MAX_TICKS, len(df))).round().astype(int) if len(df) else []
+    labels = _time_labels(df.index)
+    label_ax.set_xticks(ticks)
+    label_ax.set_xticklabels([labels[i] for i in ticks], fontsize=9)
+
+    fig.subplots_adjust(left=0.04, right=0.91, top=0.94 if title else 0.98, bottom=0.06)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", facecolor=BACKGROUND_COLOR)
+    return buffer.getvalue()
+
+
+def render_chart_base64(df, **kwargs):
+    """render_chart 결과를 vision 모델 입력용 base64 문자열로"""
+    return base64.b64encode(render_chart(df, **kwargs)).decode("utf-8")
@@ -0,0 +1,378 @@
+import argparse
+import base64
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UPBIT_CHART_URL = "https://upbit.com/full_chart?code=CRIX.UPBIT.KRW-BTC"
+
+# 차트 주기별 메뉴 항목 (업비트 ChartIQ 주기 메뉴의 stxtap 값)
+PERIODS = {
+    "1h": "Layout.setPeriodicity(1,60,'minute')",
+    "4h": "Layout.setPeriodicity(1,240,'minute')",
+    "1d": "Layout.setPeriodicity(1,1,'day')",
+}
+
+PERIOD_MENU = ".ciq-menu.ciq-period"
+STUDIES_MENU = ".ciq-menu.ciq-studies"
+BOLLINGER_ITEM = ".ciq-menu.ciq-studies.stxMenuActive cq-studies-content > cq-item:nth-child(15)"
+
+# 스크린샷을 찍을 차트 영역 (메뉴/호가창 등 페이지 나머지는 제외)
+CHART_AREA = "#fullChartiq"
+
+# 메뉴 설정 후 차트가 다시 그려질 때까지 한 번만 기다리는 시간 (초)
+SETTLE_SECONDS = 2
+
+# 워커가 준비(드라이버 설치, 페이지 로드, 탭별 메뉴 설정)를 마칠 때까지 재시작하지 않고 기다려 주는 시간 (초)
+STARTUP_TIMEOUT = 300
+
+
+# ---- 워커 프로세스 (브라우저를 띄워 두고 요청이 오면 스크린샷) ----
+
+def create_driver(headless=True):
+    # 브라우저 관련 패키지는 워커 프로세스에서만 사용
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = Options()
+    options.add_argument("--window-size=1920,1080")
+    if headless:
+        options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    # 뒤에 있는 탭도 차트를 계속 그리도록 백그라운드 탭 절전 끔
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    # 페이지 로드를 기다리지 않고 바로 반환 (여러 탭을 동시에 불러옴, 로드 완료는 메뉴 클릭에서 기다림)
+    options.page_load_strategy = "none"
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+
+
+def click(driver, selector, wait_time=10):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    element = WebDriverWait(driver, wait_time).until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
+    element.click()
+
+
+def configure_chart(driver, period):
+    """현재 탭의 차트 주기와 볼린저 밴드 설정"""
+    click(driver, PERIOD_MENU, wait_time=30)
+    click(driver, f'cq-item[stxtap="{PERIODS[period]}"]')
+    click(driver, STUDIES_MENU)
+    click(driver, BOLLINGER_ITEM)
+
+
+def open_charts(driver, url, periods):
+    """
+    주기마다 탭을 하나씩 열어 차트를 설정하고 {주기: 탭 핸들}을 반환 (브라우저를 띄울 때 한 번만).
+    모든 탭의 페이지를 먼저 요청해 동시에 불러온 뒤 탭별로 메뉴를 설정한다.
+    """
+    tabs = {}
+    for period in periods:
+        if tabs:
+            driver.switch_to.new_window("tab")
+        driver.get(url)
+        tabs[period] = driver.current_window_handle
+    for period, handle in tabs.items():
+        driver.switch_to.window(handle)
+        configure_chart(driver, period)
+    time.sleep(SETTLE_SECONDS)
+    return tabs
+
+
+def capture_chart_area(driver):
+    """차트 영역 요소만 PNG로 캡처 (요소를 못 찾으면 전체 화면)"""
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+
+    try:
+        return driver.find_element(By.CSS_SELECTOR, CHART_AREA).screenshot_as_png
+    except NoSuchElementException:
+        return driver.get_screenshot_as_png()
+
+
+def _quit(driver):
+    if driver is not None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+def _read_commands(commands):
+    for line in sys.stdin:
+        commands.put(line.strip())
+    commands.put("stop")  # 부모 프로세스가 종료됨
+
+
+def _send(output, message):
+    output.write(json.dumps(message) + "\n")
+    output.flush()
+
+
+def capture_tabs(driver, tabs):
+    """탭마다 차트 영역 캡처 (차트는 모든 탭에서 계속 갱신되고 있으므로 탭 전환 후 바로 찍음)"""
+    images = {}
+    for period, handle in tabs.items():
+        driver.switch_to.window(handle)
+        images[period] = capture_chart_area(driver)
+    return images
+
+
+def serve(url, periods, headless=True, refresh=None):
+    """
+    periods의 차트를 한 브라우저의 탭들에 띄워 두고 표준 입력으로 "capture" / "stop" 명령을 받는다.
+    한 번의 캡처로 모든 주기의 스크린샷을 표준 출력에 JSON 한 줄로 쓴다.
+    브라우저를 (다시) 띄우기 시작하면 {"status": "starting"}, 차트 설정이 끝나면 {"status": "ready"}를 보낸다.
+    refresh초가 주어지면 요청이 없어도 주기적으로 스크린샷을 보낸다. 브라우저 오류가 나면 다시 띄운다.
+    """
+    output = sys.stdout
+    sys.stdout = sys.stderr  # 라이브러리 출력이 프로토콜과 섞이지 않도록
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    commands = queue.Queue()
+    threading.Thread(target=_read_commands, args=(commands,), daemon=True).start()
+
+    driver, delay, pending, starting = None, 1, False, False
+    try:
+        while True:
+            if driver is None:
+                if not starting:
+                    _send(output, {"status": "starting"})
+                    starting = True
+                try:
+                    driver = create_driver(headless)
+                    tabs = open_charts(driver, url, periods)
+                    logger.info("Charts ready: %s (%s)", url, ", ".join(periods))
+                    _send(output, {"status": "ready"})
+                    delay, starting = 1, False
+                except Exception as e:
+                    logger.error("Failed to open chart (%s); retrying in %ds", e, delay)
+                    _quit(driver)
+                    driver = None
+                    try:
+                        command = commands.get(timeout=delay)
+                        if command == "stop":
+                            break
+                        pending = pending or command == "capture"
+                    except queue.Empty:
+                        pass
+                    delay = min(delay * 2, 60)
+                    continue
+
+            if pending:
+                command = "capture"
+            else:
+                try:
+                    command = commands.get(timeout=refresh)
+                except queue.Empty:
+                    command = "capture"
+            if command == "stop":
+                break
+            if command != "capture":
+                continue
+
+            try:
+                images = capture_tabs(driver, tabs)
+            except Exception as e:
+                logger.error("Screenshot failed (%s); restarting browser", e)
+                _quit(driver)
+                driver, pending = None, True
+                continue
+            pending = False
+            _send(output, {
+                "captured_at": time.time(),
+                "images": {period: base64.b64encode(png).decode("ascii") for period, png in images.items()},
+            })
+    finally:
+        _quit(driver)
+
+
+# ---- 매매 프로세스 쪽 (워커 실행, 감시, 재시작) ----
+
+class ChartWorker:
+    """
+    차트 페이지를 띄워 둔 브라우저 워커 프로세스를 관리한다. 워커가 죽거나 응답이 없으면 다시 띄우고,
+    캡처 실패는 None으로 돌려주므로 매매 루프는 브라우저 오류와 상관없이 계속 돈다.
+    워커가 아직 준비 중이면 (콜드 스타트) 캡처를 건너뛸 뿐 재시작하지 않아, 느린 시작도 끝까지 데워진다.
+    """
+
+    def __init__(self, url=UPBIT_CHART_URL, periods=("1h",), headless=True, refresh=None, restart_delay=5,
+                 startup_timeout=STARTUP_TIMEOUT):
+        self.url = url
+        self.periods = list(periods)
+        self.headless = headless
+        self.refresh = refresh
+        self.restart_delay = restart_delay
+        self.startup_timeout = startup_timeout
+
+        self.lock = threading.Lock()
+        self.images = queue.Queue(maxsize=1)  # 가장 최근 스크린샷만 보관
+        self.latest = None
+        self.process = None
+        self.ready = threading.Event()  # 워커가 차트를 모두 띄워 캡처할 수 있는 상태
+        self.started_at = 0.0
+        self.starting_since = 0.0
+        self.restarts = 0
+
+    def _command(self):
+        command = [sys.executable, os.path.abspath(__file__), "--url", self.url, "--periods", *self.periods]
+        if self.refresh:
+            command += ["--refresh", str(self.refresh)]
+        if not self.headless:
+            command.append("--show")
+        return command
+
+    def start(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                return self
+            self.ready.clear()
+            self.process = subprocess.Popen(self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            text=True, bufsize=1)
+            self.started_at = self.starting_since = time.monotonic()
+        threading.Thread(target=self._read, args=(self.process,), name="chart-worker-reader", daemon=True).start()
+        logger.info("Chart worker started (pid %d)", self.process.pid)
+        return self
+
+    def _read(self, process):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("status") == "starting":
+                # 브라우저 오류로 워커가 브라우저를 다시 띄우는 중
+                if self.ready.is_set():
+                    self.starting_since = time.monotonic()
+                self.ready.clear()
+                continue
+            if message.get("status") == "ready":
+                logger.info("Chart worker ready after %.1fs", time.monotonic() - self.starting_since)
+                self.ready.set()
+                continue
+            captured = {
+                "captured_at": message["captured_at"],
+                "images": {name: base64.b64decode(data) for name, data in message["images"].items()},
+            }
+            self.latest = captured
+            try:
+                self.images.get_nowait()
+            except queue.Empty:
+                pass
+            self.images.put(captured)
+        logger.warning("Chart worker exited (code %s)", process.wait())
+
+    def _ensure_running(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        # 연달아 죽으면 restart_delay 간격을 두고 다시 띄움
+        if self.process is not None:
+            self.restarts += 1
+            wait = self.restart_delay - (time.monotonic() - self.started_at)
+            if wait > 0:
+                time.sleep(wait)
+        self.start()
+
+    def restart(self):
+        self._terminate()
+        self._ensure_running()
+
+    def _wait_ready(self, timeout):
+        """timeout초 동안 준비를 기다린다. startup_timeout이 지나도록 준비되지 않은 워커만 다시 띄움"""
+        if self.ready.wait(timeout):
+            return True
+        starting_for = time.monotonic() - self.starting_since
+        if starting_for > self.startup_timeout:
+            logger.error("Chart worker not ready after %.0fs; restarting worker", starting_for)
+            self.restart()
+        else:
+            logger.warning("Chart worker is still starting (%.0fs); skipping this capture", starting_for)
+        return False
+
+    def capture(self, timeout=30):
+        """
+        새 스크린샷을 요청하고 기다린다. {주기: PNG bytes} 또는 시간 초과/오류 시 None.
+        timeout은 준비된 워커의 캡처에만 적용하고, 준비 중인 워커는 timeout초까지만 기다렸다가 None 반환.
+        """
+        self._ensure_running()
+        if not self._wait_ready(timeout):
+            return None
+        requested = time.time()
+        try:
+            self.process.stdin.write("capture\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            logger.error("Chart worker is not accepting commands: %s", e)
+            self.restart()
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if not self.ready.is_set():
+                    # 캡처 중 브라우저 오류로 워커가 브라우저를 다시 띄우는 중이면 재시작하지 않음
+                    logger.warning("Chart worker is restarting its browser; skipping this capture")
+                    return None
+                logger.error("Chart capture timed out after %ss; restarting worker", timeout)
+                self.restart()
+                return None
+            try:
+                captured = self.images.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if captured["captured_at"] >= requested:
+                return captured["images"]
+
+    def latest_images(self, max_age=None):
+        """가장 최근 스크린샷 (max_age초보다 오래됐으면 None)"""
+        captured = self.latest
+        if captured is None or (max_age is not None and time.time() - captured["captured_at"] > max_age):
+            return None
+        return captured["images"]
+
+    def _terminate(self):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.write("stop\n")
+            process.stdin.flush()
+            process.wait(timeout=10)
+        except Exception:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def stop(self):
+        self._terminate()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="차트 페이지를 띄워 두고 스크린샷을 찍는 브라우저 워커")
+    parser.add_argument("--url", default=UPBIT_CHART_URL)
+    parser.add_argument("--periods", nargs="+", choices=sorted(PERIODS), default=["1h"])
+    parser.add_argument("--refresh", type=float, help="요청이 없어도 이 간격(초)으로 스크린샷")
+    parser.add_argument("--show", action="store_true", help="브라우저 창 표시")
+    args = parser.parse_args()
+    serve(args.url, args.periods, headless=not args.show, refresh=args.refresh)
@@ -0,0 +1,178 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 요청 그룹별 기본 초당 요청 수 (Remaining-Req 헤더를 받으면 그 값을 따름)
+DEFAULT_RATES = {
+    "default": 10,
+    "order": 8,
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지는 토큰 버킷 (스레드 안전)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """토큰이 생길 때까지 기다린 뒤 하나 사용하고, 기다린 시간을 반환"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def limit_remaining(self, remaining):
+        """거래소가 알려준 남은 요청 수보다 많이 보내지 않도록 토큰을 줄임"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, remaining)
+
+    def drain(self):
+        with self.lock:
+            self._refill()
+            self.tokens = 0
+
+
+def parse_remaining_req(header):
+    """'group=default; min=1799; sec=29' -> ('default', 29)"""
+    if not header:
+        return None, None
+    fields = dict(part.strip().split("=", 1) for part in header.split(";") if "=" in part)
+    sec = fields.get("sec")
+    return fields.get("group"), int(sec) if sec is not None and sec.isdigit() else None
+
+
+class ExchangeClient:
+    """
+    거래소 REST API용 공유 클라이언트.
+    keep-alive 커넥션 풀, 요청 그룹별 토큰 버킷, 재시도(지수 백오프), 호출별 지연 시간 기록을 제공한다.
+    """
+
+    def __init__(self, base_url, rates=None, timeout=10, max_retries=3, backoff=0.5, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.rates = {**DEFAULT_RATES, **(rates or {})}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.path_groups = {}  # 응답 헤더로 알아낸 경로별 요청 그룹
+        self.metrics = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "total_time": 0.0, "max_time": 0.0})
+
+    def _bucket(self, group):
+        with self.lock:
+            if group not in self.buckets:
+                self.buckets[group] = TokenBucket(self.rates.get(group, self.rates["default"]))
+            return self.buckets[group]
+
+    def _record(self, path, elapsed, error=False, retry=False):
+        with self.lock:
+            metric = self.metrics[path]
+            if retry:
+                metric["retries"] += 1
+                return
+            metric["calls"] += 1
+            metric["errors"] += int(error)
+            metric["total_time"] += elapsed
+            metric["max_time"] = max(metric["max_time"], elapsed)
+
+    def request(self, method, path, group=None, retry=True, auth=None, **kwargs):
+        """
+        요청을 보내고 requests.Response를 반환한다.
+        retry=False면 429(요청 거부)일 때만 재시도한다 (주문처럼 중복 실행되면 안 되는 요청용).
+        auth는 인증 헤더 dict를 만드는 함수로, 시도마다 새로 호출한다 (JWT의 nonce/timestamp는 재사용 불가).
+        """
+        url = f"{self.base_url}{path}"
+        group = group or self.path_groups.get(path, "default")
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.pop("headers", None) or {}
+
+        for attempt in range(self.max_retries + 1):
+            bucket = self._bucket(group)
+            bucket.acquire()
+
+            started = time.perf_counter()
+            try:
+                request_headers = {**headers, **auth()} if auth is not None else headers
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(path, time.perf_counter() - started, error=True)
+                if not retry or attempt == self.max_retries:
+                    raise
+                logger.warning("%s %s failed (%s), retrying", method, path, e)
+                self._sleep_backoff(path, attempt)
+                continue
+            elapsed = time.perf_counter() - started
+
+            header_group, remaining = parse_remaining_req(response.headers.get("Remaining-Req"))
+            if header_group:
+                self.path_groups[path] = header_group
+                if header_group != group:
+                    group = header_group
+                    bucket = self._bucket(group)
+            if remaining is not None:
+                bucket.limit_remaining(remaining)
+
+            error = response.status_code >= 400
+            self._record(path, elapsed, error=error)
+            if response.status_code == 429:
+                bucket.drain()
+            retryable = response.status_code == 429 or (retry and response.status_code in RETRY_STATUS)
+            if not retryable or attempt == self.max_retries:
+                return response
+
+            logger.warning("%s %s returned %s, retrying", method, path, response.status_code)
+            self._sleep_backoff(path, attempt, response.headers.get("Retry-After"))
+
+    def _sleep_backoff(self, path, attempt, retry_after=None):
+        self._record(path, 0, retry=True)
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff * (2 ** attempt) * (1 + random.random())
+        time.sleep(delay)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def get_metrics(self):
+        """경로별 호출 수, 오류/재시도 수, 평균/최대 지연 시간(초)"""
+        with self.lock:
+            return {
+                path: {**metric, "avg_time": metric["total_time"] / metric["calls"] if metric["calls"] else 0.0}
+                for path, metric in self.metrics.items()
+            }
@@ -1,16 +1,10 @@
 import os
 from dotenv import load_dotenv
 import pyupbit
-import pandas as pd
-import json
 from openai import OpenAI
-import ta
 from ta.utils import dropna
 import time
 import requests
-import base64
-from PIL import Image
-import io
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -20,44 +14,61 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, WebDriverException, NoSuchElementException
 import logging
-from datetime import datetime, timedelta
 from youtube_transcript_api import YouTubeTranscriptApi
 from pydantic import BaseModel
 from openai import OpenAI
-import sqlite3
+import streaming_indicators
+import candle_store
+import market_snapshot
+import realtime_feed
+import l2_book
+import prompt_encoder
+import reflection_cache
+import llm_metrics
+import strategy_index
+import local_decision
+import trade_db
+import snapshot_archive
+import trade_journal
+import trade_history
+import chart_image
 
 class TradingDecision(BaseModel):
     decision: str
     percentage: int
     reason: str
 
+# 회고와 매매 결정을 한 번의 호출로 받을 때의 응답
+class FusedTradingDecision(TradingDecision):
+    reflection: str
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-def add_indicators(df):
-    # 볼린저 밴드
-    indicator_bb = ta.volatility.BollingerBands(close=df['close'], window=20, window_dev=2)
-    df['bb_bbm'] = indicator_bb.bollinger_mavg()
-    df['bb_bbh'] = indicator_bb.bollinger_hband()
-    df['bb_bbl'] = indicator_bb.bollinger_lband()
-    
-    # RSI
-    df['rsi'] = ta.momentum.RSIIndicator(close=df['close'], window=14).rsi()
-    
-    # MACD
-    macd = ta.trend.MACD(close=df['close'])
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    df['macd_diff'] = macd.macd_diff()
-    
-    # 이동평균선
-    df['sma_20'] = ta.trend.SMAIndicator(close=df['close'], window=20).sma_indicator()
-    df['ema_12'] = ta.trend.EMAIndicator(close=df['close'], window=12).ema_indicator()
-    
-    return df
+# 보조 지표 엔진 생성 (볼린저 밴드, RSI, MACD, 이동평균선)
+def create_indicator_engine():
+    return streaming_indicators.IndicatorEngine([
+        streaming_indicators.BollingerBands(window=20, window_dev=2),
+        streaming_indicators.RSI(window=14),
+        streaming_indicators.MACD(),
+        streaming_indicators.SMA(window=20),
+        streaming_indicators.EMA(window=12),
+    ])
+
+# (마켓, 봉 간격)별 지표 엔진 - 사이클마다 새로 들어온 캔들만 계산
+indicator_engines = {}
+
+def add_indicators(df, key=None):
+    # key가 없으면 df 전체로 새로 계산 (ta와 동일한 결과)
+    if key is None:
+        return create_indicator_engine().add_indicators(df)
+
+    if key not in indicator_engines:
+        indicator_engines[key] = create_indicator_engine()
+    return indicator_engines[key].add_indicators(df)
 
 def get_fear_and_greed_index():
     url = "https://api.alternative.me/fng/"
@@ -184,39 +195,24 @@ def perform_chart_actions(driver):
         "볼린저 밴드 옵션"
     )
 
+# vision 입력 이미지 예산 (토큰 수, bytes)과 스크린샷 보관 폴더 (비워 두면 디스크에 쓰지 않음)
+VISION_TOKEN_BUDGET = int(os.getenv("VISION_TOKEN_BUDGET", "765"))
+VISION_MAX_BYTES = int(os.getenv("VISION_MAX_BYTES", "500000"))
+CHART_ARCHIVE_DIR = os.getenv("CHART_ARCHIVE_DIR", "")
+
 def capture_and_encode_screenshot(driver):
+    """스크린샷을 메모리에서 한 번만 인코딩. (chart_image.EncodedImage, 보관 경로 또는 None)"""
     try:
-        # 스크린샷 캡처
+        # 스크린샷 캡처 후 차트 영역만 남기고 예산에 맞게 인코딩
         png = driver.get_screenshot_as_png()
-        
-        # PIL Image로 변환
-        img = Image.open(io.BytesIO(png))
-        
-        # 이미지 리사이즈 (OpenAI API 제한에 맞춤)
-        img.thumbnail((2000, 2000))
-        
-        # 현재 시간을 파일명에 포함
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"upbit_chart_{current_time}.png"
-        
-        # 현재 스크립트의 경로를 가져옴
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 파일 저장 경로 설정
-        file_path = os.path.join(script_dir, filename)
-        
-        # 이미지 파일로 저장
-        img.save(file_path)
-        logger.info(f"스크린샷이 저장되었습니다: {file_path}")
-        
-        # 이미지를 바이트로 변환
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        
-        # base64로 인코딩
-        base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        
-        return base64_image, file_path
+        encoded = chart_image.encode_image(png, crop="auto", max_bytes=VISION_MAX_BYTES,
+                                           max_tokens=VISION_TOKEN_BUDGET)
+        logger.info(f"스크린샷 인코딩: {encoded.format} {encoded.width}x{encoded.height}, "
+                    f"{len(encoded.data)} bytes, 약 {encoded.tokens} 토큰")
+
+        # 보관이 켜져 있을 때만 백그라운드로 저장
+        file_path = chart_image.archive(encoded, CHART_ARCHIVE_DIR)
+        return encoded, file_path
     except Exception as e:
         logger.error(f"스크린샷 캡처 및 인코딩 중 오류 발생: {e}")
         return None, None
@@ -234,71 +230,27 @@ def get_combined_transcript(playlist):
     
     return subscribes
 
-# SQLite DB 연결 및 테이블 생성 함수 (연결을 반환)
-def init_db():
-    conn = sqlite3.connect('trading_data.db')
-    cursor = conn.cursor()
-    
-    # 테이블이 존재하지 않으면 생성
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS trades (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        decision TEXT,
-        percentage INTEGER,
-        reason TEXT,
-        btc_balance REAL,
-        krw_balance REAL,
-        btc_avg_buy_price REAL,
-        btc_krw_price REAL,
-        total_asset REAL,
-        reflection TEXT
-    )
-    ''')
-    
-    conn.commit()
-    return conn  # 연결을 닫지 않고 반환하여 이후 트랜잭션에서 계속 사용할 수 있도록 함
-
-def get_db_connection():
-    return sqlite3.connect('trading_data.db')
-
-# 매매 데이터를 DB에 저장하는 함수 (conn을 전달받아 사용)
-def save_trade_data_with_reflection(conn, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection):
-    cursor = conn.cursor()
-
-    # 현재 시간을 가져옴
-    current_time = datetime.now().isoformat()
-
-    # 데이터를 테이블에 삽입
-    cursor.execute('''
-    INSERT INTO trades (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (current_time, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection))
-    
-    conn.commit()
+# 매매 데이터를 저장 큐에 넣는 함수 (저장되면 on_saved(trade_id) 호출)
+def save_trade_data_with_reflection(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection, on_saved=None):
+    return journal.record_trade(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price,
+                                btc_krw_price, total_asset, reflection, on_saved=on_saved)
 
 def get_recent_trades(conn, days=7):
-    c = conn.cursor()
-    seven_days_ago = (datetime.now() - timedelta(days=days)).isoformat()
-    c.execute("SELECT * FROM trades WHERE timestamp > ? ORDER BY timestamp DESC", (seven_days_ago,))
-    columns = [column[0] for column in c.description]
-    return pd.DataFrame.from_records(data=c.fetchall(), columns=columns)
+    return trade_db.recent_trades(conn, days)
 
 
-def calculate_performance(trades_df):
-    if trades_df.empty:
-        return 0
-    
-    initial_balance = trades_df.iloc[-1]['krw_balance'] + trades_df.iloc[-1]['btc_balance'] * trades_df.iloc[-1]['btc_krw_price']
-    final_balance = trades_df.iloc[0]['krw_balance'] + trades_df.iloc[0]['btc_balance'] * trades_df.iloc[0]['btc_krw_price']
-    
-    return (final_balance - initial_balance) / initial_balance * 100
+# 최근 days일 동안의 평가 자산 변화율 (필요한 숫자 컬럼만 NumPy로 읽어 계산)
+def calculate_performance(days=7):
+    with trade_reads.connection() as conn:
+        history = trade_history.load(conn, trade_history.EQUITY_COLUMNS, days=days)
+    return trade_history.performance(history)["return_pct"]
 
 def generate_reflection(trades_df, current_market_data):
-    performance = calculate_performance(trades_df)
+    performance = calculate_performance()
     
     client = OpenAI()
-    response = client.chat.completions.create(
+    response = llm.chat(
+        client, "reflection",
         model="gpt-4o-2024-08-06",
         messages=[
             {
@@ -325,53 +277,160 @@ def generate_reflection(trades_df, current_market_data):
                 Limit your response to 250 words or less.
                 """
             }
-        ]
+        ],
+        # 마감 후에도 executor 작업자를 붙잡고 있지 않도록 HTTP 요청에도 같은 제한을 적용
+        timeout=REFLECTION_DEADLINE
     )
     
     return response.choices[0].message.content
 
-# 처음에 없다면 db를 만들어줘야한다.
-init_db()
+# 매매 결정 응답 JSON 스키마 (fused=True면 결정 전에 회고를 먼저 작성하도록 reflection 필드 추가)
+def decision_response_format(fused=False):
+    properties = {
+        "decision": {"type": "string", "enum": ["buy", "sell", "hold"]},
+        "percentage": {
+            "type": "integer"
+        },
+        "reason": {"type": "string"}
+    }
+    if fused:
+        properties = {"reflection": {"type": "string"}, **properties}
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "trading_decision",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+# 매매 결정 요청 (응답을 TradingDecision으로 검증, fused면 reflection 포함)
+def request_decision(client, messages):
+    response = llm.chat(
+        client, "decision+reflection" if FUSED_REFLECTION else "decision",
+        model="gpt-4o-2024-08-06",
+        messages=messages,
+        response_format=decision_response_format(fused=FUSED_REFLECTION),
+        max_tokens=4095,
+        timeout=DECISION_DEADLINE
+    )
+    decision_model = FusedTradingDecision if FUSED_REFLECTION else TradingDecision
+    return decision_model.model_validate_json(response.choices[0].message.content)
+
+# 거래 기록은 전용 스레드가 모아서 저장하고 (write-behind), 조회는 읽기 전용 연결 풀로
+# (처음 연결할 때 trades 테이블을 만들거나 최신 스키마로 마이그레이션)
+journal = trade_journal.TradeJournal('trading_data.db')
+trade_reads = trade_journal.ReadPool('trading_data.db')
+
+# 회고 결과 캐시
+# 8시간 주기라 기본 TTL(6시간)로는 다음 사이클까지 남지 않음 -> 하루 동안 유지
+reflections = reflection_cache.ReflectionCache('trading_data.db', ttl=24 * 3600)
+
+# LLM 호출별 토큰/소요 시간/비용 기록 (trades.id와 연결)
+llm = llm_metrics.LLMMetrics('trading_data.db')
+
+# 매매 결정마다 모델이 본 입력을 압축해 trades.id로 저장 (재현/감사용)
+snapshots = snapshot_archive.SnapshotArchive('snapshots.db')
+
+# 캔들 로컬 저장소 (마지막 저장 이후 캔들만 새로 받아옴)
+candles = candle_store.CandleStore('candles.db')
+
+# 전략 문서 검색 인덱스 (strategy.txt가 바뀌었을 때만 다시 색인, 자막 추가는 strategy_index.py --videos)
+strategies = strategy_index.StrategyIndex('strategy_index.db')
+strategies.add_file('strategy.txt')
+
+# 업비트 실시간 현재가/호가 (WebSocket, 백그라운드 스레드) - 끊기면 REST로 대체
+feed = realtime_feed.RealtimeFeed(realtime_feed.UPBIT_WS_URL, codes=["KRW-BTC"]).start()
+
+# 데이터 소스별 수집 타임아웃 (초)
+GATHER_TIMEOUTS = {
+    "balances": 5,
+    "orderbook": 5,
+    "current_price": 5,
+    "df_daily": 10,
+    "df_hourly": 10,
+    "fear_greed_index": 5,
+    "news_headlines": 10,
+}
+
+# true면 회고와 매매 결정을 한 번의 구조화 출력 호출로 생성 (LLM 호출 2회 -> 1회)
+FUSED_REFLECTION = os.getenv("FUSED_REFLECTION", "false").lower() == "true"
+
+# LLM 응답 마감 시간 (초) - 넘기면 회고는 생략하고 결정은 로컬 규칙 기반 모델이 내림
+DECISION_DEADLINE = float(os.getenv("DECISION_DEADLINE", "60"))
+REFLECTION_DEADLINE = float(os.getenv("REFLECTION_DEADLINE", "60"))
+
+# 프롬프트에 넣는 시장 데이터의 토큰 예산 (의사결정 / 회고)
+PROMPT_TOKEN_BUDGET = 4000
+REFLECTION_TOKEN_BUDGET = 2000
+
+# 프롬프트에 넣을 전략 청크 수와 토큰 예산
+STRATEGY_TOP_K = 6
+STRATEGY_TOKEN_BUDGET = 1500
+
+# 캔들 조회 후 보조지표 추가
+def get_ohlcv_with_indicators(interval, count):
+    df = candle_store.get_ohlcv(
+        candles, "upbit", "KRW-BTC", interval, count,
+        lambda n: pyupbit.get_ohlcv("KRW-BTC", interval=interval, count=n)
+    )
+    df = dropna(df)
+    return add_indicators(df, ("KRW-BTC", interval))
+
+# 주문 금액만큼 호가를 소진했을 때의 예상 체결가 기록
+def log_expected_fill(book, direction, notional):
+    if book is None:
+        return
+    price, filled, _ = book.vwap(direction, notional)
+    if price is None:
+        return
+    logger.info(f"Expected {direction} VWAP: {price:,.0f} KRW ({filled:,.0f} of {notional:,.0f} KRW within visible depth)")
 
 # 매매 판단 및 실행 함수
 def ai_trading():
+    llm.start_cycle()
+
     # Upbit 객체 생성
     access = os.getenv("UPBIT_ACCESS_KEY")
     secret = os.getenv("UPBIT_SECRET_KEY")
     upbit = pyupbit.Upbit(access, secret)
 
-    # 1. 현재 투자 상태 조회
-    all_balances = upbit.get_balances()
+    # 1~6. 잔고, 오더북, 현재가, 차트 데이터, 공포 탐욕 지수, 뉴스를 병렬로 수집
+    snapshot = market_snapshot.gather_market_snapshot(
+        {
+            "balances": upbit.get_balances,
+            "orderbook": lambda: feed.get_orderbook("KRW-BTC") or pyupbit.get_orderbook("KRW-BTC"),
+            "current_price": lambda: feed.get_current_price("KRW-BTC") or pyupbit.get_current_price("KRW-BTC"),
+            "df_daily": lambda: get_ohlcv_with_indicators("day", 30),
+            "df_hourly": lambda: get_ohlcv_with_indicators("minute60", 24),
+            "fear_greed_index": get_fear_and_greed_index,
+            "news_headlines": get_latest_news,
+        },
+        timeouts=GATHER_TIMEOUTS,
+        required=("balances", "current_price", "df_daily", "df_hourly"),
+    )
 
     # BTC와 KRW 잔액 조회
-    btc_balance = upbit.get_balance("BTC")
-    krw_balance = upbit.get_balance("KRW")
-    btc_avg_buy_price = None
-    for balance in all_balances:
-        if balance['currency'] == 'BTC':
-            btc_avg_buy_price = float(balance['avg_buy_price'])
-            break
-
-    # 2. 오더북(호가 데이터) 조회
-    orderbook = pyupbit.get_orderbook("KRW-BTC")
-    
-    # 3. 현재 BTC 가격 조회
-    btc_krw_price = pyupbit.get_current_price("KRW-BTC")
-
-    # 4. 차트 데이터 조회 및 보조지표 추가
-    df_daily = pyupbit.get_ohlcv("KRW-BTC", interval="day", count=30)
-    df_daily = dropna(df_daily)
-    df_daily = add_indicators(df_daily)
-    
-    df_hourly = pyupbit.get_ohlcv("KRW-BTC", interval="minute60", count=24)
-    df_hourly = dropna(df_hourly)
-    df_hourly = add_indicators(df_hourly)
-
-    # 5. 공포 탐욕 지수 가져오기
-    fear_greed_index = get_fear_and_greed_index()
-
-    # 6. 뉴스 헤드라인 가져오기
-    news_headlines = get_latest_news()
+    all_balances = snapshot.balances
+    btc_balance = next((float(balance['balance']) for balance in all_balances if balance['currency'] == 'BTC'), 0)
+    krw_balance = next((float(balance['balance']) for balance in all_balances if balance['currency'] == 'KRW'), 0)
+    btc_avg_buy_price = next((float(balance['avg_buy_price']) for balance in all_balances if balance['currency'] == 'BTC'), None)
+
+    orderbook = snapshot.orderbook
+    # 호가창 요약 지표 (스프레드, 호가 불균형, 주문 금액 기준 VWAP)
+    book = l2_book.L2OrderBook.from_orderbook(orderbook) if orderbook else None
+    orderbook_features = book.features() if book else None
+    btc_krw_price = snapshot.current_price
+    df_daily = snapshot.df_daily
+    df_hourly = snapshot.df_hourly
+    fear_greed_index = snapshot.fear_greed_index
+    news_headlines = snapshot.news_headlines or []
 
     # 7. YouTube 자막 데이터 가져오기
     # playlist = ['6itriowPhhM', 'Ln2PevCHEuU', 'Li3EV0YVuSg', '3XbtEX3jUv4']
@@ -384,38 +443,71 @@ def ai_trading():
     #     f.write(youtube_transcript_str)
     # f.close()
 
-    # 파일에서 YouTube 자막 데이터를 읽어오기
-    f = open("strategy.txt", "r", encoding="UTF-8")
-    youtube_transcript = f.read()
-    f.close()
+    # 색인된 YouTube 자막 중 현재 시장 상황과 관련된 부분만 가져오기
+    youtube_transcript = strategies.retrieve(
+        strategy_index.market_query(df_daily, df_hourly, fear_greed_index),
+        k=STRATEGY_TOP_K, budget=STRATEGY_TOKEN_BUDGET
+    )
 
     # 8. AI에게 데이터 제공하고 판단 받기
     client = OpenAI()
 
     # 8. 과거 거래 조회 및 성과 계산
-    # 데이터베이스 연결
-    conn = get_db_connection()
+    # 최근 거래 내역 가져오기 (읽기 전용 연결)
+    with trade_reads.connection() as conn:
+        recent_trades = get_recent_trades(conn)
     
-    # 최근 거래 내역 가져오기
-    recent_trades = get_recent_trades(conn)
-    
-    # 현재 시장 데이터 수집 (기존 코드에서 가져온 데이터 사용)
-    current_market_data = {
-        "fear_greed_index": fear_greed_index,
-        "news_headlines": news_headlines,
-        "orderbook": orderbook,
-        "daily_ohlcv": df_daily.to_dict(),
-        "hourly_ohlcv": df_hourly.to_dict()
-    }
     # 반성 및 개선 내용 생성
-    reflection = generate_reflection(recent_trades, current_market_data)
-
-    response = client.chat.completions.create(
-    model="gpt-4o-2024-08-06",
-    messages=[
+    if FUSED_REFLECTION:
+        # 회고는 매매 결정 호출에서 함께 생성 (LLM 호출 1회)
+        reflection_section = """Recent trading reflection:
+            Before deciding, write a brief reflection (250 words or less) in the 'reflection' field:
+            what worked well and what didn't in the recent trades listed in the user message,
+            suggestions for improvement, and any patterns or trends you notice in the market data.
+            Then make your decision taking that reflection into account."""
+        reflection_data = f"""
+        Recent trading data: {recent_trades.to_json(orient='records')}
+        Overall performance in the last 7 days: {calculate_performance():.2f}%"""
+    else:
+        # 최근 거래와 시장 상황이 그대로면 캐시된 회고 재사용
+        reflection_key = reflection_cache.make_key(
+            recent_trades,
+            reflection_cache.market_digest(btc_krw_price, df_daily, df_hourly, fear_greed_index)
+        )
+        # 현재 시장 데이터 수집 (기존 코드에서 가져온 데이터 사용, 토큰 예산에 맞춰 압축)
+        current_market_data, _ = prompt_encoder.encode_market_data({
+            "fear_greed_index": fear_greed_index,
+            "news_headlines": news_headlines,
+            "orderbook": orderbook_features,
+            "daily_ohlcv": df_daily,
+            "hourly_ohlcv": df_hourly
+        }, budget=REFLECTION_TOKEN_BUDGET)
+        reflection, _ = local_decision.call_with_deadline(
+            lambda: reflections.get_or_generate(
+                reflection_key, lambda: generate_reflection(recent_trades, current_market_data)
+            ),
+            lambda: "No reflection available for this cycle.",
+            REFLECTION_DEADLINE, "Reflection call"
+        )
+        reflection_section = f"""Recent trading reflection:
+            {reflection}"""
+        reflection_data = ""
+
+    # 의사결정 프롬프트용 시장 데이터 (섹션별 토큰 수 기록)
+    market_data_prompt, token_counts = prompt_encoder.encode_market_data({
+        "Current investment status": all_balances,
+        "Orderbook": orderbook_features,
+        "Daily OHLCV with indicators (30 days)": df_daily,
+        "Hourly OHLCV with indicators (24 hours)": df_hourly,
+        "Recent news headlines": news_headlines,
+        "Fear and Greed Index": fear_greed_index,
+    }, budget=PROMPT_TOKEN_BUDGET)
+    logger.info(f"Prompt tokens by section: {token_counts}")
+
+    messages = [
         {
             "role": "system",
-            "content": """You are an expert in Bitcoin investing and must always incorporate the trading strategies of the legendary Korean investor 'Wonyoti,' as outlined in the provided YouTube video transcript (in Korean). Analyze the provided data and give priority to Wonyoti's strategies when making your decision. Your analysis should include:
+            "content": f"""You are an expert in Bitcoin investing and must always incorporate the trading strategies of the legendary Korean investor 'Wonyoti,' as outlined in the provided YouTube video transcript (in Korean). Analyze the provided data and give priority to Wonyoti's strategies when making your decision. Your analysis should include:
             - Technical indicators and market data
             - Recent news headlines and their potential impact on Bitcoin price
             - The Fear and Greed Index and its implications
@@ -423,8 +515,7 @@ def ai_trading():
             - The strategies from the four YouTube videos
             - Recent trading performance and reflection
 
-            Recent trading reflection:
-            {reflection}
+            {reflection_section}
 
             Response format:
                 1. Decision (buy, sell, or hold)
@@ -440,39 +531,22 @@ def ai_trading():
         },
         {
             "role": "user",
-            "content": f"""Current investment status: {json.dumps(all_balances)}
-        Orderbook: {json.dumps(orderbook)}
-        Daily OHLCV with indicators (30 days): {df_daily.to_json()}
-        Hourly OHLCV with indicators (24 hours): {df_hourly.to_json()}
-        Recent news headlines: {json.dumps(news_headlines)}
-        Fear and Greed Index: {json.dumps(fear_greed_index)}
+            "content": f"""{market_data_prompt}{reflection_data}
         YouTube Video Transcript: {youtube_transcript}"""
         }
-    ],
-    response_format={
-        "type": "json_schema",
-        "json_schema": {
-            "name": "trading_decision",
-            "strict": True,
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "decision": {"type": "string", "enum": ["buy", "sell", "hold"]},
-                    "percentage": {
-                        "type": "integer"
-                    },
-                    "reason": {"type": "string"}
-                },
-                "required": ["decision", "percentage", "reason"],
-                "additionalProperties": False
-            }
-        }
-    },
-    max_tokens=4095
-    )
+    ]
 
-    # 최신 pydantic 메서드 사용
-    result = TradingDecision.model_validate_json(response.choices[0].message.content)
+    # LLM이 DECISION_DEADLINE초 안에 답하지 못하거나 실패하면 보조지표 기반 로컬 모델로 결정
+    result, used_fallback = local_decision.call_with_deadline(
+        lambda: request_decision(client, messages),
+        lambda: TradingDecision(**local_decision.score_decision(df_daily, df_hourly, fear_greed_index, orderbook_features)),
+        DECISION_DEADLINE, "Decision call"
+    )
+    if FUSED_REFLECTION:
+        if used_fallback:
+            reflection = "No reflection this cycle (local fallback decision)."
+        else:
+            reflection = result.reflection
 
     print(f"### AI Decision: {result.decision.upper()} ###")
     print(f"### Reason: {result.reason} ###")
@@ -485,6 +559,7 @@ def ai_trading():
         amount_to_buy = krw_balance * (result.percentage / 100) * 0.9995  # 지정된 비율만큼 매수
         if amount_to_buy > 5000:
             print(f"### Buy Order Executed: Buying {result.percentage}% of available KRW ###")
+            log_expected_fill(book, "buy", amount_to_buy)
             order_result = upbit.buy_market_order("KRW-BTC", amount_to_buy)
             print(order_result)
         else:
@@ -494,6 +569,7 @@ def ai_trading():
         amount_to_sell = btc_balance * (result.percentage / 100)  # 지정된 비율만큼 매도
         if amount_to_sell * btc_krw_price > 5000:
             print(f"### Sell Order Executed: Selling {result.percentage}% of available BTC ###")
+            log_expected_fill(book, "sell", amount_to_sell * btc_krw_price)
             order_result = upbit.sell_market_order("KRW-BTC", amount_to_sell)
             print(order_result)
         else:
@@ -508,20 +584,48 @@ def ai_trading():
     btc_balance = next((float(balance['balance']) for balance in balances if balance['currency'] == 'BTC'), 0)
     krw_balance = next((float(balance['balance']) for balance in balances if balance['currency'] == 'KRW'), 0)
     btc_avg_buy_price = next((float(balance['avg_buy_price']) for balance in balances if balance['currency'] == 'BTC'), 0)
-    current_btc_price = pyupbit.get_current_price("KRW-BTC")
+    current_btc_price = feed.get_current_price("KRW-BTC") or pyupbit.get_current_price("KRW-BTC")
 
     # 9. 반성 내용 생성 및 데이터 저장
-    save_trade_data_with_reflection(conn, result.decision, result.percentage, result.reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection)
+    # 이번 결정이 본 입력 그대로 (재현/감사/재평가용 스냅샷)
+    decision_snapshot = {
+        "market": "KRW-BTC",
+        "messages": messages,
+        "inputs": {
+            "balances": all_balances,
+            "current_price": btc_krw_price,
+            "orderbook": orderbook,
+            "orderbook_features": orderbook_features,
+            "df_daily": df_daily,
+            "df_hourly": df_hourly,
+            "fear_greed_index": fear_greed_index,
+            "news_headlines": news_headlines,
+            "strategy": youtube_transcript,
+            "reflection": reflection,
+        },
+        "decision": result,
+        "used_fallback": used_fallback,
+    }
 
-    # 데이터베이스 연결 종료
-    conn.close()
+    # 저장되면 이번 사이클의 LLM 호출 기록을 거래와 연결하고 입력 스냅샷 보관 (저장 스레드에서 실행)
+    cycle_id = llm.cycle_id
+    def on_saved(trade_id):
+        llm.link_trade(trade_id, cycle_id)
+        snapshots.put(trade_id, decision_snapshot, cycle_id=cycle_id)
 
+    save_trade_data_with_reflection(result.decision, result.percentage, result.reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection, on_saved=on_saved)
+    logger.info("LLM usage this cycle: %s", llm.cycle_summary())
+
+
+# 매매 주기 (초)
+TRADING_INTERVAL = 3600 * 8  # 8시간마다 실행
 
 # Main loop
-while True:
-    try:
-        ai_trading()
-        time.sleep(3600 * 8)  # 8시간마다 실행
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        time.sleep(300)  # 오류 발생 시 5분 후 재시도
+if __name__ == "__main__":
+    while True:
+        try:
+            ai_trading()
+            time.sleep(TRADING_INTERVAL)
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            time.sleep(300)  # 오류 발생 시 5분 후 재시도
@@ -3,28 +3,78 @@ import pyupbit
 import os
 import time
 import json
-import base64
+import math
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException
-from webdriver_manager.chrome import ChromeDriverManager
 from ta import add_all_ta_features
 from ta.utils import dropna
 from ta.volatility import BollingerBands
 from ta.trend import SMAIndicator, EMAIndicator
 from ta.momentum import RSIIndicator
 from ta.trend import MACD
+import llm_metrics
+import chart_renderer
+import chart_worker
+import chart_image
+import vision_cache
 
 load_dotenv()
 
 SERP_API_KEY = os.getenv("SERP_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# 차트 이미지 생성 방식 ("render": OHLCV로 직접 그림, "browser": 업비트 차트 페이지 스크린샷)
+CHART_SOURCE = os.getenv("CHART_SOURCE", "render")
+
+# 차트에 그릴 캔들 수
+CHART_CANDLES = 120
+
+# 한 번의 vision 요청에 함께 보낼 차트 주기와 pyupbit interval
+CHART_TIMEFRAMES = [timeframe.strip() for timeframe in os.getenv("CHART_TIMEFRAMES", "1h,4h,1d").split(",")
+                    if timeframe.strip()]
+CHART_INTERVALS = {"1h": "minute60", "4h": "minute240", "1d": "day"}
+
+# vision 입력 이미지 예산 (토큰 수, bytes)과 차트 보관 폴더 (비워 두면 디스크에 쓰지 않음)
+VISION_TOKEN_BUDGET = int(os.getenv("VISION_TOKEN_BUDGET", "765"))
+VISION_MAX_BYTES = int(os.getenv("VISION_MAX_BYTES", "500000"))
+CHART_ARCHIVE_DIR = os.getenv("CHART_ARCHIVE_DIR", "")
+
+# 직접 그리는 차트 크기 (차트당 2x2 타일, 765 토큰 안에 들어가도록)
+CHART_SIZE = (1024, 576)
+
+# 브라우저 워커 스크린샷 대기 시간 (초), 넘기면 직접 렌더링한 차트 사용
+CHART_CAPTURE_TIMEOUT = float(os.getenv("CHART_CAPTURE_TIMEOUT", "30"))
+
+# 업비트 차트 페이지를 띄워 두는 브라우저 워커 (CHART_SOURCE=browser일 때 처음 필요할 때 시작)
+browser_chart = None
+
+# LLM 호출별 토큰/소요 시간/비용 기록
+llm = llm_metrics.LLMMetrics('trading_data.db')
+
+# 차트가 거의 같으면 (dHash 차이 VISION_HASH_THRESHOLD비트 이하, 여러 주기는 차이의 합) 이전 vision 분석 재사용.
+# 1024x576 차트에서 연속한 시간봉 차트의 차이는 중앙값 3비트이고, 마지막 캔들이 1% 움직여도 0~3비트라
+# 해시만으로는 가격 변화를 구분하지 못함 -> 종가와 지표 값은 vision_namespace로 따로 구분
+VISION_HASH_THRESHOLD = int(os.getenv("VISION_HASH_THRESHOLD", "2"))
+VISION_CACHE_TTL = int(os.getenv("VISION_CACHE_TTL", str(2 * 3600)))
+vision_analyses = vision_cache.VisionCache('trading_data.db', threshold=VISION_HASH_THRESHOLD,
+                                           ttl=VISION_CACHE_TTL)
+
+# 분석 재사용 구분 키: 종가 0.5% 단위, 일봉 RSI 5포인트 단위, MACD 방향
+# (같은 요청에 지표 값도 보내므로 지표가 달라지면 차트가 비슷해도 새로 분석)
+VISION_PRICE_STEP = 0.005
+VISION_RSI_STEP = 5
+
+def vision_namespace(df_hour, indicators):
+    close = df_hour["close"].iloc[-1]
+    rsi = indicators["RSI (Day)"]
+    macd = indicators["MACD (Day)"]
+    return json.dumps({
+        "market": "KRW-BTC",
+        "timeframes": CHART_TIMEFRAMES,
+        "close": round(math.log(close) / math.log1p(VISION_PRICE_STEP)),
+        "rsi": None if rsi != rsi else int(rsi // VISION_RSI_STEP),
+        "macd": None if macd != macd else bool(macd > 0),
+    }, sort_keys=True)
+
 # 보조지표를 데이터프레임에 추가하는 함수
 def add_indicators(df_day, df_hour):
 
@@ -96,74 +146,8 @@ def get_latest_news():
         print("No news results found")
         return []
 
-# ChromeDriver 초기화
-def init_driver():
-    chrome_options = Options()
-    chrome_options.add_argument("--start-maximized")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    return driver
-
-# 디버깅 메시지 출력 함수
-def debug_message(message):
-    print(f"[DEBUG] {message}")
-
-# 클릭 시도 함수
-def try_click_element(driver, by, value, element_name, wait_time=10):
-    try:
-        debug_message(f"Trying to click {element_name}...")
-        element = WebDriverWait(driver, wait_time).until(
-            EC.element_to_be_clickable((by, value))
-        )
-        element.click()
-        debug_message(f"Clicked {element_name} successfully!")
-        time.sleep(1)
-        return True
-    except TimeoutException:
-        debug_message(f"Failed to click {element_name}: Timeout")
-        return False
-    except ElementClickInterceptedException:
-        debug_message(f"Failed to click {element_name}: Element intercepted")
-        return False
-    except Exception as e:
-        debug_message(f"Error clicking {element_name}: {e}")
-        return False
-
-# 업비트 차트 페이지 열기
-def open_upbit_chart(driver):
-    debug_message("Opening the web page...")
-    driver.get('https://upbit.com/full_chart?code=CRIX.UPBIT.KRW-BTC')
-    WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-    debug_message("Page loaded successfully.")
-
-# 시간 주기 선택 (1시간)
-def select_time_period(driver):
-    if try_click_element(driver, By.CSS_SELECTOR, ".ciq-menu.ciq-period", "Time Period Menu"):
-        time.sleep(1)
-        if not try_click_element(driver, By.CSS_SELECTOR, 'cq-item[stxtap="Layout.setPeriodicity(1,60,\'minute\')"]', "1시간"):
-            debug_message("Failed to click '1시간' option after opening menu.")
-
-# 볼린저 밴드 추가
-def select_bollinger_band(driver):
-    if try_click_element(driver, By.CSS_SELECTOR, ".ciq-menu.ciq-studies", "Indicator Menu"):
-        time.sleep(1)
-        if not try_click_element(driver, By.CSS_SELECTOR, "#fullChartiq > div > div > div.ciq-nav > div > div > cq-menu.ciq-menu.ciq-studies.collapse.stxMenuActive > cq-menu-dropdown > cq-scroll > cq-studies > cq-studies-content > cq-item:nth-child(15)", "Bollinger Bands"):
-            debug_message("Failed to select '볼린저 밴드' option.")
-
-# 차트 스크린샷을 Base64로 변환하여 GPT-4 분석에 사용
-def capture_screenshot(driver):
-    debug_message("Capturing chart screenshot...")
-    filename = "upbit_chart.png"
-    driver.save_screenshot(filename)
-    
-    with open(filename, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        
-    debug_message("Screenshot captured and encoded in base64.")
-    return base64_image
-
-# GPT-4 Vision 모델로 차트 분석
-def analyze_with_gpt(base64_image, indicators):
+# GPT-4 Vision 모델로 차트 분석 (images: [(주기, chart_image.EncodedImage)]를 한 요청에)
+def analyze_with_gpt(images, indicators):
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENAI_API_KEY}"
@@ -177,14 +161,18 @@ def analyze_with_gpt(base64_image, indicators):
                 "content": [
                     {
                         "type": "text",
-                        "text": "What’s in this image and what should be my trading decision?",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        }
+                        "text": "These are KRW-BTC charts with Bollinger Bands "
+                                f"({', '.join(timeframe for timeframe, _ in images)}). "
+                                "What’s in these images and what should be my trading decision?",
                     },
+                    *[
+                        part
+                        for timeframe, image in images
+                        for part in (
+                            {"type": "text", "text": f"{timeframe} chart:"},
+                            {"type": "image_url", "image_url": {"url": image.data_url()}},
+                        )
+                    ],
                     {
                         "type": "text",
                         "text": f"Here are some technical indicators: {indicators}"
@@ -195,41 +183,88 @@ def analyze_with_gpt(base64_image, indicators):
         "max_tokens": 300
     }
 
+    estimated = llm_metrics.estimate_prompt_tokens(payload["messages"], payload["model"])
+    started = time.perf_counter()
     response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    return response.json()
+    result = response.json()
+    llm.record("chart_vision", payload["model"], time.perf_counter() - started, estimated, result.get("usage"),
+               status="ok" if response.ok else "error", error=None if response.ok else response.text)
+    return result
+
+# 미리 띄워 둔 업비트 차트 탭들(주기별 + 볼린저 밴드)의 스크린샷 {주기: PNG}. 실패하면 빈 dict
+def capture_browser_charts():
+    global browser_chart
+    if browser_chart is None:
+        browser_chart = chart_worker.ChartWorker(periods=CHART_TIMEFRAMES).start()
+    return browser_chart.capture(timeout=CHART_CAPTURE_TIMEOUT) or {}
+
+# 브라우저 없이 차트 그리기 (1시간봉은 이미 지표를 계산한 데이터 사용)
+def render_timeframe_chart(timeframe, df_hour):
+    if timeframe == "1h":
+        df = df_hour
+    else:
+        df = pyupbit.get_ohlcv("KRW-BTC", count=CHART_CANDLES, interval=CHART_INTERVALS[timeframe])
+        bollinger = BollingerBands(close=df["close"], window=20, window_dev=2)
+        df['bb_bbm'] = bollinger.bollinger_mavg()
+        df['bb_bbh'] = bollinger.bollinger_hband()
+        df['bb_bbl'] = bollinger.bollinger_lband()
+    return chart_renderer.render_chart(df, title=f"KRW-BTC {timeframe}, BB(20, 2)",
+                                       width=CHART_SIZE[0], height=CHART_SIZE[1])
 
 # 자동 매매 로직
 def ai_trading():
-    # 1. Selenium을 통해 웹 페이지에서 차트 설정
-    driver = init_driver()
-    open_upbit_chart(driver)
-    select_time_period(driver)
-    select_bollinger_band(driver)
-    
-    # 2. 차트 스크린샷 찍고 Base64 인코딩
-    base64_image = capture_screenshot(driver)
+    llm.start_cycle()
 
-    # 3. 업비트 차트 데이터 가져오기 (30일 일봉, 24시간 봉)
+    # 1. 업비트 차트 데이터 가져오기 (30일 일봉, 차트용 시간봉)
     df_day = pyupbit.get_ohlcv("KRW-BTC", count=30, interval="day")  
-    df_24h = pyupbit.get_ohlcv("KRW-BTC", count=24, interval="minute60")
+    df_hour = pyupbit.get_ohlcv("KRW-BTC", count=CHART_CANDLES, interval="minute60")
 
     # 보조지표 추가
-    df_day, df_24h = add_indicators(df_day, df_24h)
+    df_day, df_hour = add_indicators(df_day, df_hour)
+
+    # 2. 주기별(1시간/4시간/일봉) + 볼린저 밴드 차트 이미지 (기본은 브라우저 없이 직접 렌더링,
+    #    브라우저 캡처에 빠진 주기도 직접 렌더링)
+    pngs = capture_browser_charts() if CHART_SOURCE == "browser" else {}
+    pngs = [(timeframe, pngs.get(timeframe) or render_timeframe_chart(timeframe, df_hour))
+            for timeframe in CHART_TIMEFRAMES]
+
+    # 메모리에서 한 번만 인코딩 (차트당 토큰/크기 예산), 보관이 켜져 있으면 백그라운드로 저장
+    images = []
+    for timeframe, png in pngs:
+        image = chart_image.encode_image(png, max_bytes=VISION_MAX_BYTES, max_tokens=VISION_TOKEN_BUDGET)
+        chart_image.archive(image, CHART_ARCHIVE_DIR, prefix=f"upbit_chart_{timeframe}")
+        images.append((timeframe, image))
 
-    # 4. 보조지표 데이터 GPT-4에 제공
+    # 3. 보조지표 데이터 GPT-4에 제공
     indicators = {
         "Bollinger Bands (Day)": df_day[["bb_bbm", "bb_bbh", "bb_bbl"]].tail(1).to_dict(),
         "RSI (Day)": df_day["rsi_14"].tail(1).values[0],
         "MACD (Day)": df_day["macd_diff"].tail(1).values[0]
     }
     
-    result = analyze_with_gpt(base64_image, indicators)
+    # 직전에 분석한 차트와 거의 같으면 vision 호출 생략 (오류 응답은 저장하지 않음)
+    result = vision_analyses.get_or_analyze(
+        [png for _, png in pngs], lambda: analyze_with_gpt(images, indicators),
+        namespace=vision_namespace(df_hour, indicators),
+        cacheable=lambda response: "choices" in response,
+    )
+    cache_stats = vision_analyses.stats()
+    print(f"Vision cache: {cache_stats.get('hits', 0)} hits, {cache_stats.get('misses', 0)} misses "
+          f"(hit rate {cache_stats['hit_rate']:.0%})")
     
-    # 5. 결과 출력
+    # 4. 결과 출력
     print("GPT-4 Trading Decision:")
     print(json.dumps(result, indent=4))
 
-    # Selenium 브라우저 닫기
-    driver.quit()
+# 분석 주기 (초)
+TRADING_INTERVAL = 3600  # 1시간마다 실행
 
-ai_trading()
+# Main loop (CHART_SOURCE=browser면 브라우저 워커가 사이클 사이에도 떠 있어 콜드 스타트는 처음 한 번뿐)
+if __name__ == "__main__":
+    while True:
+        try:
+            ai_trading()
+            time.sleep(TRADING_INTERVAL)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            time.sleep(300)  # 오류 발생 시 5분 후 재시도
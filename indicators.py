@@ -1,64 +1,37 @@
 from ta.utils import dropna
-from ta.volatility import BollingerBands
-from ta.trend import SMAIndicator, EMAIndicator
-from ta.momentum import RSIIndicator
-from ta.trend import MACD
+import streaming_indicators
 
 
-def add_indicators(df_day, df_hour):
+# 보조 지표 엔진 생성 (일봉/시간봉 공통)
+def create_indicator_engine():
+    return streaming_indicators.IndicatorEngine([
+        streaming_indicators.BollingerBands(window=20, window_dev=2, wband=True),  # 중앙값, 상단/하단 밴드, 밴드 폭
+        streaming_indicators.SMA(window=14),
+        streaming_indicators.EMA(window=14),
+        streaming_indicators.RSI(window=14, column='rsi_14'),
+        streaming_indicators.MACD(),
+    ])
 
-    # NaN 값 제거
-    df_day = dropna(df_day)
-    df_hour = dropna(df_hour)
-
-    # Bollinger Bands (일봉)
-    indicator_bb_day = BollingerBands(close=df_day["close"], window=20, window_dev=2)
-    df_day['bb_bbm'] = indicator_bb_day.bollinger_mavg()  # 중앙값 (Moving Average)
-    df_day['bb_bbh'] = indicator_bb_day.bollinger_hband()  # 상단 밴드
-    df_day['bb_bbl'] = indicator_bb_day.bollinger_lband()  # 하단 밴드
-    df_day['bb_bbw'] = indicator_bb_day.bollinger_wband()  # 밴드 폭
-
-    # Bollinger Bands (시간봉)
-    indicator_bb_hour = BollingerBands(close=df_hour["close"], window=20, window_dev=2)
-    df_hour['bb_bbm'] = indicator_bb_hour.bollinger_mavg()
-    df_hour['bb_bbh'] = indicator_bb_hour.bollinger_hband()
-    df_hour['bb_bbl'] = indicator_bb_hour.bollinger_lband()
-    df_hour['bb_bbw'] = indicator_bb_hour.bollinger_wband()
 
-    # Simple Moving Average (SMA) 추가 (일봉)
-    sma_indicator_day = SMAIndicator(close=df_day["close"], window=14)
-    df_day['sma_14'] = sma_indicator_day.sma_indicator()
+# 마켓별 (일봉 엔진, 시간봉 엔진) - 이전 호출 이후 새로 들어온 캔들만 계산
+indicator_engines = {}
 
-    # Exponential Moving Average (EMA) 추가 (일봉)
-    ema_indicator_day = EMAIndicator(close=df_day["close"], window=14)
-    df_day['ema_14'] = ema_indicator_day.ema_indicator()
 
-    # Simple Moving Average (SMA) 추가 (시간봉)
-    sma_indicator_hour = SMAIndicator(close=df_hour["close"], window=14)
-    df_hour['sma_14'] = sma_indicator_hour.sma_indicator()
+def add_indicators(df_day, df_hour, market=None):
 
-    # Exponential Moving Average (EMA) 추가 (시간봉)
-    ema_indicator_hour = EMAIndicator(close=df_hour["close"], window=14)
-    df_hour['ema_14'] = ema_indicator_hour.ema_indicator()
-
-    # RSI (일봉)
-    rsi_day = RSIIndicator(close=df_day["close"], window=14)
-    df_day['rsi_14'] = rsi_day.rsi()
-
-    # RSI (시간봉)
-    rsi_hour = RSIIndicator(close=df_hour["close"], window=14)
-    df_hour['rsi_14'] = rsi_hour.rsi()
+    # NaN 값 제거
+    df_day = dropna(df_day)
+    df_hour = dropna(df_hour)
 
-    # MACD (일봉)
-    macd_day = MACD(close=df_day["close"])
-    df_day['macd'] = macd_day.macd()
-    df_day['macd_signal'] = macd_day.macd_signal()
-    df_day['macd_diff'] = macd_day.macd_diff()
+    # market이 없으면 매번 전체 구간으로 새로 계산
+    if market is None:
+        engine_day, engine_hour = create_indicator_engine(), create_indicator_engine()
+    else:
+        if market not in indicator_engines:
+            indicator_engines[market] = (create_indicator_engine(), create_indicator_engine())
+        engine_day, engine_hour = indicator_engines[market]
 
-    # MACD (시간봉)
-    macd_hour = MACD(close=df_hour["close"])
-    df_hour['macd'] = macd_hour.macd()
-    df_hour['macd_signal'] = macd_hour.macd_signal()
-    df_hour['macd_diff'] = macd_hour.macd_diff()
+    df_day = engine_day.add_indicators(df_day)
+    df_hour = engine_hour.add_indicators(df_hour)
 
     return df_day, df_hour
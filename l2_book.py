@@ -0,0 +1,181 @@
+import numpy as np
+
+BID = "bid"
+ASK = "ask"
+
+
+class _Side:
+    """한쪽 호가 (가격/잔량 배열, 앞쪽이 최우선 호가)"""
+
+    def __init__(self, descending, capacity):
+        self.descending = descending
+        self.prices = np.zeros(capacity)
+        self.sizes = np.zeros(capacity)
+        self.depth = 0
+
+    def _grow(self, capacity):
+        self.prices = np.resize(self.prices, capacity)
+        self.sizes = np.resize(self.sizes, capacity)
+
+    def _keys(self, prices):
+        # 매수 호가는 내림차순이므로 부호를 뒤집어 오름차순 검색
+        return -prices if self.descending else prices
+
+    def _position(self, price):
+        return int(np.searchsorted(self._keys(self.prices[:self.depth]), -price if self.descending else price))
+
+    def load(self, prices, sizes):
+        prices = np.asarray(prices, dtype=float)
+        sizes = np.asarray(sizes, dtype=float)
+        order = np.argsort(self._keys(prices), kind="stable")
+        keep = sizes[order] > 0
+        prices, sizes = prices[order][keep], sizes[order][keep]
+        if len(prices) > len(self.prices):
+            self._grow(len(prices) * 2)
+        self.depth = len(prices)
+        self.prices[:self.depth] = prices
+        self.sizes[:self.depth] = sizes
+
+    def set(self, price, size):
+        """가격 레벨 잔량을 갱신 (size가 0이면 레벨 삭제)"""
+        i = self._position(price)
+        exists = i < self.depth and self.prices[i] == price
+        if size <= 0:
+            if exists:
+                self.prices[i:self.depth - 1] = self.prices[i + 1:self.depth]
+                self.sizes[i:self.depth - 1] = self.sizes[i + 1:self.depth]
+                self.depth -= 1
+            return
+        if exists:
+            self.sizes[i] = size
+            return
+        if self.depth == len(self.prices):
+            self._grow(max(16, len(self.prices) * 2))
+        self.prices[i + 1:self.depth + 1] = self.prices[i:self.depth].copy()
+        self.sizes[i + 1:self.depth + 1] = self.sizes[i:self.depth].copy()
+        self.prices[i] = price
+        self.sizes[i] = size
+        self.depth += 1
+
+    def levels(self, n=None):
+        depth = self.depth if n is None else min(n, self.depth)
+        return self.prices[:depth], self.sizes[:depth]
+
+
+class L2OrderBook:
+    """
+    배열 기반 전체 호가창. 스냅샷/증분 갱신을 제자리에서 적용하고
+    특정 가격까지 누적 잔량, KRW 금액 기준 VWAP, N호가 불균형 등을 빠르게 계산한다.
+    """
+
+    def __init__(self, market="KRW-BTC", capacity=64):
+        self.market = market
+        self.bids = _Side(descending=True, capacity=capacity)
+        self.asks = _Side(descending=False, capacity=capacity)
+        self.timestamp = None
+
+    def _side(self, side):
+        return self.bids if side == BID else self.asks
+
+    @classmethod
+    def from_orderbook(cls, orderbook, market=None):
+        """pyupbit/빗썸/WebSocket 형식의 호가 dict로 생성"""
+        book = cls(market or orderbook.get("market") or orderbook.get("code") or "KRW-BTC")
+        book.apply_orderbook(orderbook)
+        return book
+
+    def apply_orderbook(self, orderbook):
+        """orderbook_units 목록을 가진 호가 dict를 스냅샷으로 적용"""
+        units = orderbook.get("orderbook_units", [])
+        self.apply_snapshot(
+            [(unit["bid_price"], unit["bid_size"]) for unit in units],
+            [(unit["ask_price"], unit["ask_size"]) for unit in units],
+            orderbook.get("timestamp"),
+        )
+
+    def apply_snapshot(self, bids, asks, timestamp=None):
+        """[(가격, 잔량), ...] 목록으로 호가 전체를 교체"""
+        bids = np.asarray(bids, dtype=float).reshape(-1, 2)
+        asks = np.asarray(asks, dtype=float).reshape(-1, 2)
+        self.bids.load(bids[:, 0], bids[:, 1])
+        self.asks.load(asks[:, 0], asks[:, 1])
+        self.timestamp = timestamp
+
+    def apply_delta(self, side, price, size, timestamp=None):
+        """한 가격 레벨의 잔량을 갱신 (size 0이면 삭제)"""
+        self._side(side).set(float(price), float(size))
+        if timestamp is not None:
+            self.timestamp = timestamp
+
+    def best_bid(self):
+        return self.bids.prices[0] if self.bids.depth else None
+
+    def best_ask(self):
+        return self.asks.prices[0] if self.asks.depth else None
+
+    def mid_price(self):
+        if not (self.bids.depth and self.asks.depth):
+            return None
+        return (self.bids.prices[0] + self.asks.prices[0]) / 2
+
+    def spread(self):
+        if not (self.bids.depth and self.asks.depth):
+            return None
+        return self.asks.prices[0] - self.bids.prices[0]
+
+    def cumulative_size(self, side, price):
+        """최우선 호가부터 price까지(포함) 쌓인 잔량"""
+        book_side = self._side(side)
+        prices, sizes = book_side.levels()
+        if side == BID:
+            count = int(np.searchsorted(-prices, -price, side="right"))
+        else:
+            count = int(np.searchsorted(prices, price, side="right"))
+        return float(sizes[:count].sum())
+
+    def vwap(self, direction, notional):
+        """
+        시장가로 KRW notional만큼 체결할 때의 평균 체결가 (direction: "buy"는 매도 호가, "sell"은 매수 호가를 소진).
+        (평균가, 체결 금액, 체결 수량)을 반환하며 호가가 부족하면 가능한 만큼만 계산한다.
+        """
+        prices, sizes = (self.asks if direction == "buy" else self.bids).levels()
+        if not len(prices) or notional <= 0:
+            return None, 0.0, 0.0
+        level_notional = prices * sizes
+        cumulative = np.cumsum(level_notional)
+        full = int(np.searchsorted(cumulative, notional, side="left"))
+        if full >= len(prices):
+            filled_notional = float(cumulative[-1])
+            filled_size = float(sizes.sum())
+        else:
+            before = float(cumulative[full - 1]) if full else 0.0
+            filled_notional = float(notional)
+            filled_size = float(sizes[:full].sum()) + (notional - before) / prices[full]
+        return float(filled_notional / filled_size), filled_notional, filled_size
+
+    def imbalance(self, levels=5):
+        """상위 N호가 잔량 불균형 (-1: 매도 우위 ~ 1: 매수 우위)"""
+        bid_size = float(self.bids.levels(levels)[1].sum())
+        ask_size = float(self.asks.levels(levels)[1].sum())
+        total = bid_size + ask_size
+        return (bid_size - ask_size) / total if total else 0.0
+
+    def features(self, notional=1_000_000, levels=(5, 15)):
+        """의사결정 프롬프트용 요약 지표"""
+        mid = self.mid_price()
+        features = {
+            "best_bid": self.best_bid(),
+            "best_ask": self.best_ask(),
+            "spread_bps": round(self.spread() / mid * 10000, 2) if mid else None,
+            "bid_depth": round(float(self.bids.levels()[1].sum()), 4),
+            "ask_depth": round(float(self.asks.levels()[1].sum()), 4),
+        }
+        for n in levels:
+            features[f"imbalance_{n}"] = round(self.imbalance(n), 4)
+        for name in ("buy", "sell"):
+            price, filled, _ = self.vwap(name, notional)
+            features[f"{name}_vwap_{notional}"] = round(price, 1) if price else None
+            features[f"{name}_slippage_bps_{notional}"] = (
+                round(abs(price - mid) / mid * 10000, 2) if price and mid and filled >= notional else None
+            )
+        return {key: (float(value) if isinstance(value, np.floating) else value) for key, value in features.items()}
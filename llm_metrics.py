@@ -0,0 +1,172 @@
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import prompt_encoder
+
+logger = logging.getLogger(__name__)
+
+# 모델별 100만 토큰당 가격 (USD, 입력/출력)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-2024-08-06": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# 메시지 하나당 역할/구분자 토큰 (대략)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 단계별 최근 평균보다 프롬프트가 이 비율 이상 커지면 경고
+PROMPT_GROWTH_WARNING = 1.5
+
+
+def estimate_prompt_tokens(messages, model="gpt-4o"):
+    """전송 전 오프라인으로 계산한 프롬프트 토큰 수 (이미지 등 텍스트가 아닌 부분은 제외)"""
+    total = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+        total += prompt_encoder.count_tokens(content, model) + MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES.get(model)
+    if prices is None or prompt_tokens is None or completion_tokens is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+class LLMMetrics:
+    """
+    LLM 호출마다 단계(reflection, decision 등), 토큰 수, 소요 시간, 재시도 횟수, 비용을 SQLite에 기록한다.
+    한 매매 사이클의 호출은 같은 cycle_id로 묶이고, 거래가 저장되면 link_trade로 trades.id와 연결한다.
+    """
+
+    def __init__(self, path="trading_data.db"):
+        self.lock = threading.Lock()
+        self.cycle_id = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cycle_id TEXT,
+            trade_id INTEGER,
+            stage TEXT,
+            model TEXT,
+            timestamp TEXT,
+            latency REAL,
+            estimated_prompt_tokens INTEGER,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            total_tokens INTEGER,
+            retries INTEGER,
+            cost REAL,
+            status TEXT,
+            error TEXT
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_cycle ON llm_calls (cycle_id)")
+        self.conn.commit()
+
+    def start_cycle(self):
+        """새 매매 사이클 시작 (이후 기록은 이 cycle_id로 묶임)"""
+        self.cycle_id = uuid.uuid4().hex
+        return self.cycle_id
+
+    def link_trade(self, trade_id, cycle_id=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE llm_calls SET trade_id = ? WHERE cycle_id = ?", (trade_id, cycle_id or self.cycle_id)
+            )
+            self.conn.commit()
+
+    def _recent_average(self, stage, limit=20):
+        row = self.conn.execute('''
+        SELECT AVG(estimated_prompt_tokens) FROM (
+            SELECT estimated_prompt_tokens FROM llm_calls
+            WHERE stage = ? AND status = 'ok' ORDER BY id DESC LIMIT ?
+        )
+        ''', (stage, limit)).fetchone()
+        return row[0]
+
+    def record(self, stage, model, latency, estimated_prompt_tokens=None, usage=None,
+               retries=0, status="ok", error=None):
+        """호출 결과 한 건 기록. usage는 응답의 usage (객체 또는 dict)"""
+        if isinstance(usage, dict):
+            get = usage.get
+        else:
+            get = lambda name: getattr(usage, name, None)
+        prompt_tokens = get("prompt_tokens") if usage else None
+        completion_tokens = get("completion_tokens") if usage else None
+        total_tokens = get("total_tokens") if usage else None
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+        with self.lock:
+            average = self._recent_average(stage)
+            if estimated_prompt_tokens and average and estimated_prompt_tokens > average * PROMPT_GROWTH_WARNING:
+                logger.warning("%s prompt grew to %d tokens (recent average %.0f)",
+                               stage, estimated_prompt_tokens, average)
+            self.conn.execute('''
+            INSERT INTO llm_calls (cycle_id, trade_id, stage, model, timestamp, latency, estimated_prompt_tokens,
+                                   prompt_tokens, completion_tokens, total_tokens, retries, cost, status, error)
+            VALUES (?, NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (self.cycle_id, stage, model, datetime.now().isoformat(), latency, estimated_prompt_tokens,
+                  prompt_tokens, completion_tokens, total_tokens, retries, cost, status, error))
+            self.conn.commit()
+
+        logger.info("LLM %s: %.2fs, tokens %s/%s (estimated %s), retries %d, cost %s",
+                    stage, latency, prompt_tokens, completion_tokens, estimated_prompt_tokens, retries,
+                    f"${cost:.4f}" if cost is not None else "n/a")
+
+    def chat(self, client, stage, **kwargs):
+        """
+        client.chat.completions.create(**kwargs)를 호출하며 기록한다.
+        OpenAI 클라이언트 내부 재시도 횟수를 얻기 위해 with_raw_response로 호출한 뒤 응답을 파싱해 반환한다.
+        """
+        model = kwargs.get("model")
+        estimated = estimate_prompt_tokens(kwargs.get("messages", []), model)
+        started = time.perf_counter()
+        try:
+            raw = client.chat.completions.with_raw_response.create(**kwargs)
+            response = raw.parse()
+        except Exception as e:
+            self.record(stage, model, time.perf_counter() - started, estimated, status="error", error=str(e))
+            raise
+        self.record(stage, model, time.perf_counter() - started, estimated, response.usage,
+                    retries=getattr(raw, "retries_taken", 0))
+        return response
+
+    def cycle_summary(self, cycle_id=None):
+        """사이클의 단계별 소요 시간/토큰/비용"""
+        with self.lock:
+            rows = self.conn.execute('''
+            SELECT stage, SUM(latency), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost), SUM(retries)
+            FROM llm_calls WHERE cycle_id = ? GROUP BY stage ORDER BY MIN(id)
+            ''', (cycle_id or self.cycle_id,)).fetchall()
+        return [
+            {"stage": stage, "latency": latency, "prompt_tokens": prompt_tokens,
+             "completion_tokens": completion_tokens, "cost": cost, "retries": retries}
+            for stage, latency, prompt_tokens, completion_tokens, cost, retries in rows
+        ]
+
+    def stage_stats(self, since=None):
+        """단계별 호출 수, 평균 소요 시간, 평균 토큰 수, 총 비용 (since: ISO 시각 이후만)"""
+        with self.lock:
+            rows = self.conn.execute('''
+            SELECT stage, COUNT(*), AVG(latency), AVG(prompt_tokens), AVG(completion_tokens), SUM(cost),
+                   SUM(CASE WHEN status = 'ok' THEN 0 ELSE 1 END)
+            FROM llm_calls WHERE timestamp >= ? GROUP BY stage
+            ''', (since or "",)).fetchall()
+        return {
+            stage: {"calls": calls, "avg_latency": latency, "avg_prompt_tokens": prompt_tokens,
+                    "avg_completion_tokens": completion_tokens, "cost": cost, "errors": errors}
+            for stage, calls, latency, prompt_tokens, completion_tokens, cost, errors in rows
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,123 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 지표별 가중치 (양수: 매수 신호, 음수: 매도 신호로 정규화된 점수에 곱함)
+WEIGHTS = {
+    "rsi": 0.30,
+    "macd": 0.25,
+    "bollinger": 0.20,
+    "trend": 0.15,
+    "stochastic": 0.10,
+}
+
+# 일봉/시간봉 점수 비중
+TIMEFRAME_WEIGHTS = {"daily": 0.6, "hourly": 0.4}
+
+# 공포탐욕지수(역발상)와 호가 불균형을 더할 때의 비중
+FEAR_GREED_WEIGHT = 0.15
+ORDERBOOK_WEIGHT = 0.10
+
+# |점수|가 이 값을 넘어야 매수/매도, 비율은 점수에 비례해 최대 MAX_PERCENTAGE
+DECISION_THRESHOLD = 0.25
+MAX_PERCENTAGE = 50
+
+# LLM 호출 마감 시간 관리용 스레드 풀 (마감을 넘긴 호출은 백그라운드에서 끝나도록 둠)
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="deadline")
+
+
+def _last(df, column):
+    if df is None or column not in df.columns or df.empty:
+        return np.nan
+    return float(df[column].iloc[-1])
+
+
+def indicator_scores(df):
+    """마지막 캔들의 지표를 -1(매도) ~ 1(매수) 점수로 변환. 지표가 없으면 NaN"""
+    if df is None or df.empty:
+        return {name: np.nan for name in WEIGHTS}
+
+    close = _last(df, "close")
+    macd_diff = df["macd_diff"].dropna() if "macd_diff" in df.columns else None
+    macd_scale = macd_diff.abs().mean() if macd_diff is not None and len(macd_diff) else np.nan
+    upper, lower = _last(df, "bb_bbh"), _last(df, "bb_bbl")
+    average = _last(df, "ema_12")
+    if np.isnan(average):
+        average = _last(df, "sma_20")
+    if np.isnan(average):
+        average = _last(df, "bb_bbm")
+
+    scores = np.array([
+        (50 - _last(df, "rsi")) / 20,                           # 과매도일수록 매수
+        _last(df, "macd_diff") / macd_scale if macd_scale else np.nan,  # MACD 히스토그램 방향
+        1 - 2 * (close - lower) / (upper - lower) if upper > lower else np.nan,  # 밴드 하단일수록 매수
+        (close / average - 1) / 0.02,                           # 이동평균 위면 추세 추종 매수
+        (50 - _last(df, "stoch_k")) / 50,                       # 스토캐스틱 과매도일수록 매수
+    ])
+    return dict(zip(WEIGHTS, np.tanh(scores)))
+
+
+def score_market(df_daily, df_hourly, fear_greed_index=None, orderbook_features=None):
+    """지표 점수를 가중 평균한 종합 점수(-1 ~ 1)와 항목별 기여도"""
+    names, values, weights = [], [], []
+    for timeframe, df in (("daily", df_daily), ("hourly", df_hourly)):
+        for name, score in indicator_scores(df).items():
+            names.append(f"{timeframe}_{name}")
+            values.append(score)
+            weights.append(WEIGHTS[name] * TIMEFRAME_WEIGHTS[timeframe])
+
+    if fear_greed_index and fear_greed_index.get("value") is not None:
+        names.append("fear_greed")
+        values.append((50 - float(fear_greed_index["value"])) / 50)
+        weights.append(FEAR_GREED_WEIGHT)
+    if orderbook_features and orderbook_features.get("imbalance_5") is not None:
+        names.append("orderbook_imbalance")
+        values.append(float(orderbook_features["imbalance_5"]))
+        weights.append(ORDERBOOK_WEIGHT)
+
+    values, weights = np.array(values, dtype=float), np.array(weights)
+    available = ~np.isnan(values)
+    if not available.any():
+        return 0.0, {}
+    contributions = np.where(available, values * weights, 0.0) / weights[available].sum()
+    return float(contributions.sum()), {
+        name: round(float(contribution), 3)
+        for name, contribution, ok in zip(names, contributions, available) if ok
+    }
+
+
+def score_decision(df_daily, df_hourly, fear_greed_index=None, orderbook_features=None,
+                   threshold=DECISION_THRESHOLD, max_percentage=MAX_PERCENTAGE):
+    """TradingDecision과 같은 형식({decision, percentage, reason})의 규칙 기반 결정"""
+    score, contributions = score_market(df_daily, df_hourly, fear_greed_index, orderbook_features)
+    if score > threshold:
+        decision = "buy"
+    elif score < -threshold:
+        decision = "sell"
+    else:
+        decision = "hold"
+    percentage = 0 if decision == "hold" else max(1, min(100, int(round(abs(score) * max_percentage))))
+
+    top = sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:3]
+    reason = (f"Local rule-based decision (LLM unavailable): score {score:+.2f} "
+              f"(threshold ±{threshold}); main signals: "
+              + ", ".join(f"{name} {value:+.2f}" for name, value in top))
+    return {"decision": decision, "percentage": percentage, "reason": reason}
+
+
+def call_with_deadline(call, fallback, deadline, name="LLM call"):
+    """
+    call()을 deadline초 안에 끝내지 못하거나 예외가 나면 fallback() 결과를 쓴다.
+    (결과, fallback 사용 여부)를 반환한다.
+    """
+    future = executor.submit(call)
+    try:
+        return future.result(timeout=deadline), False
+    except FutureTimeoutError:
+        logger.warning("%s did not finish within %.0fs; using fallback.", name, deadline)
+    except Exception as e:
+        logger.warning("%s failed (%s); using fallback.", name, e)
+    return fallback(), True
@@ -0,0 +1,68 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 소스별 기본 타임아웃 (초)
+DEFAULT_TIMEOUT = 10
+
+# 데이터 수집용 공유 스레드 풀 (타임아웃된 요청은 백그라운드에서 끝나도록 둠)
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gather")
+
+
+@dataclass
+class MarketSnapshot:
+    """한 사이클에서 수집한 시장 데이터 (실패하거나 시간 초과된 소스는 None)"""
+    balances: Any = None
+    orderbook: Optional[Dict[str, Any]] = None
+    current_price: Any = None
+    df_daily: Optional[pd.DataFrame] = None
+    df_hourly: Optional[pd.DataFrame] = None
+    fear_greed_index: Optional[Dict[str, Any]] = None
+    news_headlines: Optional[List[Dict[str, str]]] = None
+    errors: Dict[str, str] = field(default_factory=dict)
+    latencies: Dict[str, float] = field(default_factory=dict)
+
+
+def _timed(fetch):
+    started = time.perf_counter()
+    result = fetch()
+    return result, time.perf_counter() - started
+
+
+def gather_market_snapshot(sources, timeouts=None, required=()):
+    """
+    sources({필드명: 인자 없는 함수})를 병렬로 실행해 MarketSnapshot으로 묶는다.
+    소스마다 timeouts[필드명](기본 DEFAULT_TIMEOUT)초 안에 끝나지 않으면 None으로 두고,
+    required에 포함된 소스가 실패하면 RuntimeError를 발생시킨다.
+    """
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    futures = {name: executor.submit(_timed, fetch) for name, fetch in sources.items()}
+
+    snapshot = MarketSnapshot()
+    for name, future in futures.items():
+        deadline = started + timeouts.get(name, DEFAULT_TIMEOUT)
+        try:
+            value, elapsed = future.result(timeout=max(0, deadline - time.monotonic()))
+            setattr(snapshot, name, value)
+            snapshot.latencies[name] = elapsed
+        except FutureTimeoutError:
+            snapshot.errors[name] = "timeout"
+            logger.error("Timed out fetching %s after %.1fs", name, timeouts.get(name, DEFAULT_TIMEOUT))
+        except Exception as e:
+            snapshot.errors[name] = str(e)
+            logger.error("Error fetching %s: %s", name, e)
+
+    logger.info("Market snapshot gathered in %.2fs (%s)", time.monotonic() - started,
+                ", ".join(f"{name}={elapsed:.2f}s" for name, elapsed in snapshot.latencies.items()))
+
+    missing = [name for name in required if name in snapshot.errors or getattr(snapshot, name) is None]
+    if missing:
+        raise RuntimeError(f"Failed to gather required market data: {', '.join(missing)}")
+    return snapshot
@@ -0,0 +1,567 @@
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+
+import candle_store
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 로컬 대역 서버로 돌릴 외부 서비스
+STAND_IN_HOSTS = ("api.upbit.com", "api.bithumb.com", "api.openai.com", "serpapi.com", "api.alternative.me")
+
+# 각 스크립트가 사용하는 전략 파일
+STRATEGY_FILES = {
+    "gptbitcoin": "strategy.txt",
+    "chart_gpt_coin": "strategy1.txt",
+}
+
+KST = timezone(timedelta(hours=9))
+REMAINING_REQ = "group=default; min=1800; sec=29"
+FEE_RATE = 0.0005
+
+
+class VirtualClock:
+    """time.time/time.sleep/datetime.now를 대신하는 가상 시계 (sleep은 시간을 앞으로 돌리기만 함)"""
+
+    def __init__(self, start):
+        self.now = float(start)
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += max(0.0, seconds)
+
+    def time_module(self):
+        """time 모듈 대용 (time/sleep만 가상, monotonic/perf_counter 등은 실제 시계)"""
+        module = types.SimpleNamespace(**{name: getattr(time, name) for name in dir(time) if not name.startswith("_")})
+        module.time = self.time
+        module.sleep = self.sleep
+        return module
+
+    def datetime_class(self):
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.now, tz)
+
+        return VirtualDatetime
+
+
+class MarketData:
+    """
+    시세 재생용 캔들 (index: 캔들 시작 UTC epoch 초). 가상 시각 기준으로 완성된 캔들만 보여주므로
+    미래 데이터가 새지 않는다.
+    """
+
+    def __init__(self, hourly, daily, market="KRW-BTC"):
+        self.market = market
+        self.frames = {"minute60": hourly, "day": daily}
+
+    @classmethod
+    def synthetic(cls, start, days, seed=0, price=80_000_000, volatility=0.008):
+        """기하 브라운 운동 시간봉과 이를 UTC 일 단위로 묶은 일봉"""
+        rng = np.random.default_rng(seed)
+        hours = days * 24
+        closes = price * np.exp(np.cumsum(rng.normal(0, volatility, hours)))
+        opens = np.concatenate([[price], closes[:-1]])
+        spread = np.abs(rng.normal(0, volatility / 2, (2, hours)))
+        hourly = pd.DataFrame({
+            "open": opens,
+            "high": np.maximum(opens, closes) * (1 + spread[0]),
+            "low": np.minimum(opens, closes) * (1 - spread[1]),
+            "close": closes,
+            "volume": rng.gamma(2.0, 20.0, hours),
+        }, index=start + np.arange(hours) * 3600)
+        hourly["value"] = hourly["volume"] * hourly["close"]
+
+        daily = hourly.groupby(hourly.index // 86400 * 86400).agg({
+            "open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum", "value": "sum",
+        })
+        return cls(hourly, daily)
+
+    @classmethod
+    def from_store(cls, path, exchange="upbit", market="KRW-BTC"):
+        """backfill.py로 받아둔 캔들 저장소의 시간봉/일봉"""
+        store = candle_store.CandleStore(path)
+        frames = []
+        for interval in ("minute60", "day"):
+            df = store.load(exchange, market, interval)
+            if df.empty:
+                raise ValueError(f"No {exchange} {market} {interval} candles in {path}")
+            df.index = candle_store.to_epoch(df.index)
+            if "value" not in df:
+                df["value"] = df["volume"] * df["close"]
+            frames.append(df)
+        store.close()
+        return cls(*frames, market=market)
+
+    @property
+    def start(self):
+        return int(self.frames["minute60"].index[0])
+
+    @property
+    def end(self):
+        return int(self.frames["minute60"].index[-1]) + 3600
+
+    def completed(self, interval, now):
+        seconds = candle_store.INTERVAL_SECONDS[interval]
+        df = self.frames[interval]
+        return df[df.index + seconds <= now]
+
+    def price(self, now):
+        return float(self.completed("minute60", now)["close"].iloc[-1])
+
+    def change(self, now, hours):
+        closes = self.completed("minute60", now)["close"]
+        if len(closes) <= hours:
+            return 0.0
+        return float(closes.iloc[-1] / closes.iloc[-1 - hours] - 1)
+
+    def candles(self, interval, now, count, to=None):
+        """거래소 캔들 API 형식 (최신 캔들부터)"""
+        df = self.completed(interval, now if to is None else min(now, to))
+        rows = []
+        for start, row in df.tail(count).iloc[::-1].iterrows():
+            utc = datetime.fromtimestamp(int(start), timezone.utc)
+            rows.append({
+                "market": self.market,
+                "candle_date_time_utc": utc.strftime("%Y-%m-%dT%H:%M:%S"),
+                "candle_date_time_kst": utc.astimezone(KST).strftime("%Y-%m-%dT%H:%M:%S"),
+                "opening_price": row["open"],
+                "high_price": row["high"],
+                "low_price": row["low"],
+                "trade_price": row["close"],
+                "timestamp": int(start + candle_store.INTERVAL_SECONDS[interval]) * 1000,
+                "candle_acc_trade_price": row["value"],
+                "candle_acc_trade_volume": row["volume"],
+            })
+        return rows
+
+    def ticker(self, now):
+        return [{
+            "market": self.market,
+            "trade_price": self.price(now),
+            "change_rate": self.change(now, 24),
+            "timestamp": int(now * 1000),
+        }]
+
+    def orderbook(self, now, levels=15):
+        price = self.price(now)
+        tick = 10 ** max(0, int(math.log10(price)) - 4)
+        rng = random.Random(int(now) // 3600)
+        units = []
+        for i in range(levels):
+            units.append({
+                "ask_price": (price // tick + 1 + i) * tick,
+                "bid_price": (price // tick - i) * tick,
+                "ask_size": round(rng.uniform(0.01, 1.5), 8),
+                "bid_size": round(rng.uniform(0.01, 1.5), 8),
+            })
+        return [{
+            "market": self.market,
+            "timestamp": int(now * 1000),
+            "total_ask_size": sum(unit["ask_size"] for unit in units),
+            "total_bid_size": sum(unit["bid_size"] for unit in units),
+            "orderbook_units": units,
+        }]
+
+
+class PaperAccount:
+    """시장가 주문을 현재가로 즉시 체결하는 모의 계좌"""
+
+    def __init__(self, krw=1_000_000):
+        self.krw = float(krw)
+        self.btc = 0.0
+        self.avg_buy_price = 0.0
+        self.orders = 0
+
+    def balances(self):
+        return [
+            {"currency": "KRW", "balance": str(self.krw), "locked": "0", "avg_buy_price": "0",
+             "avg_buy_price_modified": False, "unit_currency": "KRW"},
+            {"currency": "BTC", "balance": str(self.btc), "locked": "0", "avg_buy_price": str(self.avg_buy_price),
+             "avg_buy_price_modified": False, "unit_currency": "KRW"},
+        ]
+
+    def buy(self, krw, price):
+        if krw <= 0 or krw * (1 + FEE_RATE) > self.krw + 1e-6:
+            raise ValueError("insufficient_funds_bid")
+        volume = krw / price
+        self.avg_buy_price = (self.avg_buy_price * self.btc + krw) / (self.btc + volume)
+        self.btc += volume
+        self.krw -= krw * (1 + FEE_RATE)
+        self.orders += 1
+        return volume
+
+    def sell(self, volume, price):
+        if volume <= 0 or volume > self.btc + 1e-12:
+            raise ValueError("insufficient_funds_ask")
+        self.btc -= volume
+        self.krw += volume * price * (1 - FEE_RATE)
+        if self.btc <= 1e-12:
+            self.btc, self.avg_buy_price = 0.0, 0.0
+        self.orders += 1
+        return volume
+
+    def equity(self, price):
+        return self.krw + self.btc * price
+
+
+class DecisionModel:
+    """
+    OpenAI 대역. 녹화된 응답(openai.jsonl)이 있으면 순서대로 재생하고,
+    없으면 24시간 모멘텀 기준의 결정적 규칙으로 응답한다.
+    """
+
+    def __init__(self, market, clock, recorded=None, delay=0.0):
+        self.market = market
+        self.clock = clock
+        self.recorded = list(recorded or [])
+        self.delay = delay  # 응답 지연 (실제 초, 마감 시간/대체 경로 확인용)
+        self.calls = 0
+
+    def _decision(self):
+        change = self.market.change(self.clock.now, 24)
+        if change > 0.01:
+            return {"decision": "buy", "percentage": 30, "reason": f"24h momentum {change:+.2%}"}
+        if change < -0.01:
+            return {"decision": "sell", "percentage": 50, "reason": f"24h momentum {change:+.2%}"}
+        return {"decision": "hold", "percentage": 0, "reason": f"24h momentum {change:+.2%}"}
+
+    def complete(self, request):
+        if self.delay:
+            time.sleep(self.delay)
+        schema = ((request.get("response_format") or {}).get("json_schema") or {}).get("schema")
+        if self.recorded:
+            content = self.recorded[self.calls % len(self.recorded)]
+            content = content if isinstance(content, str) else json.dumps(content)
+        elif schema:
+            decision = self._decision()
+            if "reflection" in schema.get("properties", {}):
+                decision = {"reflection": "Offline reflection: follow the trend, keep position sizes small.",
+                            **decision}
+            content = json.dumps(decision)
+        else:
+            content = "Offline reflection: recent decisions followed short-term momentum."
+        self.calls += 1
+
+        prompt_tokens = len(json.dumps(request.get("messages", []), ensure_ascii=False)) // 4
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"chatcmpl-offline-{self.calls}",
+            "object": "chat.completion",
+            "created": int(self.clock.now),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+def _load_fixture(fixtures, name):
+    if not fixtures:
+        return None
+    path = os.path.join(fixtures, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="UTF-8") as f:
+        if name.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+class StandInServer:
+    """
+    업비트, 빗썸, OpenAI, SerpApi, alternative.me를 흉내 내는 로컬 HTTP 서버.
+    요청 경로는 /<원래 호스트>/<원래 경로> 형식이다.
+    """
+
+    def __init__(self, market, account, clock, fixtures=None, openai_delay=0.0):
+        self.market = market
+        self.account = account
+        self.clock = clock
+        self.model = DecisionModel(market, clock, _load_fixture(fixtures, "openai.jsonl"), openai_delay)
+        self.news = _load_fixture(fixtures, "news.json")
+        self.fear_greed = _load_fixture(fixtures, "fng.json")
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.candle_counts = {}  # 캔들 요청별 count 파라미터 (저장소가 빠진 구간만 받는지 확인용)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self, method):
+                parts = urlsplit(self.path)
+                host, _, path = parts.path.lstrip("/").partition("/")
+                path = "/" + path
+                query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, payload = server.route(method, host, path, query, body, self.headers.get("Content-Type", ""))
+
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Remaining-Req", REMAINING_REQ)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stand-in-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, method, host, path, query, body, content_type):
+        with self.lock:
+            name = f"{method} {host}{path}"
+            self.requests[name] = self.requests.get(name, 0) + 1
+            try:
+                return self._route(method, host, path, query, body, content_type)
+            except ValueError as e:
+                return 400, {"error": {"name": str(e), "message": str(e)}}
+
+    def _route(self, method, host, path, query, body, content_type):
+        now = self.clock.now
+        if host in ("api.upbit.com", "api.bithumb.com"):
+            if path.startswith("/v1/candles/"):
+                interval = "day" if path.endswith("/days") else f"minute{path.rsplit('/', 1)[-1]}"
+                self.candle_counts.setdefault(f"{host}{path}", []).append(int(query.get("count", 200)))
+                to = query.get("to")
+                if to:
+                    to = pd.Timestamp(to.replace("T", " ").rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+                return 200, self.market.candles(interval, now, int(query.get("count", 200)), to)
+            if path == "/v1/ticker":
+                return 200, self.market.ticker(now)
+            if path == "/v1/orderbook":
+                return 200, self.market.orderbook(now)
+            if path == "/v1/accounts":
+                return 200, self.account.balances()
+            if path == "/v1/orders" and method == "POST":
+                if "json" in content_type:
+                    order = json.loads(body or b"{}")
+                else:
+                    order = {key: values[-1] for key, values in parse_qs(body.decode("utf-8")).items()}
+                price = self.market.price(now)
+                if order.get("side") == "bid":
+                    self.account.buy(float(order["price"]), price)
+                else:
+                    self.account.sell(float(order["volume"]), price)
+                return (201 if host == "api.bithumb.com" else 200), {
+                    "uuid": f"offline-{self.account.orders}", "side": order.get("side"),
+                    "ord_type": order.get("ord_type"), "state": "done", "market": order.get("market"),
+                }
+
+        if host == "api.openai.com" and path.endswith("/chat/completions"):
+            return 200, self.model.complete(json.loads(body))
+
+        if host == "serpapi.com" and path == "/search":
+            return 200, self.news or {"news_results": [
+                {"title": "Bitcoin trades sideways as traders await macro data"},
+                {"title": "Spot Bitcoin ETF flows turn positive for the week"},
+            ]}
+
+        if host == "api.alternative.me" and path.startswith("/fng"):
+            if self.fear_greed:
+                return 200, self.fear_greed
+            value = int(min(100, max(0, 50 + self.market.change(now, 24 * 7) * 300)))
+            classification = ("Extreme Fear", "Fear", "Neutral", "Greed", "Extreme Greed")[min(4, value // 20)]
+            return 200, {"data": [{"value": str(value), "value_classification": classification,
+                                   "timestamp": str(int(now))}]}
+
+        return 404, {"error": {"message": f"No stand-in for {method} {host}{path}"}}
+
+
+def redirect_requests(base_url):
+    """requests로 나가는 외부 서비스 요청을 로컬 대역 서버로 돌린다. 원래 함수를 돌려주는 함수를 반환"""
+    original = requests.adapters.HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname in STAND_IN_HOSTS:
+            request.url = f"{base_url}/{parts.hostname}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return original(self, request, **kwargs)
+
+    requests.adapters.HTTPAdapter.send = send
+
+    def restore():
+        requests.adapters.HTTPAdapter.send = original
+    return restore
+
+
+def load_script(script, clock, server):
+    """대역 서버와 가상 시계를 바라보도록 환경을 맞춘 뒤 매매 스크립트를 import"""
+    os.environ.update({
+        "OPENAI_API_KEY": "offline",
+        "OPENAI_BASE_URL": f"{server.url}/api.openai.com/v1",
+        "SERP_API_KEY": "offline",
+        "UPBIT_ACCESS_KEY": "offline",
+        "UPBIT_SECRET_KEY": "offline",
+        "BITHUMB_ACCESS_KEY": "offline",
+        "BITHUMB_SECRET_KEY": "offline",
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+
+    # WebSocket 피드는 연결되지 않는 주소로 보내 REST(대역 서버)로 대체되게 함
+    import realtime_feed
+    realtime_feed.UPBIT_WS_URL = realtime_feed.BITHUMB_WS_URL = "ws://127.0.0.1:9"
+
+    module = importlib.import_module(script)
+    module.feed.stop(timeout=1)
+
+    import exchange_client
+    import llm_metrics
+    import reflection_cache
+    import trade_db
+    import trade_history
+    import trade_journal
+    virtual_time = clock.time_module()
+    virtual_datetime = clock.datetime_class()
+    for patched in (module, candle_store, reflection_cache, trade_db, trade_history, trade_journal):
+        patched.time = virtual_time
+
+    # 요청 수 제한 대기도 가상 시계로 (기다린 만큼 시뮬레이션 시간이 흐름)
+    throttle_time = clock.time_module()
+    throttle_time.monotonic = clock.time
+    exchange_client.time = throttle_time
+    llm_metrics.datetime = virtual_datetime
+    return module
+
+
+def run(script="gptbitcoin", days=30, seed=0, candles_db=None, fixtures=None, workdir=None,
+        warmup_days=60, krw=1_000_000, fused=False, openai_delay=0.0):
+    """
+    script의 ai_trading을 가상 시계로 days일 동안 TRADING_INTERVAL마다 실행하고 결과 요약을 반환한다.
+    작업 디렉터리(DB, 스크린샷 등)는 workdir(기본: 임시 디렉터리)에 만든다.
+    """
+    if candles_db:
+        market = MarketData.from_store(os.path.abspath(candles_db))
+    else:
+        market = MarketData.synthetic(1_704_067_200, math.ceil(warmup_days + days) + 1, seed)  # 2024-01-01 UTC
+    start = market.start + warmup_days * 86400
+    if start >= market.end:
+        raise ValueError("Not enough candles for the warm-up period")
+
+    clock = VirtualClock(start)
+    account = PaperAccount(krw)
+    server = StandInServer(market, account, clock, fixtures and os.path.abspath(fixtures), openai_delay).start()
+
+    workdir = workdir or tempfile.mkdtemp(prefix="autobtc-offline-")
+    os.makedirs(workdir, exist_ok=True)
+    shutil.copy(os.path.join(REPO_DIR, STRATEGY_FILES[script]), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    if fused:
+        os.environ["FUSED_REFLECTION"] = "true"
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    restore = redirect_requests(server.url)
+    try:
+        module = load_script(script, clock, server)
+        end = min(start + days * 86400, market.end)
+        first_price = market.price(clock.now)
+
+        cycles, errors = 0, 0
+        started = time.perf_counter()
+        while clock.now < end:
+            try:
+                module.ai_trading()
+            except Exception as e:
+                errors += 1
+                logger.exception("Cycle at %s failed: %s", datetime.fromtimestamp(clock.now, timezone.utc), e)
+            # 다음 사이클이 방금 거래를 읽을 수 있도록 저장 큐를 비움
+            module.journal.flush()
+            cycles += 1
+            clock.sleep(module.TRADING_INTERVAL)
+        elapsed = time.perf_counter() - started
+
+        last_price = market.price(min(clock.now, market.end))
+        return {
+            "script": script,
+            "workdir": workdir,
+            "cycles": cycles,
+            "errors": errors,
+            "wall_seconds": round(elapsed, 3),
+            "cycles_per_second": round(cycles / elapsed, 2) if elapsed else None,
+            "simulated_days": round((clock.now - start) / 86400, 2),
+            "orders": account.orders,
+            "start_equity": krw,
+            "final_equity": round(account.equity(last_price)),
+            "buy_and_hold_equity": round(krw * last_price / first_price),
+            "llm_calls": module.llm.stage_stats(),
+            "reflection_cache": module.reflections.stats(),
+            "requests": dict(sorted(server.requests.items())),
+            # 첫 요청은 전체, 이후에는 마지막 저장 캔들 이후 1~2개만 받아야 함
+            "candle_counts": {
+                name: {"first": counts[0], "max_after_first": max(counts[1:], default=None)}
+                for name, counts in sorted(server.candle_counts.items())
+            },
+        }
+    finally:
+        restore()
+        server.stop()
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 대역 서버와 가상 시계로 매매 루프를 오프라인 실행합니다.")
+    parser.add_argument("--script", choices=sorted(STRATEGY_FILES), default="gptbitcoin")
+    parser.add_argument("--days", type=float, default=30, help="시뮬레이션 기간 (일)")
+    parser.add_argument("--seed", type=int, default=0, help="합성 시세 난수 시드")
+    parser.add_argument("--candles-db", help="backfill.py로 받아둔 캔들 저장소 (없으면 합성 시세)")
+    parser.add_argument("--fixtures", help="녹화된 응답 디렉터리 (openai.jsonl, news.json, fng.json)")
+    parser.add_argument("--workdir", help="DB 등을 만들 작업 디렉터리 (기본: 임시 디렉터리)")
+    parser.add_argument("--fused", action="store_true", help="FUSED_REFLECTION 모드로 실행")
+    parser.add_argument("--openai-delay", type=float, default=0.0, help="OpenAI 대역 응답 지연 (초)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    summary = run(args.script, args.days, args.seed, args.candles_db, args.fixtures, args.workdir,
+                  fused=args.fused, openai_delay=args.openai_delay)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
@@ -0,0 +1,139 @@
+import json
+import logging
+import math
+
+import pandas as pd
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken이 없으면 글자 수로 대략 추정
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# 상세히 보여줄 최근 캔들 수 (토큰 예산을 넘으면 MIN_RECENT_ROWS까지 줄임)
+MAX_RECENT_ROWS = 24
+MIN_RECENT_ROWS = 3
+
+# 프롬프트에 넣지 않는 컬럼 (거래대금은 거래량 * 가격과 중복)
+DROP_COLUMNS = ("value",)
+
+_encodings = {}
+
+
+def count_tokens(text, model="gpt-4o"):
+    """모델 토크나이저 기준 토큰 수 (tiktoken을 쓸 수 없으면 4글자당 1토큰으로 추정)"""
+    if tiktoken is not None and model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # 토크나이저 파일을 내려받지 못한 경우 (오프라인 등)
+            logger.warning("Failed to load tokenizer for %s, estimating token counts: %s", model, e)
+            _encodings[model] = None
+    encoding = _encodings.get(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+
+def format_number(value):
+    """큰 값은 정수로, 작은 값은 유효숫자 4자리로 반올림"""
+    if value is None:
+        return ""
+    if isinstance(value, (bool, str)):
+        return str(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        return "" if math.isnan(value) else str(value)
+    if abs(value) >= 1000:
+        return str(int(round(value)))
+    return f"{value:.4g}"
+
+
+def _round_values(data):
+    if isinstance(data, dict):
+        return {key: _round_values(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_round_values(value) for value in data]
+    if isinstance(data, float):
+        text = format_number(data)
+        return float(text) if text else None
+    return data
+
+
+def encode_json(data):
+    """공백 없는 JSON (실수는 반올림)"""
+    return json.dumps(_round_values(data), ensure_ascii=False, separators=(",", ":"))
+
+
+def _time_format(index):
+    if len(index) > 1 and (index[1:] - index[:-1]).min() >= pd.Timedelta(days=1):
+        return "%Y-%m-%d"
+    return "%m-%d %H:%M"
+
+
+def summarize_frame(df):
+    """상세 구간 이전 캔들들의 요약 한 줄"""
+    close = df["close"]
+    parts = [
+        f"{len(df)} candles {df.index[0]:%Y-%m-%d %H:%M}~{df.index[-1]:%Y-%m-%d %H:%M}",
+        f"open={format_number(df['open'].iloc[0])}",
+        f"close={format_number(close.iloc[-1])}",
+        f"change={format_number((close.iloc[-1] / df['open'].iloc[0] - 1) * 100)}%",
+        f"high={format_number(df['high'].max())}",
+        f"low={format_number(df['low'].min())}",
+    ]
+    if "volume" in df:
+        parts.append(f"avg_volume={format_number(df['volume'].mean())}")
+    return "history: " + ", ".join(parts)
+
+
+def encode_frame(df, recent_rows=MAX_RECENT_ROWS):
+    """최근 recent_rows개 캔들은 CSV로, 그 이전은 요약 한 줄로 인코딩"""
+    df = df.drop(columns=[column for column in DROP_COLUMNS if column in df.columns])
+    if df.empty:
+        return "(no data)"
+
+    older, recent = df.iloc[:-recent_rows], df.iloc[-recent_rows:]
+    lines = []
+    if len(older):
+        lines.append(summarize_frame(older))
+
+    time_format = _time_format(df.index)
+    lines.append(",".join(["time"] + [str(column) for column in recent.columns]))
+    for index, row in zip(recent.index, recent.itertuples(index=False, name=None)):
+        lines.append(",".join([index.strftime(time_format)] + [format_number(value) for value in row]))
+    return "\n".join(lines)
+
+
+def encode_market_data(sections, budget=4000, model="gpt-4o"):
+    """
+    {섹션 이름: 데이터} 를 프롬프트용 텍스트로 인코딩한다. DataFrame은 CSV + 요약으로, 나머지는 압축 JSON으로 넣고
+    전체가 budget 토큰을 넘으면 토큰이 가장 많은 DataFrame 섹션의 상세 캔들 수부터 줄인다.
+    (텍스트, {섹션 이름: 토큰 수})를 반환한다.
+    """
+    recent_rows = {
+        name: min(len(data), MAX_RECENT_ROWS)
+        for name, data in sections.items() if isinstance(data, pd.DataFrame)
+    }
+
+    while True:
+        encoded = {}
+        for name, data in sections.items():
+            if isinstance(data, pd.DataFrame):
+                encoded[name] = encode_frame(data, max(recent_rows[name], 1))
+            else:
+                encoded[name] = encode_json(data)
+        token_counts = {name: count_tokens(f"{name}:\n{text}", model) for name, text in encoded.items()}
+        total = sum(token_counts.values())
+
+        shrinkable = [name for name, rows in recent_rows.items() if rows > MIN_RECENT_ROWS]
+        if total <= budget or not shrinkable:
+            break
+        largest = max(shrinkable, key=lambda name: token_counts[name])
+        recent_rows[largest] = max(MIN_RECENT_ROWS, recent_rows[largest] * 2 // 3)
+
+    if total > budget:
+        logger.warning("Prompt market data uses %d tokens (budget %d)", total, budget)
+    text = "\n".join(f"{name}:\n{encoded[name]}" for name in sections)
+    return text, token_counts
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+UPBIT_WS_URL = "wss://api.upbit.com/websocket/v1"
+BITHUMB_WS_URL = "wss://ws-api.bithumb.com/websocket/v1"
+
+
+class RealtimeFeed:
+    """
+    업비트/빗썸 WebSocket으로 현재가(ticker)와 호가(orderbook)를 받아 메모리에 최신 상태를 유지한다.
+    백그라운드 스레드에서 동작하며, 연결이 끊기면 지수 백오프로 재연결 후 다시 구독한다.
+    stale_after초 이상 갱신되지 않은 값은 None으로 반환하므로 호출 측에서 REST로 대체할 수 있다.
+    """
+
+    def __init__(self, url=UPBIT_WS_URL, codes=("KRW-BTC",), stale_after=10,
+                 reconnect_delay=1, max_reconnect_delay=30, record_path=None):
+        self.url = url
+        self.codes = list(codes)
+        self.stale_after = stale_after
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.record_path = record_path
+
+        self.lock = threading.Lock()
+        self.tickers = {}     # code -> (수신 시각, ticker)
+        self.orderbooks = {}  # code -> (수신 시각, orderbook)
+        self.connected = threading.Event()
+        self.connections = 0
+        self.messages = 0
+        self.failures = 0  # 연속 연결 실패 횟수 (연결되면 0으로 초기화)
+
+        self.loop = None
+        self.thread = None
+        self.stopping = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return self
+        self.loop = asyncio.new_event_loop()
+        self.stopping = asyncio.Event()
+        self.thread = threading.Thread(target=self._run, name="realtime-feed", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        if self.loop and self.stopping:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+        if self.thread:
+            self.thread.join(timeout)
+        self.connected.clear()
+
+    def wait_ready(self, timeout=10):
+        """모든 코드의 현재가와 호가를 한 번 이상 받을 때까지 대기"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self.get_ticker(code) and self.get_orderbook(code) for code in self.codes):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _fresh(self, entry):
+        if entry is None:
+            return None
+        received, value = entry
+        if time.monotonic() - received > self.stale_after:
+            return None
+        return value
+
+    def get_ticker(self, code="KRW-BTC"):
+        with self.lock:
+            return self._fresh(self.tickers.get(code))
+
+    def get_orderbook(self, code="KRW-BTC"):
+        """pyupbit.get_orderbook과 같은 형식의 호가 dict"""
+        with self.lock:
+            return self._fresh(self.orderbooks.get(code))
+
+    def get_current_price(self, code="KRW-BTC"):
+        ticker = self.get_ticker(code)
+        return ticker["trade_price"] if ticker else None
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._consume_forever())
+        finally:
+            self.loop.close()
+
+    async def _consume_forever(self):
+        while not self.stopping.is_set():
+            try:
+                await self._consume()
+            except Exception as e:
+                logger.warning("WebSocket feed disconnected: %s", e)
+            self.connected.clear()
+            if self.stopping.is_set():
+                break
+            # 연결됐던 세션이 끊기면 기본 대기, 연결에 연속으로 실패할수록 2배씩 늘림
+            delay = min(self.reconnect_delay * 2 ** min(self.failures, 16), self.max_reconnect_delay)
+            self.failures += 1
+            # 재연결 대기 (종료 요청이 오면 즉시 빠져나감)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _consume(self):
+        async with websockets.connect(self.url, ping_interval=20, max_size=2 ** 22) as ws:
+            # 재연결할 때마다 다시 구독하므로 거래소가 보내는 첫 스냅샷으로 상태가 재동기화됨
+            await ws.send(json.dumps([
+                {"ticket": str(uuid.uuid4())},
+                {"type": "ticker", "codes": self.codes},
+                {"type": "orderbook", "codes": self.codes},
+            ]))
+            self.connections += 1
+            self.failures = 0
+            self.connected.set()
+            logger.info("WebSocket feed connected: %s %s", self.url, self.codes)
+
+            stop_task = asyncio.ensure_future(self.stopping.wait())
+            try:
+                while True:
+                    receive_task = asyncio.ensure_future(ws.recv())
+                    done, _ = await asyncio.wait({receive_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if stop_task in done:
+                        receive_task.cancel()
+                        return
+                    self.handle_message(receive_task.result())
+            finally:
+                stop_task.cancel()
+
+    def handle_message(self, message):
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        if self.record_path:
+            with open(self.record_path, "a", encoding="UTF-8") as f:
+                f.write(message + "\n")
+
+        data = json.loads(message)
+        if "error" in data:
+            logger.error("WebSocket feed error: %s", data["error"])
+            return
+
+        code = data.get("code")
+        received = time.monotonic()
+        with self.lock:
+            if data.get("type") == "ticker":
+                self.tickers[code] = (received, data)
+            elif data.get("type") == "orderbook":
+                self.orderbooks[code] = (received, {
+                    "market": code,
+                    "timestamp": data.get("timestamp"),
+                    "total_ask_size": data.get("total_ask_size"),
+                    "total_bid_size": data.get("total_bid_size"),
+                    "orderbook_units": data.get("orderbook_units", []),
+                })
+            self.messages += 1
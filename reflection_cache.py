@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 가격은 2% 단위, RSI는 10포인트 단위로 양자화 (매 사이클 바뀌지 않을 만큼 거칠게)
+PRICE_STEP = 0.02
+RSI_STEP = 10
+
+
+def trades_fingerprint(trades_df, limit=3):
+    """
+    최근 매수/매도 결정(결정, 비율)과 가장 최근 매수/매도의 id 기준 지문.
+    hold도 매 사이클 거래 행으로 기록되므로 hold는 제외해 실제 매매가 있을 때만 바뀜
+    (같은 결정이 반복돼도 새 거래면 id가 달라 바뀜)
+    """
+    if trades_df is None or trades_df.empty or "decision" not in trades_df.columns:
+        return "no-trades"
+    trades = trades_df[trades_df["decision"].str.lower() != "hold"]
+    columns = [column for column in ("decision", "percentage") if column in trades.columns]
+    rows = trades[columns].head(limit).astype(str).values.tolist()
+    newest = str(trades["id"].iloc[0]) if "id" in trades.columns and not trades.empty else None
+    return hashlib.sha256(json.dumps({"newest": newest, "rows": rows}).encode("utf-8")).hexdigest()
+
+
+def _last(df, column):
+    if df is None or column not in df.columns or df.empty:
+        return None
+    value = df[column].iloc[-1]
+    return None if value != value else float(value)  # NaN -> None
+
+
+def market_digest(price, df_daily=None, df_hourly=None, fear_greed_index=None):
+    """회고 결과에 영향을 줄 만큼 시장이 바뀌었는지 판단하기 위한 양자화된 시장 요약"""
+    digest = {
+        "price": round(math.log(price) / math.log1p(PRICE_STEP)) if price else None,
+        "fear_greed": (fear_greed_index or {}).get("value_classification"),
+    }
+    # 시간봉 RSI는 매 시간 흔들리므로 일봉 RSI만 쓰고, 시간봉은 MACD 방향만 반영
+    daily_rsi = _last(df_daily, "rsi")
+    digest["daily_rsi"] = None if daily_rsi is None else int(daily_rsi // RSI_STEP)
+    for name, df in (("daily", df_daily), ("hourly", df_hourly)):
+        macd_diff = _last(df, "macd_diff")
+        digest[f"{name}_macd"] = None if macd_diff is None else macd_diff > 0
+    return digest
+
+
+def make_key(trades_df, digest):
+    payload = json.dumps({"trades": trades_fingerprint(trades_df), "market": digest}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReflectionCache:
+    """
+    generate_reflection 결과를 (최근 거래 지문 + 시장 요약) 키로 SQLite에 저장하는 캐시.
+    ttl초가 지난 항목은 만료되고, max_entries를 넘으면 가장 오래 쓰이지 않은 항목부터 지운다.
+    """
+
+    def __init__(self, path="trading_data.db", ttl=6 * 3600, max_entries=200):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS reflection_cache (
+            key TEXT PRIMARY KEY,
+            reflection TEXT,
+            created_at REAL,
+            last_used REAL,
+            hits INTEGER DEFAULT 0
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS reflection_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER
+        )
+        ''')
+        self.conn.commit()
+
+    def _count(self, name, amount=1):
+        self.conn.execute('''
+        INSERT INTO reflection_cache_stats (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        ''', (name, amount))
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT reflection, created_at FROM reflection_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM reflection_cache WHERE key = ?", (key,))
+                self._count("expired")
+                row = None
+
+            if row is None:
+                self._count("misses")
+                self.conn.commit()
+                return None
+
+            self.conn.execute(
+                "UPDATE reflection_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._count("hits")
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key, reflection):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('''
+            INSERT OR REPLACE INTO reflection_cache (key, reflection, created_at, last_used, hits)
+            VALUES (?, ?, ?, ?, 0)
+            ''', (key, reflection, now, now))
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        expired = self.conn.execute(
+            "DELETE FROM reflection_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        evicted = self.conn.execute('''
+        DELETE FROM reflection_cache WHERE key IN (
+            SELECT key FROM reflection_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+        ''', (self.max_entries,)).rowcount
+        if expired:
+            self._count("expired", expired)
+        if evicted:
+            self._count("evicted", evicted)
+
+    def stats(self):
+        """히트/미스/만료/퇴출 횟수와 히트율"""
+        with self.lock:
+            stats = dict(self.conn.execute("SELECT name, value FROM reflection_cache_stats").fetchall())
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM reflection_cache").fetchone()[0]
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+        return stats
+
+    def get_or_generate(self, key, generate):
+        """캐시에 유효한 회고가 있으면 재사용하고, 없으면 generate()로 만들어 저장"""
+        reflection = self.get(key)
+        if reflection is not None:
+            logger.info("Reusing cached reflection (hit rate %.0f%%)", self.stats()["hit_rate"] * 100)
+            return reflection
+        reflection = generate()
+        self.put(key, reflection)
+        return reflection
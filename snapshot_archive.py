@@ -0,0 +1,151 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # zstandard가 없으면 zlib으로 압축
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+
+def _default(value):
+    """JSON으로 바로 바뀌지 않는 값 (DataFrame, 시각, NumPy 값, pydantic 모델) 변환"""
+    if isinstance(value, pd.DataFrame):
+        return {
+            "__frame__": True,
+            "index": [timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp
+                      for timestamp in value.index],
+            "columns": [str(column) for column in value.columns],
+            "data": value.to_numpy(dtype=object).tolist(),
+        }
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _object_hook(value):
+    if value.get("__frame__"):
+        index = value["index"]
+        if index and isinstance(index[0], str):
+            index = pd.to_datetime(index)
+        return pd.DataFrame(value["data"], index=index, columns=value["columns"]).infer_objects()
+    return value
+
+
+def _compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(codec, blob):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this snapshot")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class SnapshotArchive:
+    """
+    매매 결정마다 모델이 본 입력 (프롬프트 메시지, 시장 데이터 DataFrame, 호가, 공포탐욕지수, 뉴스, 전략 자막,
+    회고)과 결정을 압축해 trades.id를 키로 저장한다. 나중에 데이터를 다시 받지 않고 재현/감사/재평가할 수 있다.
+    스냅샷마다 따로 압축하므로 trade_id 하나만 바로 읽을 수 있다.
+    """
+
+    def __init__(self, path="snapshots.db"):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            trade_id INTEGER PRIMARY KEY,
+            cycle_id TEXT,
+            timestamp INTEGER,
+            codec TEXT,
+            raw_size INTEGER,
+            data BLOB
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON snapshots (timestamp)")
+        self.conn.commit()
+
+    def put(self, trade_id, snapshot, cycle_id=None):
+        raw = json.dumps(snapshot, default=_default, ensure_ascii=False).encode("utf-8")
+        codec, blob = _compress(raw)
+        with self.lock:
+            self.conn.execute('''
+            INSERT OR REPLACE INTO snapshots (trade_id, cycle_id, timestamp, codec, raw_size, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (trade_id, cycle_id, int(time.time()), codec, len(raw), blob))
+            self.conn.commit()
+        logger.info("Snapshot for trade %s archived (%d -> %d bytes, %s)", trade_id, len(raw), len(blob), codec)
+
+    def get(self, trade_id):
+        """저장된 스냅샷 (DataFrame은 DataFrame으로 복원), 없으면 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT codec, data FROM snapshots WHERE trade_id = ?", (trade_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(_decompress(*row), object_hook=_object_hook)
+
+    def trade_ids(self, since=None, until=None):
+        """since~until(epoch 초) 사이에 저장된 trade_id 목록"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT trade_id FROM snapshots WHERE timestamp >= ? AND timestamp <= ? ORDER BY trade_id",
+                (since or 0, until or 2 ** 62),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        with self.lock:
+            count, raw_size, stored_size = self.conn.execute(
+                "SELECT COUNT(*), SUM(raw_size), SUM(LENGTH(data)) FROM snapshots"
+            ).fetchone()
+        return {
+            "snapshots": count,
+            "raw_bytes": raw_size or 0,
+            "stored_bytes": stored_size or 0,
+            "ratio": (raw_size / stored_size) if stored_size else None,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="매매 결정 스냅샷 조회")
+    parser.add_argument("--db", default="snapshots.db")
+    parser.add_argument("--trade-id", type=int, help="이 거래의 스냅샷 출력")
+    args = parser.parse_args()
+
+    archive = SnapshotArchive(args.db)
+    if args.trade_id is None:
+        print(json.dumps(archive.stats(), indent=2))
+    else:
+        snapshot = archive.get(args.trade_id)
+        if snapshot is None:
+            print(f"No snapshot for trade {args.trade_id}")
+        else:
+            print(json.dumps(snapshot, default=_default, ensure_ascii=False, indent=2))
+    archive.close()
@@ -1,44 +1,15 @@
-import sqlite3
-from datetime import datetime
+import trade_journal
 
-# SQLite DB 연결 및 테이블 생성 함수
+# 거래 기록 저장 스레드 (처음 쓸 때 시작, 연결 하나를 계속 사용)
+journal = None
+
+# 저장 스레드 시작 (DB와 테이블이 없으면 만들고, 스키마가 예전 버전이면 마이그레이션)
 def init_db():
-    conn = sqlite3.connect('trading_data.db')
-    cursor = conn.cursor()
-    
-    # 테이블이 존재하지 않으면 생성
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS trades (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        decision TEXT,
-        percentage INTEGER,
-        reason TEXT,
-        btc_balance REAL,
-        krw_balance REAL,
-        btc_avg_buy_price REAL,
-        btc_krw_price REAL,
-        total_asset REAL
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    global journal
+    if journal is None:
+        journal = trade_journal.TradeJournal('trading_data.db')
+    return journal
 
-# 매매 데이터를 DB에 저장하는 함수
+# 매매 데이터를 저장 큐에 넣는 함수 (시각은 epoch 초로 저장, 저장되면 trades.id로 완료되는 Future 반환)
 def save_trade_data(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset):
-    conn = sqlite3.connect('trading_data.db')
-    cursor = conn.cursor()
-
-    # 현재 시간을 가져옴
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    # 데이터를 테이블에 삽입
-    cursor.execute('''
-    INSERT INTO trades (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (current_time, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset))
-    
-    conn.commit()
-    conn.close()
-
+    return init_db().record_trade(decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price, btc_krw_price, total_asset)
@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import prompt_encoder
+
+logger = logging.getLogger(__name__)
+
+# 청크 최대 길이(글자)와 자막처럼 문장 구분이 없는 긴 문단을 자를 때 겹치는 길이
+CHUNK_CHARS = 400
+CHUNK_OVERLAP = 80
+
+# BM25 파라미터
+K1 = 1.5
+B = 0.75
+
+_HANGUL = re.compile(r"[가-힣]+")
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|(?<=다\.)|(?<=요\.)|\n")
+
+
+def tokenize(text):
+    """영문/숫자는 단어 단위, 한글은 조사가 붙어도 매칭되도록 글자 2-gram 단위로 나눈다"""
+    text = text.lower()
+    tokens = _WORD.findall(text)
+    for run in _HANGUL.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _window(text, size, overlap):
+    # 문장 구분이 없는 긴 텍스트는 공백 기준으로 size 글자씩 겹쳐 자름
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            space = text.rfind(" ", start + size // 2, end)
+            end = space if space > 0 else end
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """빈 줄 기준 문단 -> 문장 순으로 묶어 size 글자 이하 청크 목록을 만든다"""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= size:
+            chunks.append(paragraph)
+            continue
+
+        current = ""
+        for sentence in _SENTENCE.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) > size:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.extend(_window(sentence, size, overlap))
+            elif len(current) + len(sentence) + 1 > size:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _last(df, column):
+    if df is None or column not in df.columns or df.empty:
+        return None
+    value = df[column].iloc[-1]
+    return None if value != value else float(value)  # NaN -> None
+
+
+def market_query(df_daily=None, df_hourly=None, fear_greed_index=None):
+    """현재 시장 상황(보조지표, 공포탐욕지수)을 전략 문서 검색용 키워드로 변환"""
+    terms = []
+    for df in (df_daily, df_hourly):
+        rsi = _last(df, "rsi")
+        if rsi is not None:
+            if rsi >= 70:
+                terms.append("RSI 과매수 매도")
+            elif rsi <= 30:
+                terms.append("RSI 과매도 매수")
+            else:
+                terms.append("RSI")
+
+        stoch_k = _last(df, "stoch_k")
+        if stoch_k is not None and (stoch_k >= 80 or stoch_k <= 20):
+            terms.append("스토캐스틱 과매수" if stoch_k >= 80 else "스토캐스틱 과매도")
+
+        macd_diff = _last(df, "macd_diff")
+        if macd_diff is not None:
+            terms.append("MACD 골든크로스 상승" if macd_diff > 0 else "MACD 데드크로스 하락")
+
+        close = _last(df, "close")
+        upper, lower = _last(df, "bb_bbh"), _last(df, "bb_bbl")
+        if close is not None and upper is not None and lower is not None:
+            if close >= upper:
+                terms.append("볼린저 밴드 상단 돌파")
+            elif close <= lower:
+                terms.append("볼린저 밴드 하단 이탈")
+
+        ema = _last(df, "ema_12")
+        if close is not None and ema is not None:
+            terms.append("EMA 이동 평균 위 롱" if close > ema else "EMA 이동 평균 아래 숏")
+
+    classification = (fear_greed_index or {}).get("value_classification", "")
+    if "Fear" in classification:
+        terms.append("공포 매수")
+    elif "Greed" in classification:
+        terms.append("탐욕 매도")
+
+    terms.append("거래량 추세 손절")
+    return " ".join(terms)
+
+
+class StrategyIndex:
+    """
+    전략 문서(유튜브 자막 등)를 청크로 나눠 SQLite에 BM25 역색인으로 저장하는 검색 인덱스.
+    매 사이클 전략 전문을 프롬프트에 붙이는 대신 현재 시장 상황과 관련된 상위 k개 청크만 고른다.
+    """
+
+    def __init__(self, path="strategy_index.db"):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS strategy_sources (
+            source TEXT PRIMARY KEY,
+            digest TEXT,
+            indexed_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS strategy_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            position INTEGER,
+            text TEXT,
+            length INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS strategy_terms (
+            term TEXT,
+            chunk_id INTEGER,
+            tf INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_strategy_terms_term ON strategy_terms (term);
+        CREATE INDEX IF NOT EXISTS idx_strategy_chunks_source ON strategy_chunks (source);
+        ''')
+        self.conn.commit()
+
+    def add_document(self, source, text):
+        """문서를 색인 (내용이 바뀌지 않았으면 건너뜀). 새로 만든 청크 수를 반환"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT digest FROM strategy_sources WHERE source = ?", (source,)
+            ).fetchone()
+            if row is not None and row[0] == digest:
+                return 0
+
+            self._remove(source)
+            chunks = chunk_text(text)
+            for position, chunk in enumerate(chunks):
+                terms = Counter(tokenize(chunk))
+                cursor = self.conn.execute(
+                    "INSERT INTO strategy_chunks (source, position, text, length) VALUES (?, ?, ?, ?)",
+                    (source, position, chunk, sum(terms.values()))
+                )
+                self.conn.executemany(
+                    "INSERT INTO strategy_terms (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in terms.items()]
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO strategy_sources (source, digest, indexed_at) VALUES (?, ?, ?)",
+                (source, digest, time.time())
+            )
+            self.conn.commit()
+        logger.info("Indexed %s: %d chunks", source, len(chunks))
+        return len(chunks)
+
+    def add_file(self, path):
+        with open(path, "r", encoding="UTF-8") as f:
+            return self.add_document(path, f.read())
+
+    def _remove(self, source):
+        self.conn.execute(
+            "DELETE FROM strategy_terms WHERE chunk_id IN (SELECT id FROM strategy_chunks WHERE source = ?)",
+            (source,)
+        )
+        self.conn.execute("DELETE FROM strategy_chunks WHERE source = ?", (source,))
+        self.conn.execute("DELETE FROM strategy_sources WHERE source = ?", (source,))
+
+    def remove(self, source):
+        with self.lock:
+            self._remove(source)
+            self.conn.commit()
+
+    def search(self, query, k=5):
+        """BM25 점수 상위 k개 청크 [(점수, source, position, text), ...]"""
+        query_terms = Counter(tokenize(query))
+        with self.lock:
+            total, avg_length = self.conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM strategy_chunks"
+            ).fetchone()
+            if not total:
+                return []
+
+            scores = Counter()
+            for term, query_tf in query_terms.items():
+                postings = self.conn.execute('''
+                SELECT t.chunk_id, t.tf, c.length FROM strategy_terms t
+                JOIN strategy_chunks c ON c.id = t.chunk_id
+                WHERE t.term = ?
+                ''', (term,)).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf, length in postings:
+                    norm = K1 * (1 - B + B * length / avg_length)
+                    scores[chunk_id] += query_tf * idf * tf * (K1 + 1) / (tf + norm)
+
+            top = scores.most_common(k)
+            if not top:
+                return []
+            rows = self.conn.execute(
+                f"SELECT id, source, position, text FROM strategy_chunks WHERE id IN ({','.join('?' * len(top))})",
+                [chunk_id for chunk_id, _ in top]
+            ).fetchall()
+        by_id = {row[0]: row[1:] for row in rows}
+        return [(score, *by_id[chunk_id]) for chunk_id, score in top]
+
+    def retrieve(self, query, k=5, budget=None):
+        """
+        프롬프트에 넣을 관련 전략 텍스트. 상위 k개 청크를 (budget 토큰 이내에서) 골라
+        원문 순서대로 이어 붙인다.
+        """
+        selected, used = [], 0
+        for score, source, position, text in self.search(query, k):
+            if budget is not None:
+                tokens = prompt_encoder.count_tokens(text)
+                if selected and used + tokens > budget:
+                    break
+                used += tokens
+            selected.append((source, position, text))
+        selected.sort()
+        return "\n\n".join(text for _, _, text in selected)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="전략 문서를 검색 인덱스에 추가하거나 검색합니다.")
+    parser.add_argument("--db", default="strategy_index.db")
+    parser.add_argument("--files", nargs="*", default=[], help="색인할 텍스트 파일")
+    parser.add_argument("--videos", nargs="*", default=[], help="자막을 받아 색인할 유튜브 영상 ID")
+    parser.add_argument("--query", help="검색어")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = StrategyIndex(args.db)
+    for path in args.files:
+        index.add_file(path)
+    if args.videos:
+        from youtube_data import get_combined_transcript
+        for video_id in args.videos:
+            for transcript in get_combined_transcript([video_id]):
+                index.add_document(f"youtube:{video_id}", transcript)
+    if args.query:
+        for score, source, position, text in index.search(args.query, args.k):
+            print(f"[{score:.2f}] {source}#{position}: {text}\n")
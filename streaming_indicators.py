@@ -0,0 +1,273 @@
+import copy
+import math
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+NAN = float("nan")
+
+
+# 고정 길이 윈도우의 평균/표준편차를 O(1)로 갱신 (Welford 방식, NaN은 개수에서 제외)
+class _RollingStats:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (x - self.mean)
+
+    def push(self, x):
+        self.values.append(x)
+        if not math.isnan(x):
+            self._add(x)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if not math.isnan(old):
+                self._remove(old)
+
+    def get_mean(self, min_periods):
+        if self.count < min_periods or self.count == 0:
+            return NAN
+        return self.mean
+
+    def get_std(self, min_periods):
+        # pandas rolling().std(ddof=0)와 동일
+        if self.count < min_periods or self.count == 0:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / self.count)
+
+
+# 고정 길이 윈도우의 최솟값/최댓값 (단조 덱, 캔들당 분할상환 O(1))
+class _RollingExtreme:
+    def __init__(self, window, is_max):
+        self.window = window
+        self.is_max = is_max
+        self.position = 0
+        self.deque = deque()  # (position, value)
+
+    def push(self, x):
+        while self.deque and (self.deque[-1][1] <= x if self.is_max else self.deque[-1][1] >= x):
+            self.deque.pop()
+        self.deque.append((self.position, x))
+        if self.deque[0][0] <= self.position - self.window:
+            self.deque.popleft()
+        self.position += 1
+
+    def get(self):
+        if self.position < self.window:
+            return NAN
+        return self.deque[0][1]
+
+
+# pandas ewm(adjust=False).mean()과 동일한 지수 가중 평균 (앞쪽 NaN은 건너뜀)
+class _EWM:
+    def __init__(self, alpha, min_periods):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.nobs = 0
+        self.value = NAN
+
+    def push(self, x):
+        if math.isnan(x):
+            return self.get()
+        self.nobs += 1
+        if self.nobs == 1:
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.get()
+
+    def get(self):
+        return self.value if self.nobs >= self.min_periods else NAN
+
+
+class SMA:
+    """ta.trend.SMAIndicator와 같은 값을 내는 단순 이동평균"""
+
+    def __init__(self, window=20, column=None):
+        self.window = window
+        self.column = column or f"sma_{window}"
+        self._stats = _RollingStats(window)
+
+    def update(self, candle):
+        self._stats.push(candle["close"])
+        return {self.column: self._stats.get_mean(self.window)}
+
+
+class EMA:
+    """ta.trend.EMAIndicator와 같은 값을 내는 지수 이동평균"""
+
+    def __init__(self, window=12, column=None):
+        self.window = window
+        self.column = column or f"ema_{window}"
+        self._ewm = _EWM(2 / (window + 1), window)
+
+    def update(self, candle):
+        return {self.column: self._ewm.push(candle["close"])}
+
+
+class BollingerBands:
+    """ta.volatility.BollingerBands와 같은 값을 내는 볼린저 밴드"""
+
+    def __init__(self, window=20, window_dev=2, wband=False):
+        self.window = window
+        self.window_dev = window_dev
+        self.wband = wband
+        self._stats = _RollingStats(window)
+
+    def update(self, candle):
+        self._stats.push(candle["close"])
+        mavg = self._stats.get_mean(self.window)
+        mstd = self._stats.get_std(self.window)
+        hband = mavg + self.window_dev * mstd
+        lband = mavg - self.window_dev * mstd
+        values = {"bb_bbm": mavg, "bb_bbh": hband, "bb_bbl": lband}
+        if self.wband:
+            values["bb_bbw"] = (hband - lband) / mavg * 100 if mavg else NAN
+        return values
+
+
+class RSI:
+    """ta.momentum.RSIIndicator와 같은 값을 내는 RSI (Wilder 평활)"""
+
+    def __init__(self, window=14, column="rsi"):
+        self.window = window
+        self.column = column
+        self._prev_close = None
+        self._up = _EWM(1 / window, window)
+        self._down = _EWM(1 / window, window)
+
+    def update(self, candle):
+        close = candle["close"]
+        # ta와 동일하게 첫 캔들의 변화량은 0으로 취급
+        diff = 0.0 if self._prev_close is None else close - self._prev_close
+        self._prev_close = close
+        up = self._up.push(diff if diff > 0 else 0.0)
+        down = self._down.push(-diff if diff < 0 else 0.0)
+        if math.isnan(down):
+            rsi = NAN
+        elif down == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + up / down))
+        return {self.column: rsi}
+
+
+class MACD:
+    """ta.trend.MACD와 같은 값을 내는 MACD"""
+
+    def __init__(self, window_slow=26, window_fast=12, window_sign=9):
+        self._fast = _EWM(2 / (window_fast + 1), window_fast)
+        self._slow = _EWM(2 / (window_slow + 1), window_slow)
+        self._signal = _EWM(2 / (window_sign + 1), window_sign)
+
+    def update(self, candle):
+        close = candle["close"]
+        macd = self._fast.push(close) - self._slow.push(close)
+        signal = self._signal.push(macd)
+        return {"macd": macd, "macd_signal": signal, "macd_diff": macd - signal}
+
+
+class Stochastic:
+    """ta.momentum.StochasticOscillator와 같은 값을 내는 스토캐스틱 (%K, %D)"""
+
+    def __init__(self, window=14, smooth_window=3):
+        self.smooth_window = smooth_window
+        self._low = _RollingExtreme(window, is_max=False)
+        self._high = _RollingExtreme(window, is_max=True)
+        self._d = _RollingStats(smooth_window)
+
+    def update(self, candle):
+        self._low.push(candle["low"])
+        self._high.push(candle["high"])
+        smin = self._low.get()
+        smax = self._high.get()
+        numerator = candle["close"] - smin
+        denominator = smax - smin
+        if math.isnan(denominator):
+            stoch_k = NAN
+        elif denominator == 0:
+            # pandas의 0 나눗셈 결과(inf/NaN)와 맞춤
+            stoch_k = NAN if numerator == 0 else math.copysign(math.inf, numerator)
+        else:
+            stoch_k = 100 * numerator / denominator
+        self._d.push(stoch_k)
+        return {"stoch_k": stoch_k, "stoch_d": self._d.get_mean(self.smooth_window)}
+
+
+class IndicatorEngine:
+    """
+    캔들이 들어올 때마다 각 지표의 상태(누적합, EMA 등)만 갱신하는 스트리밍 지표 엔진.
+    생성 이후 넣어준 전체 캔들 시퀀스에 대해 ta로 계산한 값과 같은 결과를 낸다.
+    같은 인덱스의 캔들이 다시 들어오면(진행 중인 캔들) 직전 상태로 되돌린 뒤 다시 반영한다.
+    """
+
+    def __init__(self, indicators, history=1000):
+        self.indicators = list(indicators)
+        self.history = history
+        self.last_index = None
+        self._before_last = None  # 마지막 캔들 반영 직전 상태
+        self._rows = OrderedDict()  # 인덱스별 계산 결과 (최근 history개)
+
+    def _apply(self, index, candle, keep_snapshot):
+        if self.last_index is not None and index < self.last_index:
+            raise ValueError(f"캔들 순서가 올바르지 않습니다: {index} < {self.last_index}")
+
+        if index == self.last_index:
+            if self._before_last is None:
+                raise ValueError(f"이미 확정된 캔들은 다시 반영할 수 없습니다: {index}")
+            self.indicators = self._before_last
+        self._before_last = copy.deepcopy(self.indicators) if keep_snapshot else None
+
+        values = {}
+        for indicator in self.indicators:
+            values.update(indicator.update(candle))
+
+        self.last_index = index
+        self._rows[index] = values
+        self._rows.move_to_end(index)
+        while len(self._rows) > self.history:
+            self._rows.popitem(last=False)
+        return values
+
+    def update(self, index, candle):
+        """캔들 하나를 반영하고 최신 지표 값을 dict로 반환"""
+        return self._apply(index, candle, keep_snapshot=True)
+
+    def add_indicators(self, df):
+        """df 중 아직 반영하지 않은 캔들만 갱신하고, 지표 컬럼을 채워 반환"""
+        if self.last_index is None:
+            new_rows = df
+        else:
+            new_rows = df[df.index >= self.last_index]
+
+        last_position = len(new_rows) - 1
+        rows = new_rows[["high", "low", "close"]].itertuples(name=None)
+        for position, (index, high, low, close) in enumerate(rows):
+            candle = {"high": high, "low": low, "close": close}
+            self._apply(index, candle, keep_snapshot=position == last_position)
+
+        values = pd.DataFrame.from_dict(
+            {index: self._rows[index] for index in df.index if index in self._rows},
+            orient="index",
+        )
+        values = values.reindex(df.index)
+        for column in values.columns:
+            df[column] = values[column]
+        return df
@@ -1,33 +1,91 @@
 import os
+import threading
 from dotenv import load_dotenv
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
 import pyupbit  # PyUpbit 추가
+import trade_archive
+import trade_db
+import trade_journal
+import trade_history
 
 load_dotenv()
 access = os.getenv("UPBIT_ACCESS_KEY")
 secret = os.getenv("UPBIT_SECRET_KEY")
-# 데이터베이스 연결 함수
-def get_connection():
-    return sqlite3.connect('trading_data.db')
+# 읽기 전용 연결 풀 (세션과 rerun 사이에 공유, 처음 만들 때 스키마를 최신으로 올림)
+@st.cache_resource
+def get_read_pool():
+    trade_db.connect('trading_data.db').close()
+    return trade_journal.ReadPool('trading_data.db')
+
+# 캐시 유지 시간 (초): 조회 결과는 거래 주기보다 짧게, 실시간 잔고는 더 짧게
+QUERY_TTL = 30
+BALANCE_TTL = 10
+
+# trade_archive.py export --move로 SQLite에서 옮긴 오래된 거래 (누적 수익률/낙폭은 보관본까지 포함해 계산)
+TRADE_ARCHIVE_DIR = os.getenv("TRADE_ARCHIVE_DIR", "archive/trading_data")
+
+def load_archived_trades():
+    if not os.path.isdir(os.path.join(TRADE_ARCHIVE_DIR, "trades")):
+        return None
+    archived = trade_archive.load(TRADE_ARCHIVE_DIR, "trades")
+    archived['timestamp'] = trade_db.to_local_datetime(archived['timestamp'])
+    return archived
+
+# 이미 읽은 거래 (세션 사이에 공유, 이후에는 마지막 id보다 큰 행만 추가로 읽음)
+@st.cache_resource
+def get_trade_cache():
+    return {"df": None, "last_id": 0, "lock": threading.Lock()}
 
 # 데이터 로드 함수
+@st.cache_data(ttl=QUERY_TTL)
 def load_data():
-    conn = get_connection()
-    query = "SELECT * FROM trades"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
-
-# PyUpbit API를 이용한 현재 잔고 및 자산 조회 함수
+    cache = get_trade_cache()
+    with cache["lock"]:
+        with get_read_pool().connection() as conn:
+            # DB를 새로 만들어 id가 처음부터 다시 시작되면 전체를 다시 읽음
+            # (오래된 행을 옮겨 테이블이 비어도 마지막으로 발급한 id는 sqlite_sequence에 남음)
+            last_issued = conn.execute(
+                "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'trades'), 0)"
+            ).fetchone()[0]
+            if last_issued < cache["last_id"]:
+                cache["df"], cache["last_id"] = None, 0
+            new_rows = pd.read_sql_query(
+                "SELECT * FROM trades WHERE id > ? ORDER BY id", conn, params=(cache["last_id"],)
+            )
+        # epoch 초로 저장된 시각을 로컬 시각으로
+        new_rows['timestamp'] = trade_db.to_local_datetime(new_rows['timestamp'])
+        if cache["df"] is None:
+            # 처음 읽을 때 보관본을 앞에 붙임 (보관 후 SQLite에 남아 있는 행은 SQLite 쪽 사용)
+            archived = load_archived_trades()
+            if archived is not None and not archived.empty:
+                archived = archived[~archived['id'].isin(new_rows['id'])].reindex(columns=new_rows.columns)
+                new_rows = pd.concat([archived, new_rows], ignore_index=True).sort_values('id', ignore_index=True)
+            cache["df"] = new_rows
+        elif not new_rows.empty:
+            cache["df"] = pd.concat([cache["df"], new_rows], ignore_index=True)
+        if not new_rows.empty:
+            cache["last_id"] = int(new_rows['id'].iloc[-1])
+        return cache["df"]
+
+# 거래소 클라이언트 (세션 사이에 하나만 생성)
+@st.cache_resource
+def get_upbit():
+    return pyupbit.Upbit(access, secret)
+
+# PyUpbit API를 이용한 현재 잔고 및 자산 조회 함수 (잔고 조회 한 번 + 현재가 한 번), 실패하면 None
+@st.cache_data(ttl=BALANCE_TTL)
 def get_current_assets():
-    upbit = pyupbit.Upbit(access, secret)  # 본인의 API 키로 교체 필요
-    krw_balance = float(upbit.get_balance("KRW"))  # 현재 보유한 현금
-    btc_balance = float(upbit.get_balance("KRW-BTC"))  # 보유한 BTC 수량
+    balances = get_upbit().get_balances()
     btc_price = pyupbit.get_current_price("KRW-BTC")  # 현재 BTC 가격
+    # 키 오류나 요청 제한이면 pyupbit가 목록 대신 {'error': ...}를 반환
+    if not isinstance(balances, list) or btc_price is None:
+        return None
+    balances = {item['currency']: float(item['balance']) for item in balances}
+    krw_balance = balances.get("KRW", 0.0)  # 현재 보유한 현금
+    btc_balance = balances.get("BTC", 0.0)  # 보유한 BTC 수량
     total_asset = krw_balance + btc_balance * btc_price  # 총 자산 계산
     return krw_balance, btc_balance, btc_price, total_asset
 
@@ -35,7 +93,12 @@ def get_current_assets():
 def calculate_profit_rate(df):
     if not df.empty:
         # PyUpbit API에서 현재 자산 정보를 가져옴
-        krw_balance, btc_balance, btc_price, latest_total_asset = get_current_assets()
+        assets = get_current_assets()
+        if assets is None:
+            st.warning("업비트 잔고를 조회하지 못해 마지막 거래 기록의 총 자산을 사용합니다.")
+            latest_total_asset = df.iloc[-1]['total_asset']
+        else:
+            krw_balance, btc_balance, btc_price, latest_total_asset = assets
         
         initial_total_asset = df.iloc[0]['total_asset'] + 1000000 # 처음 자산
         initial_investment = initial_total_asset  # 초기 자산
@@ -68,6 +131,11 @@ def calculate_annualized_return(df, profit_rate):
     else:
         return None, None
     
+# 기록된 평가 자산 기준 최대 낙폭 (보관본을 포함해 이미 읽어 둔 거래에서 숫자 컬럼만 사용)
+def calculate_max_drawdown(df):
+    history = {column: df[column].to_numpy(dtype=float) for column in trade_history.EQUITY_COLUMNS}
+    return trade_history.performance(history)["max_drawdown_pct"]
+
 # 경과 시간을 일과 시간 단위로 변환하는 함수
 def format_elapsed_time(elapsed_hours):
     days = int(elapsed_hours // 24)  # 경과 일 수
@@ -98,6 +166,7 @@ def main():
             st.markdown(f"<span style='color:blue;'>🕒 첫 거래일로부터 **{days}일 {hours}시간** 경과</span>", unsafe_allow_html=True)
             if annualized_return is not None:
                 st.markdown(f"<span style='color:green;'>📈 1년 예상 수익률: **{annualized_return:.2f}%**</span>", unsafe_allow_html=True)
+        st.markdown(f"<span style='color:red;'>📉 최대 낙폭: **{calculate_max_drawdown(df):.2f}%**</span>", unsafe_allow_html=True)
     else:
         st.header("거래 내역이 없습니다.")
 
@@ -0,0 +1,196 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import trade_db
+
+logger = logging.getLogger(__name__)
+
+# 보관할 테이블: 시각 컬럼 (epoch 초 또는 ISO 문자열)과 숫자 컬럼과 따로 저장할 긴 텍스트 컬럼.
+# settle(초)이 있으면 그보다 최근 행은 보관하지 않음 (llm_calls.trade_id는 거래가 저장된 뒤에 채워지므로
+# 가장 긴 매매 주기(8시간)보다 넉넉히 기다려 trade_id가 빈 채로 보관되지 않게 함)
+TABLES = {
+    "trades": {"time": "timestamp", "time_format": "epoch", "text": ["reason", "reflection"]},
+    "llm_calls": {"time": "timestamp", "time_format": "iso", "text": ["error"], "settle": 86400},
+}
+
+# 컬럼 묶음 디렉터리 (숫자/짧은 값과 긴 텍스트를 따로 저장해 분석할 때 텍스트를 읽지 않도록)
+NUMERIC = "numeric"
+TEXT = "text"
+
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+# SQLite 선언 타입 -> Arrow 타입 (파티션마다 pandas가 추론하면 전부 NULL인 컬럼이 null 타입이 되어 합칠 수 없음)
+ARROW_TYPES = {
+    "INTEGER": pa.int64(),
+    "REAL": pa.float64(),
+    "TEXT": pa.string(),
+    "BLOB": pa.binary(),
+}
+
+
+def _schema(conn, table):
+    """SQLite 컬럼 선언 타입으로 만든 테이블 전체의 Arrow 스키마 (모든 파티션 파일에 같은 스키마 사용)"""
+    return pa.schema([
+        (name, ARROW_TYPES.get(declared.upper(), pa.string()))
+        for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table})")
+    ])
+
+
+def _dates(df, spec):
+    """행마다 로컬 날짜 문자열 (파티션 키)"""
+    if spec["time_format"] == "epoch":
+        times = trade_db.to_local_datetime(df[spec["time"]])
+    else:
+        times = pd.to_datetime(df[spec["time"]], format="ISO8601")
+    return times.dt.strftime("%Y-%m-%d")
+
+
+def _write_part(directory, df, schema):
+    """임시 파일에 쓴 뒤 이름을 바꿔, 중간에 실패해도 반쯤 쓴 파일이 남지 않게 함"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{df['id'].iloc[0]}-{df['id'].iloc[-1]}.parquet")
+    schema = pa.schema([schema.field(column) for column in df.columns])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    pq.write_table(table, path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+
+
+def _state(conn, table):
+    conn.execute("CREATE TABLE IF NOT EXISTS archive_state (table_name TEXT PRIMARY KEY, last_id INTEGER)")
+    row = conn.execute("SELECT last_id FROM archive_state WHERE table_name = ?", (table,)).fetchone()
+    return row[0] if row else 0
+
+
+def export_table(conn, archive_dir, table, cutoff=None, move=False):
+    """
+    last_id 이후 행을 날짜별 Parquet로 내보낸다 (cutoff(epoch 초)가 있으면 그 이전 행만).
+    move면 보관된 행 중 cutoff 이전 행을 SQLite에서 지워 운영 테이블을 작게 유지한다.
+    """
+    spec = TABLES[table]
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        return 0
+    last_id = _state(conn, table)
+    if spec.get("settle"):
+        settled = time.time() - spec["settle"]
+        cutoff = settled if cutoff is None else min(cutoff, settled)
+    if cutoff is None:
+        time_limit = None
+    elif spec["time_format"] == "epoch":
+        time_limit = int(cutoff)
+    else:
+        time_limit = pd.Timestamp.fromtimestamp(cutoff).isoformat()
+
+    query = f"SELECT * FROM {table} WHERE id > ?"
+    params = [last_id]
+    if time_limit is not None:
+        query += f" AND {spec['time']} < ?"
+        params.append(time_limit)
+    df = pd.read_sql_query(query + " ORDER BY id", conn, params=params)
+
+    if not df.empty:
+        schema = _schema(conn, table)
+        text_columns = [column for column in spec["text"] if column in df.columns]
+        numeric_columns = [column for column in df.columns if column not in text_columns]
+        for date, rows in df.groupby(_dates(df, spec), sort=True):
+            _write_part(os.path.join(archive_dir, table, NUMERIC, f"date={date}"), rows[numeric_columns], schema)
+            _write_part(os.path.join(archive_dir, table, TEXT, f"date={date}"), rows[["id"] + text_columns], schema)
+        last_id = int(df["id"].max())
+
+    # 보관 위치 기록과 삭제는 한 트랜잭션으로 (파일은 이미 써 둔 상태)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO archive_state (table_name, last_id) VALUES (?, ?)", (table, last_id))
+        moved = 0
+        if move and time_limit is not None:
+            moved = conn.execute(
+                f"DELETE FROM {table} WHERE id <= ? AND {spec['time']} < ?", (last_id, time_limit)
+            ).rowcount
+    logger.info("%s: archived %d rows (last id %d), moved %d out of SQLite", table, len(df), last_id, moved)
+    return len(df)
+
+
+def export(db_path, archive_dir, keep_days=None, move=False):
+    """trades와 llm_calls를 보관. keep_days가 있으면 그보다 오래된 행만 (move면 SQLite에서 옮김)"""
+    cutoff = time.time() - keep_days * 86400 if keep_days is not None else None
+    conn = trade_db.connect(db_path)
+    try:
+        counts = {table: export_table(conn, archive_dir, table, cutoff, move) for table in TABLES}
+    finally:
+        conn.close()
+    return counts
+
+
+def load(archive_dir, table="trades", columns=None, start=None, end=None):
+    """
+    보관된 행을 DataFrame으로. columns에 텍스트 컬럼이 없으면 숫자 파일만 읽는다.
+    start/end는 'YYYY-MM-DD' (포함) 날짜 파티션 범위.
+    """
+    spec = TABLES[table]
+    wanted_text = [column for column in spec["text"] if columns is None or column in columns]
+    date_filter = None
+    if start is not None:
+        date_filter = ds.field("date") >= start
+    if end is not None:
+        date_filter = ds.field("date") <= end if date_filter is None else date_filter & (ds.field("date") <= end)
+
+    def read(group, group_columns):
+        path = os.path.join(archive_dir, table, group)
+        if not os.path.isdir(path):
+            return None
+        dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+        # 스키마를 지정하기 전에 쓴 파일은 전부 NULL인 컬럼이 null 타입일 수 있어 파일 스키마를 합쳐서 읽음
+        schema = pa.unify_schemas(
+            [fragment.physical_schema for fragment in dataset.get_fragments()] + [PARTITIONING.schema],
+            promote_options="permissive",
+        )
+        dataset = ds.dataset(path, schema=schema, format="parquet", partitioning=PARTITIONING)
+        if group_columns is None:
+            group_columns = [column for column in schema.names if column != "date"]
+        else:
+            group_columns = [column for column in group_columns if column in schema.names]
+        return dataset.to_table(columns=group_columns, filter=date_filter).to_pandas()
+
+    numeric_columns = None if columns is None else ["id"] + [
+        column for column in columns if column != "id" and column not in spec["text"]
+    ]
+    df = read(NUMERIC, numeric_columns)
+    if df is None:
+        return pd.DataFrame(columns=columns)
+    if wanted_text:
+        text = read(TEXT, ["id"] + wanted_text)
+        if text is not None:
+            df = df.merge(text.drop_duplicates("id"), on="id", how="left")
+    # 중간에 중단된 보관을 다시 실행하면 같은 행이 두 번 들어갈 수 있음
+    return df.drop_duplicates("id").sort_values("id").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="거래 기록을 날짜별 Parquet로 내보내고 오래된 행을 옮깁니다.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--db", default="trading_data.db")
+    export_parser.add_argument("--out", default="archive/trading_data")
+    export_parser.add_argument("--keep-days", type=float, help="이 기간(일)보다 오래된 행만 보관")
+    export_parser.add_argument("--move", action="store_true", help="보관한 오래된 행을 SQLite에서 삭제")
+    show_parser = subparsers.add_parser("show")
+    show_parser.add_argument("--out", default="archive/trading_data")
+    show_parser.add_argument("--table", choices=sorted(TABLES), default="trades")
+    show_parser.add_argument("--columns", nargs="*")
+    show_parser.add_argument("--start")
+    show_parser.add_argument("--end")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        if args.move and args.keep_days is None:
+            parser.error("--move requires --keep-days")
+        print(json.dumps(export(args.db, args.out, args.keep_days, args.move)))
+    else:
+        print(load(args.out, args.table, args.columns, args.start, args.end))
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# trades 테이블 스키마 버전 (PRAGMA user_version)
+#   1: 예전 스크립트들이 만들던 TEXT 타임스탬프 테이블
+#   2: 정수 epoch(초) 타임스탬프 + 시간/결정 인덱스
+SCHEMA_VERSION = 2
+
+# trades 컬럼 (id, timestamp 제외)
+TRADE_COLUMNS = [
+    "decision", "percentage", "reason", "btc_balance", "krw_balance",
+    "btc_avg_buy_price", "btc_krw_price", "total_asset", "reflection",
+]
+
+# 다른 연결이 쓰는 중일 때 기다리는 시간 (밀리초)
+BUSY_TIMEOUT_MS = 5000
+
+
+def _to_epoch(value):
+    """예전 TEXT 타임스탬프(ISO 또는 '%Y-%m-%d %H:%M:%S', 로컬 시각)를 epoch 초로"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        logger.warning("Unparseable trade timestamp %r", value)
+        return None
+
+
+def _create_v1(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        decision TEXT,
+        percentage INTEGER,
+        reason TEXT,
+        btc_balance REAL,
+        krw_balance REAL,
+        btc_avg_buy_price REAL,
+        btc_krw_price REAL,
+        total_asset REAL,
+        reflection TEXT
+    )
+    ''')
+
+
+def _epoch_timestamps(conn):
+    """TEXT 타임스탬프를 정수 epoch로 바꿔 테이블을 다시 만들고 인덱스 추가 (id는 그대로 유지)"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    selected = ", ".join(column if column in existing else f"NULL AS {column}" for column in TRADE_COLUMNS)
+    conn.create_function("to_epoch", 1, _to_epoch)
+    conn.execute('''
+    CREATE TABLE trades_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        decision TEXT,
+        percentage INTEGER,
+        reason TEXT,
+        btc_balance REAL,
+        krw_balance REAL,
+        btc_avg_buy_price REAL,
+        btc_krw_price REAL,
+        total_asset REAL,
+        reflection TEXT
+    )
+    ''')
+    conn.execute(f'''
+    INSERT INTO trades_v2 (id, timestamp, {", ".join(TRADE_COLUMNS)})
+    SELECT id, COALESCE(to_epoch(timestamp), 0), {selected} FROM trades ORDER BY id
+    ''')
+    conn.execute("DROP TABLE trades")
+    conn.execute("ALTER TABLE trades_v2 RENAME TO trades")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_decision_timestamp ON trades (decision, timestamp)")
+
+
+# 버전별 마이그레이션 (user_version이 키-1일 때 실행)
+MIGRATIONS = {
+    1: _create_v1,
+    2: _epoch_timestamps,
+}
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """스키마를 SCHEMA_VERSION까지 한 트랜잭션씩 올린다. (이전 버전, 현재 버전) 반환"""
+    start = version = schema_version(conn)
+    while version < SCHEMA_VERSION:
+        version += 1
+        # 각 단계를 트랜잭션 하나로 (중간에 실패하면 해당 단계 전체 롤백)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Migrated trades schema to v%d", version)
+    return start, version
+
+
+def connect(path="trading_data.db", readonly=False, check_same_thread=True):
+    """
+    WAL 모드로 연결하고 스키마를 최신으로 올린다. readonly면 마이그레이션 없이 읽기 전용으로 연다
+    (WAL이라 매매 스크립트가 쓰는 동안에도 대시보드가 막히지 않고 읽을 수 있음).
+    """
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=check_same_thread)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return conn
+
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    migrate(conn)
+    conn.isolation_level = ""  # 이후에는 기본 트랜잭션 동작 (commit 필요)
+    return conn
+
+
+def insert_trade(conn, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price,
+                 btc_krw_price, total_asset, reflection=None, timestamp=None):
+    """거래 한 건 저장 (커밋은 호출하는 쪽에서). 새 trades.id 반환"""
+    cursor = conn.execute(f'''
+    INSERT INTO trades (timestamp, {", ".join(TRADE_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (int(time.time() if timestamp is None else timestamp), decision, percentage, reason, btc_balance,
+          krw_balance, btc_avg_buy_price, btc_krw_price, total_asset, reflection))
+    return cursor.lastrowid
+
+
+def recent_trades(conn, days=7, columns=None):
+    """최근 days일 거래를 최신순 DataFrame으로 (timestamp는 로컬 시각 datetime)"""
+    if columns is None:
+        selected = "*"
+    else:
+        selected = ", ".join(["id", "timestamp"] + [column for column in columns if column not in ("id", "timestamp")])
+    cursor = conn.execute(
+        f"SELECT {selected} FROM trades WHERE timestamp > ? ORDER BY timestamp DESC, id DESC",
+        (int(time.time()) - days * 86400,),
+    )
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+    df["timestamp"] = to_local_datetime(df["timestamp"])
+    return df
+
+
+def to_local_datetime(values):
+    """epoch 초 Series를 로컬 시각 (timezone 없는) datetime Series로"""
+    local = datetime.now().astimezone().tzinfo
+    return pd.to_datetime(values, unit="s", utc=True).dt.tz_convert(local).dt.tz_localize(None)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="trades 스키마 버전 확인 및 마이그레이션")
+    parser.add_argument("command", choices=["status", "migrate"])
+    parser.add_argument("databases", nargs="*", default=["trading_data.db", "trading_data1.db"])
+    args = parser.parse_args()
+
+    for path in args.databases:
+        if args.command == "status":
+            # 조회만 하므로 없는 파일을 새로 만들지 않도록 읽기 전용으로 열기
+            if not os.path.exists(path):
+                print(f"{path}: not found")
+                continue
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            print(f"{path}: schema v{schema_version(conn)} (latest v{SCHEMA_VERSION})")
+        else:
+            conn = connect(path)
+            count = conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+            print(f"{path}: schema v{schema_version(conn)}, {count} trades")
+        conn.close()
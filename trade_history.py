@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+# 컬럼별 NumPy 타입 (timestamp는 epoch 초 -> datetime64[s], UTC)
+COLUMN_TYPES = {
+    "id": np.int64,
+    "timestamp": "datetime64[s]",
+    "decision": object,
+    "percentage": np.float64,  # NULL이 있을 수 있어 float
+    "reason": object,
+    "btc_balance": np.float64,
+    "krw_balance": np.float64,
+    "btc_avg_buy_price": np.float64,
+    "btc_krw_price": np.float64,
+    "total_asset": np.float64,
+    "reflection": object,
+}
+
+# 평가 자산 계산에 필요한 컬럼
+EQUITY_COLUMNS = ("krw_balance", "btc_balance", "btc_krw_price")
+
+
+def load(conn, columns=EQUITY_COLUMNS, days=None, since=None):
+    """
+    요청한 컬럼만 읽어 {컬럼: NumPy 배열}로 반환 (id, timestamp는 항상 포함, 오래된 거래부터).
+    days 또는 since(epoch 초)로 기간을 제한한다.
+    """
+    columns = ["id", "timestamp"] + [column for column in columns if column not in ("id", "timestamp")]
+    unknown = set(columns) - set(COLUMN_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown trade columns: {sorted(unknown)}")
+    if days is not None:
+        since = int(time.time()) - days * 86400
+
+    query = f"SELECT {', '.join(columns)} FROM trades"
+    params = ()
+    if since is not None:
+        query += " WHERE timestamp > ?"
+        params = (int(since),)
+    rows = conn.execute(query + " ORDER BY timestamp, id", params).fetchall()
+
+    history = {}
+    for position, column in enumerate(columns):
+        values = [row[position] for row in rows]
+        if COLUMN_TYPES[column] is np.float64:
+            values = [np.nan if value is None else value for value in values]
+        history[column] = np.array(values, dtype=COLUMN_TYPES[column])
+    return history
+
+
+def equity(history):
+    """거래 직후 평가 자산 (KRW 잔고 + BTC 잔고 x 기록된 BTC 가격)"""
+    return history["krw_balance"] + history["btc_balance"] * history["btc_krw_price"]
+
+
+def trade_returns(values):
+    """직전 거래 대비 평가 자산 변화율 (%), 첫 거래는 제외되어 길이가 1 짧음"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.empty(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(values) / values[:-1] * 100
+
+
+def max_drawdown(values):
+    """평가 자산 최고점 대비 최대 하락률 (%, 0 이하)"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = (values - peaks) / peaks * 100
+    drawdowns = drawdowns[np.isfinite(drawdowns)]  # 최고점이 0이거나 값이 NaN인 구간 제외
+    return float(drawdowns.min()) if len(drawdowns) else 0.0
+
+
+def performance(history):
+    """
+    기간 수익률, 거래별 손익(KRW), 최근 거래 수익률, 최대 낙폭.
+    잔고나 가격이 NULL이라 평가 자산을 계산할 수 없는 거래는 빼고 계산 (프롬프트에 nan%가 들어가지 않도록)
+    """
+    values = equity(history)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {"trades": 0, "return_pct": 0.0, "last_trade_return_pct": 0.0,
+                "max_drawdown_pct": 0.0, "trade_pnl": np.empty(0)}
+    returns = trade_returns(values)
+    return {
+        "trades": len(values),
+        "return_pct": float((values[-1] - values[0]) / values[0] * 100) if values[0] else 0.0,
+        "last_trade_return_pct": float(returns[-1]) if len(returns) and np.isfinite(returns[-1]) else 0.0,
+        "max_drawdown_pct": max_drawdown(values),
+        "trade_pnl": np.diff(values),
+    }
@@ -0,0 +1,147 @@
+import atexit
+import contextlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import trade_db
+
+logger = logging.getLogger(__name__)
+
+# 한 트랜잭션에 모을 최대 거래 수와, 첫 거래 이후 더 모으며 기다리는 시간 (초)
+MAX_BATCH = 100
+BATCH_WINDOW = 0.05
+
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class TradeJournal:
+    """
+    거래 기록을 큐로 받아 전용 스레드 하나가 긴 수명의 연결로 모아서 저장한다 (write-behind).
+    매매 사이클은 커밋을 기다리지 않고, 저장되면 Future에 trades.id가 채워지고 on_saved(trade_id)가 호출된다.
+    종료할 때 (close 또는 인터프리터 종료) 남은 기록을 모두 쓰고 WAL을 체크포인트한다.
+    """
+
+    def __init__(self, path="trading_data.db", max_batch=MAX_BATCH, batch_window=BATCH_WINDOW):
+        self.path = path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.queue = queue.Queue()
+        # 스키마 마이그레이션은 여기서 끝내고, 이후 연결은 writer 스레드만 사용
+        self.conn = trade_db.connect(path, check_same_thread=False)
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="trade-journal", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record_trade(self, decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price,
+                     btc_krw_price, total_asset, reflection=None, on_saved=None):
+        """거래 한 건을 저장 큐에 넣고 trades.id로 완료되는 Future 반환 (시각은 호출한 시점)"""
+        if self.closed:
+            raise RuntimeError("Trade journal is closed")
+        future = Future()
+        values = (decision, percentage, reason, btc_balance, krw_balance, btc_avg_buy_price,
+                  btc_krw_price, total_asset, reflection, int(time.time()))
+        self.queue.put(("trade", values, on_saved, future))
+        return future
+
+    def flush(self, timeout=None):
+        """지금까지 넣은 기록이 모두 커밋될 때까지 대기"""
+        future = Future()
+        self.queue.put((_FLUSH, None, None, future))
+        future.result(timeout)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch and batch[-1][0] == "trade":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, trades):
+        ids = []
+        try:
+            for _, values, _, _ in trades:
+                *fields, timestamp = values
+                ids.append(trade_db.insert_trade(self.conn, *fields, timestamp=timestamp))
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error("Failed to write %d trade(s): %s", len(trades), e)
+            for _, _, _, future in trades:
+                future.set_exception(e)
+            return
+
+        for trade_id, (_, _, on_saved, future) in zip(ids, trades):
+            future.set_result(trade_id)
+            if on_saved is not None:
+                try:
+                    on_saved(trade_id)
+                except Exception as e:
+                    logger.error("Callback for trade %s failed: %s", trade_id, e)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            trades = [job for job in batch if job[0] == "trade"]
+            if trades:
+                self._write(trades)
+            for kind, _, _, future in batch:
+                if kind in (_FLUSH, _STOP):
+                    future.set_result(None)
+            if any(job[0] == _STOP for job in batch):
+                break
+
+        # 종료 시 WAL 내용을 DB 파일로 옮겨 디스크에 확실히 기록
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.close()
+
+    def close(self, timeout=30):
+        if self.closed:
+            return
+        self.closed = True
+        future = Future()
+        self.queue.put((_STOP, None, None, future))
+        future.result(timeout)
+        self.thread.join(timeout)
+
+
+class ReadPool:
+    """대시보드/회고 조회용 읽기 전용 연결 풀 (WAL이라 저장 중에도 막히지 않음)"""
+
+    def __init__(self, path="trading_data.db", size=4):
+        self.path = path
+        self.connections = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self.connections.put(None)  # 처음 쓸 때 연결
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        conn = self.connections.get(timeout=timeout)
+        try:
+            if conn is None:
+                conn = trade_db.connect(self.path, readonly=True, check_same_thread=False)
+            yield conn
+        except Exception:
+            # 오류가 난 연결은 버리고 다음에 새로 연결
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            conn = self.connections.get_nowait()
+            if conn is not None:
+                conn.close()
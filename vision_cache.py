@@ -0,0 +1,158 @@
+import io
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# dHash 크기 (HASH_SIZE x HASH_SIZE = 64비트)
+HASH_SIZE = 8
+
+
+def dhash(image, size=HASH_SIZE):
+    """차트 이미지(bytes 또는 PIL Image)의 difference hash - 옆 픽셀보다 밝은지 여부를 비트로"""
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            left = pixels[row * (size + 1) + column]
+            right = pixels[row * (size + 1) + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def batch_hash(images, size=HASH_SIZE):
+    """여러 차트(예: 주기별)의 dHash를 이어 붙인 값 - 거리는 차트별 거리의 합"""
+    value = 0
+    for image in images:
+        value = (value << (size * size)) | dhash(image, size)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class VisionCache:
+    """
+    vision 분석 결과를 차트 이미지의 dHash와 함께 SQLite에 저장하는 캐시.
+    새 차트의 해시가 저장된 해시와 threshold 비트 이하로 다르면 같은 차트로 보고 저장된 분석을 재사용한다.
+    ttl초가 지난 항목은 만료되고, max_entries를 넘으면 가장 오래 쓰이지 않은 항목부터 지운다.
+    """
+
+    def __init__(self, path="trading_data.db", threshold=2, ttl=2 * 3600, max_entries=100):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS vision_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            namespace TEXT,
+            image_hash TEXT,
+            response TEXT,
+            created_at REAL,
+            last_used REAL,
+            hits INTEGER DEFAULT 0
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS vision_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER
+        )
+        ''')
+        self.conn.commit()
+
+    def _count(self, name, amount=1):
+        self.conn.execute('''
+        INSERT INTO vision_cache_stats (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        ''', (name, amount))
+
+    def lookup(self, image_hash, namespace=""):
+        """가장 가까운 유효 항목이 threshold 안이면 (분석 결과, 거리), 아니면 None"""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, image_hash, response FROM vision_cache WHERE namespace = ? AND created_at >= ?",
+                (namespace, now - self.ttl),
+            ).fetchall()
+            best = min(
+                ((hamming_distance(image_hash, int(stored, 16)), entry_id, response)
+                 for entry_id, stored, response in rows),
+                default=None,
+            )
+            if best is None or best[0] > self.threshold:
+                self._count("misses")
+                self.conn.commit()
+                return None
+
+            distance, entry_id, response = best
+            self.conn.execute(
+                "UPDATE vision_cache SET last_used = ?, hits = hits + 1 WHERE id = ?", (now, entry_id)
+            )
+            self._count("hits")
+            self.conn.commit()
+            return json.loads(response), distance
+
+    def put(self, image_hash, response, namespace=""):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('''
+            INSERT INTO vision_cache (namespace, image_hash, response, created_at, last_used, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+            ''', (namespace, f"{image_hash:016x}", json.dumps(response), now, now))
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        expired = self.conn.execute(
+            "DELETE FROM vision_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        evicted = self.conn.execute('''
+        DELETE FROM vision_cache WHERE id IN (
+            SELECT id FROM vision_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+        ''', (self.max_entries,)).rowcount
+        if expired:
+            self._count("expired", expired)
+        if evicted:
+            self._count("evicted", evicted)
+
+    def stats(self):
+        """히트/미스/만료/퇴출 횟수와 히트율"""
+        with self.lock:
+            stats = dict(self.conn.execute("SELECT name, value FROM vision_cache_stats").fetchall())
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM vision_cache").fetchone()[0]
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+        return stats
+
+    def get_or_analyze(self, image, analyze, namespace="", cacheable=None):
+        """
+        비슷한 차트의 분석이 캐시에 있으면 재사용하고, 없으면 analyze()를 호출해 저장한다.
+        image는 이미지 하나 또는 한 요청에 함께 보내는 이미지 목록.
+        cacheable(결과)가 False면 (예: 오류 응답) 저장하지 않는다.
+        """
+        image_hash = batch_hash(image) if isinstance(image, (list, tuple)) else dhash(image)
+        cached = self.lookup(image_hash, namespace)
+        if cached is not None:
+            response, distance = cached
+            logger.info("Reusing cached vision analysis (distance %d bits, hit rate %.0f%%)",
+                        distance, self.stats()["hit_rate"] * 100)
+            return response
+        response = analyze()
+        if cacheable is None or cacheable(response):
+            self.put(image_hash, response, namespace)
+        return response
+
+    def close(self):
+        self.conn.close()
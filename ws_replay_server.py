@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+def load_frames(path):
+    """RealtimeFeed(record_path=...)로 기록한 JSONL 파일에서 프레임 목록을 읽음"""
+    with open(path, "r", encoding="UTF-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class ReplayServer:
+    """
+    기록해 둔 WebSocket 프레임을 재생하는 로컬 대체 서버 (RealtimeFeed 테스트용).
+    클라이언트가 구독 메시지를 보내면 구독한 코드의 프레임만 interval초 간격으로 보낸다.
+    drop_after를 주면 그만큼 보낸 뒤 연결을 끊어 재연결 동작을 확인할 수 있다.
+    """
+
+    def __init__(self, frames, host="127.0.0.1", port=0, interval=0.0, repeat=False, drop_after=None):
+        self.frames = [frame if isinstance(frame, str) else json.dumps(frame) for frame in frames]
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.repeat = repeat
+        self.drop_after = drop_after
+        self.connections = 0
+        self.subscriptions = []
+
+        self.loop = None
+        self.thread = None
+        self.server = None
+        self.ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handle(self, websocket, *args):
+        self.connections += 1
+        subscription = json.loads(await websocket.recv())
+        self.subscriptions.append(subscription)
+        codes = set()
+        for item in subscription:
+            codes.update(item.get("codes", []))
+
+        sent = 0
+        while True:
+            for frame in self.frames:
+                if codes and json.loads(frame).get("code") not in codes:
+                    continue
+                if self.drop_after is not None and sent >= self.drop_after:
+                    await websocket.close()
+                    return
+                # 실제 거래소처럼 바이너리 프레임으로 전송
+                await websocket.send(frame.encode("utf-8"))
+                sent += 1
+                await asyncio.sleep(self.interval)
+            if not self.repeat:
+                break
+        await websocket.wait_closed()
+
+    async def _serve(self):
+        self.server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        await self.server.wait_closed()
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),),
+                                       name="ws-replay-server", daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        logger.info("Replay server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        if self.server:
+            self.loop.call_soon_threadsafe(self.server.close)
+        if self.thread:
+            self.thread.join(5)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="기록된 WebSocket 프레임 재생 서버")
+    parser.add_argument("frames", help="JSONL 프레임 파일")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--repeat", action="store_true")
+    args = parser.parse_args()
+
+    server = ReplayServer(load_frames(args.frames), port=args.port, interval=args.interval, repeat=args.repeat).start()
+    server.thread.join()
@@ -14,5 +14,6 @@ def get_combined_transcript(playlist):
     return subscribes
 
 # 사용 예시
-playlist = ['6itriowPhhM', 'Ln2PevCHEuU', 'Li3EV0YVuSg', '3XbtEX3jUv4']
-transcripts = get_combined_transcript(playlist)
\ No newline at end of file
+if __name__ == "__main__":
+    playlist = ['6itriowPhhM', 'Ln2PevCHEuU', 'Li3EV0YVuSg', '3XbtEX3jUv4']
+    transcripts = get_combined_transcript(playlist)
\ No newline at end of file